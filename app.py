@@ -2,12 +2,17 @@
 
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
 import tempfile
+import hashlib
+import json
+import time
 import os
-from contract_analyzer import analyze_contract_file
 from pdf_generator import generate_rewritten_pdf
+from job_journal import get_job_journal, make_job_id
+from telemetry import load_run_trace
+from job_queue import get_job_queue, spawn_workers
+from clause_rewriter import iter_rewrites, needs_rewrite, REWRITE_RISK_LEVELS
+from config import JOB_QUEUE_WORKERS, JOB_QUEUE_POLL_SECONDS
 
 st.set_page_config(
     page_title="AI-Powered Compliance Dashboard",
@@ -15,6 +20,9 @@ st.set_page_config(
     layout="wide"
 )
 
+PARTIAL_RESULT_COLUMNS = ['clause_id', 'regulation', 'risk_level', 'risk_percent', 'summary']
+RISK_LEVELS = ['Low', 'Medium', 'High']
+
 def initialize_session_state():
     if 'analysis_complete' not in st.session_state:
         st.session_state.analysis_complete = False
@@ -22,99 +30,264 @@ def initialize_session_state():
         st.session_state.analysis_results = None
     if 'contract_name' not in st.session_state:
         st.session_state.contract_name = ""
+    if 'queue_id' not in st.session_state:
+        st.session_state.queue_id = None
+    if 'results_hash' not in st.session_state:
+        st.session_state.results_hash = None
+    if 'run_trace' not in st.session_state:
+        st.session_state.run_trace = None
+
+@st.cache_resource
+def start_job_workers():
+    # Runs once per Streamlit server process. Analysis happens in these worker
+    # processes (which also load the embedding model), never in the request thread.
+    # With JOB_QUEUE_WORKERS=0 the workers are started separately: python job_queue.py
+    return spawn_workers(JOB_QUEUE_WORKERS)
 
 def analyze_contract(uploaded_file):
+    """Queues the uploaded contract for the background workers and returns its queue id."""
     try:
         with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(uploaded_file.name)[1]) as tmp_file:
             tmp_file.write(uploaded_file.getvalue())
             tmp_file_path = tmp_file.name
-        with st.spinner("Analyzing contract... This may take a few minutes."):
-            analysis_results = analyze_contract_file(tmp_file_path)
+        queue_id = get_job_queue().submit(tmp_file_path, uploaded_file.name)
         os.unlink(tmp_file_path)
-        if analysis_results:
-            st.success("Analysis complete!")
-            return analysis_results
-        else:
-            st.error("Failed to analyze contract")
-            return None
+        return queue_id
     except Exception as e:
-        st.error(f"Error during analysis: {str(e)}")
+        st.error(f"Error submitting contract: {str(e)}")
         return None
 
-def create_dashboard(results):
+def format_eta(seconds):
+    if seconds is None:
+        return "estimating..."
+    minutes, seconds = divmod(int(seconds), 60)
+    return f"{minutes}m {seconds:02d}s" if minutes else f"{seconds}s"
+
+def reset_analysis():
+    st.session_state.analysis_complete = False
+    st.session_state.analysis_results = None
+    st.session_state.contract_name = ""
+    st.session_state.queue_id = None
+    st.session_state.results_hash = None
+    st.session_state.run_trace = None
+    st.session_state.show_rewrites = False
+    st.session_state.pop('pdf_key', None)
+    st.session_state.pop('pdf_data', None)
+
+def show_job_progress(queue_id):
+    """Polls the queued job, showing progress and the clauses analyzed so far."""
+    progress = get_job_queue().get_progress(queue_id)
+    if progress is None:
+        st.error("The analysis job could not be found.")
+        st.session_state.queue_id = None
+        return
+
+    if progress['status'] == 'completed':
+        if progress['results']:
+            st.session_state.analysis_results = progress['results']
+            st.session_state.results_hash = results_hash(progress['results'])
+            # Written by the worker process that ran the job (see telemetry.py).
+            st.session_state.run_trace = load_run_trace(make_job_id(progress['contract_hash']))
+            st.session_state.analysis_complete = True
+        else:
+            st.warning("No clauses could be extracted from this contract.")
+        st.session_state.queue_id = None
+        st.rerun()
+
+    st.subheader(f"⏳ Analyzing {progress['contract_name']}")
+    if progress['status'] == 'failed':
+        st.error(f"Analysis failed: {progress['error']}. Re-submitting the same file resumes it.")
+    elif progress['status'] == 'queued':
+        st.info("Waiting for a worker to pick up the contract...")
+    elif progress['total']:
+        st.progress(progress['done'] / progress['total'],
+                    text=f"{progress['done']}/{progress['total']} clauses analyzed • ETA {format_eta(progress['eta_seconds'])}")
+    else:
+        st.info(f"Reading the contract... {progress['done']} clauses analyzed so far.")
+
+    if progress['results']:
+        # Charts and metrics fill in as each batch or clause is checkpointed,
+        # not only once the whole contract is done.
+        create_dashboard(progress['results'])
+        st.subheader("Clauses Analyzed So Far")
+        st.dataframe(pd.DataFrame(progress['results'])[PARTIAL_RESULT_COLUMNS], use_container_width=True, hide_index=True)
+
+    if progress['status'] == 'failed':
+        if st.button("🔄 Analyze Another Contract"):
+            reset_analysis()
+            st.rerun()
+        return
+    time.sleep(JOB_QUEUE_POLL_SECONDS)
+    st.rerun()
+
+def results_hash(results):
+    """Content hash of an analysis; the cache key for everything derived from it."""
+    return hashlib.sha256(json.dumps(results, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+@st.cache_data(max_entries=32)
+def build_results_frame(key, _results):
+    """
+    The one normalized, typed frame per analysis (cached on `key`, the results
+    hash): ordered categorical risk levels and a numeric risk %.
+    """
+    df = pd.DataFrame(_results)
+    df['clause_id'] = pd.to_numeric(df['clause_id'], errors='coerce').astype('Int64')
+    df['risk_level'] = pd.Categorical(df['risk_level'], categories=RISK_LEVELS, ordered=True)
+    # risk_score is the parsed int; only results stored before it existed need the "N%" string parsed.
+    parsed = pd.to_numeric(
+        df['risk_percent'].astype(str).str.extract(r'(-?\d+(?:\.\d+)?)', expand=False), errors='coerce'
+    )
+    df['risk_percent_value'] = pd.to_numeric(df['risk_score'], errors='coerce').fillna(parsed) if 'risk_score' in df else parsed
+    df['regulation'] = df['regulation'].fillna('').astype('category')
+    df['key_clauses'] = df['key_clauses'].fillna('').astype(str)
+    df['summary'] = df['summary'].fillna('').astype(str)
+    return df.sort_values('clause_id').reset_index(drop=True)
+
+@st.cache_data(max_entries=32)
+def compute_dashboard_stats(key, _results):
+    """Every aggregate the dashboard and insights tabs show, computed with vectorized ops."""
+    df = build_results_frame(key, _results)
+    risk_counts = df['risk_level'].value_counts(sort=False)
+    total = len(df)
+    compliant = int(risk_counts.get('Low', 0))
+    regulation = df['regulation'].astype(str)
+    avg_risk = df['risk_percent_value'].mean()
+    return {
+        'risk_counts': risk_counts[risk_counts > 0],
+        'total': total,
+        'compliant': compliant,
+        'non_compliant': total - compliant,
+        'compliance_rate': compliant / total * 100 if total else 0,
+        'high': int(risk_counts.get('High', 0)),
+        'medium': int(risk_counts.get('Medium', 0)),
+        'avg_risk': 0 if pd.isna(avg_risk) else float(avg_risk),
+        'gdpr': int(regulation.str.contains('GDPR', regex=False).sum()),
+        'hipaa': int(regulation.str.contains('HIPAA', regex=False).sum()),
+        'mentions_liability': bool(df['key_clauses'].str.lower().str.contains('liability', regex=False).any())
+    }
+
+@st.cache_data(max_entries=32)
+def build_display_frame(key, _results):
+    df = build_results_frame(key, _results)
+    summary = df['summary']
+    return pd.DataFrame({
+        'Clause ID': df['clause_id'],
+        'Risk Level': df['risk_level'],
+        'Compliant': (df['risk_level'] == 'Low').map({True: '✓', False: '✗'}),
+        'Comments': summary.where(summary.str.len() <= 50, summary.str[:50] + '...')
+    })
+
+def create_dashboard(results, key=None):
+    # plotly is only needed once there are results to chart.
+    import plotly.express as px
+    import plotly.graph_objects as go
+
+    stats = compute_dashboard_stats(key or results_hash(results), results)
     st.header("📊 Dashboard")
-    df = pd.DataFrame(results)
     col1, col2 = st.columns(2)
     with col1:
         st.subheader("Risk Levels")
-        risk_counts = df['risk_level'].value_counts()
+        risk_counts = stats['risk_counts']
         fig_risk = px.bar(
-            x=risk_counts.index,
+            x=risk_counts.index.astype(str),
             y=risk_counts.values,
-            color=risk_counts.index,
+            color=risk_counts.index.astype(str),
             color_discrete_map={'High': '#ff4444', 'Medium': '#ffaa00', 'Low': '#44ff44'},
             title="Risk Level Distribution"
         )
         st.plotly_chart(fig_risk, use_container_width=True)
     with col2:
         st.subheader("Compliance Status")
-        total_clauses = len(results)
-        compliant = len([r for r in results if r['risk_level'] == 'Low'])
-        non_compliant = total_clauses - compliant
         fig_compliance = go.Figure(data=[go.Pie(
             labels=['Compliant', 'Non-Compliant'],
-            values=[compliant, non_compliant],
+            values=[stats['compliant'], stats['non_compliant']],
             hole=0.3,
             marker_colors=['#44ff44', '#ff4444']
         )])
         fig_compliance.update_layout(title="Compliance Ratio")
         st.plotly_chart(fig_compliance, use_container_width=True)
     st.subheader("Quick Stats")
-    compliant_percentage = (compliant / total_clauses) * 100 if total_clauses > 0 else 0
-    high_risk_count = len([r for r in results if r['risk_level'] == 'High'])
-    risk_percentages = []
-    for r in results:
-        try:
-            risk_val = r['risk_percent'].replace('%', '').strip()
-            risk_percentages.append(float(risk_val))
-        except:
-            continue
-    avg_risk = sum(risk_percentages) / len(risk_percentages) if risk_percentages else 0
     col1, col2, col3, col4 = st.columns(4)
     with col1:
-        st.metric("Total Clauses", len(results))
+        st.metric("Total Clauses", stats['total'])
     with col2:
-        st.metric("Compliance Rate", f"{compliant_percentage:.0f}%")
+        st.metric("Compliance Rate", f"{stats['compliance_rate']:.0f}%")
     with col3:
-        st.metric("High Risk Clauses", high_risk_count)
+        st.metric("High Risk Clauses", stats['high'])
     with col4:
-        st.metric("Avg Risk Score", f"{avg_risk:.0f}%")
-    if compliant > 0:
-        st.success(f"✓ {compliant} clauses compliant")
+        st.metric("Avg Risk Score", f"{stats['avg_risk']:.0f}%")
+    if stats['compliant'] > 0:
+        st.success(f"✓ {stats['compliant']} clauses compliant")
     else:
         st.warning("⚠️ No fully compliant clauses found")
 
-def create_summary_insights(results):
+def counter_total(trace, name, **labels):
+    return sum(
+        c['value'] for c in trace['counters']
+        if c['name'] == name and all(c['labels'].get(k) == v for k, v in labels.items())
+    )
+
+def show_run_timing(trace):
+    """Where the analysis run's time went, from the trace its worker exported."""
+    import plotly.express as px
+
+    st.header("⏱️ Run Timing")
+    if not trace:
+        st.info("No timing data was recorded for this run.")
+        return
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Wall Time", f"{trace['wall_seconds']:.1f}s")
+    with col2:
+        st.metric("LLM Requests", counter_total(trace, 'llm_requests_total'))
+    with col3:
+        st.metric("Model Fallbacks", counter_total(trace, 'fallbacks_total') + counter_total(trace, 'batch_fallbacks_total'))
+    with col4:
+        st.metric("Retries", counter_total(trace, 'rate_limit_retries_total') + counter_total(trace, 'parse_retries_total'))
+
+    stages = pd.DataFrame(trace['stages'])
+    by_stage = stages.groupby('stage', as_index=False)[['self_seconds', 'count']].sum().sort_values('self_seconds', ascending=False)
+    fig = px.bar(by_stage, x='self_seconds', y='stage', orientation='h', title="Time by Stage (summed across threads)")
+    fig.update_layout(yaxis={'categoryorder': 'total ascending'}, xaxis_title="seconds")
+    st.plotly_chart(fig, use_container_width=True)
+
+    requests = stages[stages['stage'] == 'llm_request']
+    if not requests.empty:
+        st.subheader("Per Model")
+        per_model = pd.DataFrame([
+            {
+                'model': row['labels'].get('model'),
+                'requests': row['count'],
+                'avg latency (s)': row['seconds'] / row['count'],
+                'max latency (s)': row['max_seconds'],
+                'prompt tokens': counter_total(trace, 'llm_tokens_total', model=row['labels'].get('model'), kind='prompt'),
+                'completion tokens': counter_total(trace, 'llm_tokens_total', model=row['labels'].get('model'), kind='completion'),
+                'fallbacks': counter_total(trace, 'fallbacks_total', model=row['labels'].get('model'))
+            }
+            for _, row in requests.iterrows()
+        ])
+        st.dataframe(per_model, use_container_width=True, hide_index=True)
+
+def create_summary_insights(results, key=None):
+    key = key or results_hash(results)
+    stats = compute_dashboard_stats(key, results)
     st.header("📋 Summary & Insights")
     st.subheader("Contract Summary")
     st.write("This contract covers data handling, security controls, encryption, and liability.")
-    gdpr_issues = len([r for r in results if 'GDPR' in r.get('regulation', '')])
-    hipaa_issues = len([r for r in results if 'HIPAA' in r.get('regulation', '')])
-    high_risk = len([r for r in results if r['risk_level'] == 'High'])
     summary_points = []
-    if gdpr_issues > 0:
+    if stats['gdpr'] > 0:
         summary_points.append("Data retention terms conflict with GDPR.")
-    if hipaa_issues > 0:
+    if stats['hipaa'] > 0:
         summary_points.append("Access control and encryption measures are compliant.")
-    if high_risk > 0:
+    if stats['high'] > 0:
         summary_points.append("Liability clause is missing, which may increase legal risks.")
     for point in summary_points:
         st.write(f"• {point}")
     st.subheader("⚠️ Key Points to Consider")
     recommendations = []
-    if gdpr_issues > 0:
+    if stats['gdpr'] > 0:
         recommendations.append("Update retention policy to match GDPR timelines.")
-    if any('liability' in r.get('key_clauses', '').lower() for r in results):
+    if stats['mentions_liability']:
         recommendations.append("Include liability clause to reduce legal exposure.")
     if recommendations:
         for rec in recommendations:
@@ -122,26 +295,14 @@ def create_summary_insights(results):
     else:
         st.success("• All clauses appear to be in good standing.")
     st.subheader("💡 Recommendation")
-    high_risk_items = [r for r in results if r['risk_level'] == 'High']
-    medium_risk_items = [r for r in results if r['risk_level'] == 'Medium']
-    total_count = len(results)
-    if high_risk_items:
+    if stats['high']:
         st.error("🚫 Do NOT accept this contract in current form. Review highlighted clauses before approval.")
-    elif len(medium_risk_items) > total_count * 0.5:
+    elif stats['medium'] > stats['total'] * 0.5:
         st.warning("⚠️ Review recommended changes before proceeding with contract approval.")
     else:
         st.success("✅ Contract appears acceptable with minor considerations.")
     st.subheader("Analysis Results")
-    display_data = []
-    for i, result in enumerate(results):
-        display_data.append({
-            'Clause ID': result['clause_id'],
-            'Risk Level': result['risk_level'],
-            'Compliant': '✓' if result['risk_level'] == 'Low' else '✗',
-            'Comments': result['summary'][:50] + '...' if len(result['summary']) > 50 else result['summary']
-        })
-    display_df = pd.DataFrame(display_data)
-    st.dataframe(display_df, use_container_width=True)
+    st.dataframe(build_display_frame(key, results), use_container_width=True)
 
     
     st.markdown("---")
@@ -153,9 +314,8 @@ def create_summary_insights(results):
             st.session_state.show_rewrites = True
             st.rerun()
     if st.session_state.show_rewrites:
-        df = pd.DataFrame(results)
-        high_risk_df = df[df["risk_level"].isin(["High", "Medium"])].copy()
-        if high_risk_df.empty:
+        high_risk = [r for r in results if r["risk_level"] in REWRITE_RISK_LEVELS]
+        if not high_risk:
             st.info("✅ No high-risk clauses were found to rewrite.")
         else:
             display_columns = {
@@ -164,22 +324,67 @@ def create_summary_insights(results):
                 "AI-Modified Clause": "AI-Modified Clause",
                 "AI-Modified Risk Level": "New Risk Level"
             }
-            sugg_df = high_risk_df[list(display_columns.keys())].rename(columns=display_columns)
-            st.dataframe(sugg_df, use_container_width=True, height=400)
-            pdf_data = generate_rewritten_pdf(high_risk_df)
-            st.download_button(
-                label="📄 Download PDF Report",
-                data=pdf_data,
-                file_name="ai_rewritten_clauses_report.pdf",
-                mime="application/pdf",
-            )
+            table = st.empty()
+
+            def render_rewrites():
+                sugg_df = pd.DataFrame(high_risk).reindex(columns=list(display_columns.keys()))
+                sugg_df = sugg_df.fillna("⏳ Rewriting...").rename(columns=display_columns)
+                table.dataframe(sugg_df, use_container_width=True, height=400)
+
+            # Rewrites run only now, in parallel, and each row fills in as soon as it's ready.
+            render_rewrites()
+            pending = len([r for r in high_risk if needs_rewrite(r)])
+            if pending:
+                progress = st.progress(0.0, text=f"Rewriting {pending} clauses...")
+                for done, _ in enumerate(iter_rewrites(high_risk), 1):
+                    render_rewrites()
+                    progress.progress(done / pending, text=f"Rewrote {done}/{pending} clauses")
+                progress.empty()
+            # The PDF is only built when asked for, and rebuilt only if the rewrites changed.
+            pdf_key = results_hash(high_risk)
+            if st.session_state.get('pdf_key') != pdf_key:
+                if st.button("📄 Prepare PDF Report"):
+                    with st.spinner("Building PDF report..."):
+                        st.session_state.pdf_data = generate_rewritten_pdf(pd.DataFrame(high_risk))
+                    st.session_state.pdf_key = pdf_key
+                    st.rerun()
+            else:
+                st.download_button(
+                    label="📄 Download PDF Report",
+                    data=st.session_state.pdf_data,
+                    file_name="ai_rewritten_clauses_report.pdf",
+                    mime="application/pdf",
+                )
    
 
+def show_job_status():
+    journal = get_job_journal()
+    if journal is None:
+        return
+    jobs = journal.list_jobs(limit=10)
+    with st.sidebar:
+        st.subheader("🗂️ Analysis Jobs")
+        if not jobs:
+            st.caption("No analysis jobs yet.")
+        for job in jobs:
+            total = job['total'] or "?"
+            icon = {'completed': '✅', 'running': '⏳', 'failed': '⚠️'}.get(job['status'], '•')
+            st.write(f"{icon} **{job['contract_name']}** — {job['status']} ({job['done']}/{total} clauses)")
+            if job['status'] == 'failed':
+                st.caption(f"{job['error']}. Re-upload the same file to resume.")
+            elif job['resumed']:
+                st.caption(f"Resumed with {job['resumed']} checkpointed clauses.")
+
 def main():
     initialize_session_state()
+    start_job_workers()
+    show_job_status()
     st.title("⚖️ AI-Powered Compliance Dashboard ⚖️")
     st.write("Upload your contract • Analyze • View results in an elegant dashboard")
-    if not st.session_state.analysis_complete:
+    if st.session_state.queue_id is not None and not st.session_state.analysis_complete:
+        st.markdown("---")
+        show_job_progress(st.session_state.queue_id)
+    elif not st.session_state.analysis_complete:
         st.markdown("---")
         st.subheader("📁 Upload a Contract")
         uploaded_file = st.file_uploader(
@@ -191,25 +396,22 @@ def main():
             st.success(f"✅ Uploaded: {uploaded_file.name}")
             st.session_state.contract_name = uploaded_file.name
             if st.button("🔍 Submit for Analysis", type="primary"):
-                with st.spinner("Analyzing contract... This may take a few minutes."):
-                    results = analyze_contract(uploaded_file)
-                    if results:
-                        st.session_state.analysis_results = results
-                        st.session_state.analysis_complete = True
-                        st.success("✅ Contract analyzed successfully!")
-                        st.rerun()
+                queue_id = analyze_contract(uploaded_file)
+                if queue_id is not None:
+                    st.session_state.queue_id = queue_id
+                    st.rerun()
     if st.session_state.analysis_complete and st.session_state.analysis_results:
         st.success("✅ Contract analyzed successfully!")
-        tab1, tab2 = st.tabs(["📊 Dashboard", "📋 Summary & Insights"])
+        tab1, tab2, tab3 = st.tabs(["📊 Dashboard", "📋 Summary & Insights", "⏱️ Timing"])
         with tab1:
-            create_dashboard(st.session_state.analysis_results)
+            create_dashboard(st.session_state.analysis_results, st.session_state.results_hash)
         with tab2:
-            create_summary_insights(st.session_state.analysis_results)
+            create_summary_insights(st.session_state.analysis_results, st.session_state.results_hash)
+        with tab3:
+            show_run_timing(st.session_state.run_trace)
         st.markdown("---")
         if st.button("🔄 Analyze Another Contract"):
-            st.session_state.analysis_complete = False
-            st.session_state.analysis_results = None
-            st.session_state.contract_name = ""
+            reset_analysis()
             st.rerun()
 
 if __name__ == "__main__":
@@ -0,0 +1,185 @@
+# async_llm_analyzer.py
+#
+# asyncio counterparts of the llm_analyzer functions. Prompts and parsers are
+# shared with llm_analyzer; only the transport differs (AsyncGroq and a pooled
+# httpx.AsyncClient for GitHub Models), so both APIs always return the same shapes.
+
+import os
+import time
+import asyncio
+import weakref
+from config import ASYNC_HTTP_MAX_CONNECTIONS, ASYNC_HTTP_TIMEOUT_SECONDS, HTTP2_ENABLED, RESPONSE_PARSE_RETRIES
+from http_session import record_latency, http2_available, build_retry_transport
+from clause_batcher import estimate_tokens
+import telemetry
+from rate_limiter import run_rate_limited_async
+from response_parser import ParseError, build_repair_prompt
+from llm_analyzer import (
+    record_usage,
+    _github_request,
+    build_analysis_prompt,
+    parse_analysis_response,
+    build_key_clauses_prompt,
+    build_combined_prompt,
+    parse_combined_response,
+    build_batch_prompt,
+    parse_batch_response,
+    batch_max_tokens,
+    build_modify_prompt,
+    parse_modify_response
+)
+
+# httpx connection pools belong to the event loop that created them, so
+# clients are kept per running loop.
+_clients = weakref.WeakKeyDictionary()
+
+
+def _loop_clients():
+    loop = asyncio.get_running_loop()
+    clients = _clients.get(loop)
+    if clients is None:
+        import httpx
+        limits = httpx.Limits(
+            max_connections=ASYNC_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=ASYNC_HTTP_MAX_CONNECTIONS
+        )
+        timeout = httpx.Timeout(ASYNC_HTTP_TIMEOUT_SECONDS)
+        # Same retry policy as http_session's transports. The client ignores its
+        # own limits/http2 when given a transport, so they go on the transport.
+        transport = build_retry_transport(
+            "github",
+            asynchronous=True,
+            http2=HTTP2_ENABLED and http2_available(),
+            limits=limits
+        )
+        clients = {
+            "http": httpx.AsyncClient(transport=transport, timeout=timeout),
+            "groq": None
+        }
+        _clients[loop] = clients
+    return clients
+
+
+def _groq_client():
+    clients = _loop_clients()
+    if clients["groq"] is None:
+        from groq import AsyncGroq
+        # The SDK's own retries would resend on 5xx and 429; see http_session.
+        clients["groq"] = AsyncGroq(
+            api_key=os.getenv("GROQ_API_KEY"),
+            http_client=clients["http"],
+            max_retries=0
+        )
+    return clients["groq"]
+
+
+async def aclose_clients():
+    """Closes the pooled clients of the running loop. Call before the loop shuts down."""
+    clients = _clients.pop(asyncio.get_running_loop(), None)
+    if clients:
+        await clients["http"].aclose()
+
+
+async def _call_github_models_api(config, prompt, max_tokens, response_format=None):
+    headers, data = _github_request(config, prompt, max_tokens, response_format)
+    start = time.perf_counter()
+    try:
+        response = await _loop_clients()["http"].post(config["api_url"], headers=headers, json=data)
+    finally:
+        record_latency(config["provider"], time.perf_counter() - start)
+    response.raise_for_status()
+    result = response.json()
+    usage = result.get("usage") or {}
+    record_usage(config["model_id"], usage.get("prompt_tokens"), usage.get("completion_tokens"))
+    return result["choices"][0]["message"]["content"].strip(), response.headers, usage.get("total_tokens")
+
+
+async def _call_groq_api(config, prompt, max_tokens, response_format=None):
+    kwargs = {"response_format": response_format} if response_format else {}
+    start = time.perf_counter()
+    try:
+        raw = await _groq_client().chat.completions.with_raw_response.create(
+            model=config["model_id"],
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=max_tokens,
+            **kwargs
+        )
+    finally:
+        record_latency("groq", time.perf_counter() - start)
+    chat = await raw.parse()
+    usage = chat.usage
+    record_usage(
+        config["model_id"],
+        usage.prompt_tokens if usage else None,
+        usage.completion_tokens if usage else None
+    )
+    return chat.choices[0].message.content.strip(), raw.headers, usage.total_tokens if usage else None
+
+
+async def _complete(config, prompt, max_tokens, response_format=None):
+    if config["provider"] == "groq":
+        send = _call_groq_api
+    elif config["provider"] in ("github", "mock"):
+        send = _call_github_models_api
+    else:
+        raise ValueError(f"Unknown provider: {config['provider']}")
+    with telemetry.span("llm_request", model=config["model_id"]):
+        return await run_rate_limited_async(
+            config["provider"],
+            estimate_tokens(prompt) + max_tokens,
+            lambda: send(config, prompt, max_tokens, response_format=response_format)
+        )
+
+
+async def _complete_parsed(config, prompt, max_tokens, parse, response_format=None):
+    """See llm_analyzer._complete_parsed."""
+    result = await _complete(config, prompt, max_tokens, response_format=response_format)
+    for attempt in range(RESPONSE_PARSE_RETRIES + 1):
+        try:
+            return parse(result)
+        except ParseError as e:
+            if attempt == RESPONSE_PARSE_RETRIES:
+                raise
+            print(f"⚠️ Unparseable response from {config['model_id']} ({e}); asking for a corrected answer.")
+            telemetry.count("parse_retries_total", model=config["model_id"])
+            result = await _complete(config, build_repair_prompt(prompt, result, e), max_tokens, response_format=response_format)
+
+
+async def analyze_clause(config, clause):
+    return await _complete_parsed(config, build_analysis_prompt(clause), 200, parse_analysis_response)
+
+
+async def extract_key_clauses(config, clause):
+    return await _complete(config, build_key_clauses_prompt(clause), max_tokens=100)
+
+
+async def analyze_clause_combined(config, clause):
+    return await _complete_parsed(
+        config,
+        build_combined_prompt(clause),
+        250,
+        parse_combined_response,
+        response_format={"type": "json_object"}
+    )
+
+
+async def analyze_clauses_batch(config, clauses):
+    result = await _complete(
+        config,
+        build_batch_prompt(clauses),
+        max_tokens=batch_max_tokens(len(clauses)),
+        response_format={"type": "json_object"}
+    )
+    return parse_batch_response(result, len(clauses))
+
+
+async def modify_clause(config, clause, risk_level):
+    if risk_level.lower() == "low":
+        return clause, "Low"
+    return await _complete_parsed(
+        config,
+        build_modify_prompt(clause, risk_level),
+        400,
+        parse_modify_response,
+        response_format={"type": "json_object"}
+    )
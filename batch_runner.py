@@ -0,0 +1,197 @@
+# batch_runner.py
+#
+# Multi-document batch engine used by contract_analyzer.batch_analyze_contracts.
+# Extraction and chunking run in a process pool, every document's clauses feed
+# one shared LLM thread pool (so the provider rate limiters see the whole
+# sweep), and one shared result sink (Sheets in micro-batches plus the local
+# result stores) records clauses as they finish.
+#
+#   python batch_runner.py contracts/
+#   python batch_runner.py "vendor_contracts/**/*.pdf" --extract-workers 4
+
+import os
+import sys
+import glob
+import argparse
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
+import telemetry
+from config import BATCH_EXTRACT_WORKERS, LLM_MAX_WORKERS
+from data_handler import connect_sheet, iter_text_from_file, iter_semantic_chunks
+from job_journal import start_job
+from clause_triage import iter_triaged
+
+SUPPORTED_EXTENSIONS = (".pdf", ".docx")
+
+
+def extract_and_chunk(file_path):
+    """Process-pool task: parse and chunk one contract. Each worker process loads the embedding model once."""
+    # Documents are already spread across processes here, so pages aren't sharded further.
+    return list(iter_semantic_chunks(iter_text_from_file(file_path, parallel=False)))
+
+
+def collect_contract_files(patterns):
+    """Expands directories and glob patterns into a sorted list of .pdf/.docx paths."""
+    paths = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for extension in SUPPORTED_EXTENSIONS:
+                paths.update(glob.glob(os.path.join(pattern, "**", f"*{extension}"), recursive=True))
+        else:
+            paths.update(p for p in glob.glob(pattern, recursive=True) if p.endswith(SUPPORTED_EXTENSIONS))
+    return sorted(paths)
+
+
+class DocumentProgress:
+    def __init__(self, file_path, total, sink, on_complete, progress=None, contract=None, job=None):
+        self.file_path = file_path
+        self.contract = contract
+        self.job = job
+        self.total = total
+        self.done = 0
+        self.results = []
+        self.sink = sink
+        self._on_complete = on_complete
+        self._progress = progress
+        self._lock = threading.Lock()
+
+    def add(self, outputs):
+        results = []
+        with self._lock:
+            for result, row in outputs:
+                self.done += 1
+                if result and row:
+                    self.results.append(result)
+                    results.append(result)
+            done, complete = self.done, self.done >= self.total
+        self.sink.add(self.contract, results)
+        if self.job:
+            self.job.record(results)
+        if self._progress:
+            self._progress(self.file_path, done, self.total)
+        if complete:
+            self.complete()
+
+    def complete(self):
+        self.results.sort(key=lambda x: x['clause_id'])
+        if self.job:
+            self.job.finish()
+        self._on_complete(self)
+
+
+def print_progress(file_path, done, total):
+    print(f"[{os.path.basename(file_path)}] {done}/{total} clauses analyzed")
+
+
+@telemetry.traced_run
+def run_batch(file_paths, extract_workers=BATCH_EXTRACT_WORKERS, llm_workers=LLM_MAX_WORKERS, progress=print_progress):
+    """
+    Analyzes many contracts at once and returns {file_path: analysis_results},
+    with None for files that could not be processed.
+    """
+    # Imported here because contract_analyzer.batch_analyze_contracts imports this module.
+    from contract_analyzer import (
+        open_sheet_sink, open_result_sink, describe_contract, restore_resumed_results,
+        build_clause_result, combined_to_analysis, iter_clause_batches, analyze_clause_batch, print_run_stats
+    )
+
+    results = {file_path: None for file_path in file_paths}
+    with telemetry.span("sheet_connect"):
+        wks = connect_sheet()
+    if not wks:
+        print("Failed to connect to Google Sheets")
+        return results
+    sheet_sink = open_sheet_sink(wks)
+    sink = open_result_sink(sheet_sink)
+
+    def on_complete(document):
+        results[document.file_path] = document.results
+        print(f"✅ Finished {document.file_path}: {len(document.results)}/{document.total} clauses analyzed.")
+
+    # spawn keeps torch/tokenizer threads in the parent from being forked into the workers.
+    context = multiprocessing.get_context("spawn")
+    llm_futures = []
+    try:
+        with ProcessPoolExecutor(max_workers=extract_workers, mp_context=context) as extract_pool, \
+                ThreadPoolExecutor(max_workers=llm_workers) as llm_pool:
+            extract_futures = {extract_pool.submit(extract_and_chunk, path): path for path in file_paths}
+
+            for future in as_completed(extract_futures):
+                file_path = extract_futures[future]
+                try:
+                    clauses = future.result()
+                except Exception as e:
+                    print(f"❌ Could not read {file_path}: {e}")
+                    continue
+                print(f"Extracted {len(clauses)} clauses from {file_path}.")
+                if not clauses:
+                    results[file_path] = []
+                    continue
+
+                contract = describe_contract(file_path)
+                job = start_job(contract)
+                triaged = []
+                # IDs are drawn lazily, so clauses resumed from the journal don't use any up.
+                pending = list(iter_triaged(
+                    job.iter_pending(clauses, sheet_sink.iter_ids()),
+                    lambda clause, clause_id, verdict: triaged.append(
+                        build_clause_result(clause, clause_id, combined_to_analysis(verdict))
+                    )
+                ))
+                restore_resumed_results(job, wks, sink, contract, [], threading.Lock())
+
+                document = DocumentProgress(
+                    file_path, len(pending) + len(triaged), sink, on_complete, progress, contract=contract, job=job
+                )
+                document.results.extend(job.resumed_results)
+                if not pending and not triaged:
+                    document.complete()
+                    continue
+                if triaged:
+                    document.add(triaged)
+                for batch in iter_clause_batches(pending):
+                    llm_future = llm_pool.submit(telemetry.bind(analyze_clause_batch), batch)
+                    llm_future.add_done_callback(telemetry.bind(_record_batch(document, batch)))
+                    llm_futures.append(llm_future)
+
+            wait(llm_futures)
+    finally:
+        sink.close()
+    print_run_stats()
+    return results
+
+
+def _record_batch(document, batch):
+    def callback(future):
+        try:
+            outputs = future.result()
+        except Exception as e:
+            print(f"Error processing batch result: {e}")
+            outputs = [(None, None)] * len(batch)
+        document.add(outputs)
+    return callback
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyze every contract in a directory or glob.")
+    parser.add_argument("paths", nargs="+", help="Directories and/or glob patterns of .pdf/.docx contracts")
+    parser.add_argument("--extract-workers", type=int, default=BATCH_EXTRACT_WORKERS)
+    parser.add_argument("--llm-workers", type=int, default=LLM_MAX_WORKERS)
+    args = parser.parse_args(argv)
+
+    file_paths = collect_contract_files(args.paths)
+    if not file_paths:
+        print("No .pdf or .docx contracts matched.")
+        return 1
+    print(f"Analyzing {len(file_paths)} contracts...")
+    results = run_batch(file_paths, extract_workers=args.extract_workers, llm_workers=args.llm_workers)
+    failed = [path for path, result in results.items() if result is None]
+    print(f"Done: {len(file_paths) - len(failed)} succeeded, {len(failed)} failed.")
+    for path in failed:
+        print(f"  ❌ {path}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+# benchmarks/bench_analysis_modes.py
+#
+# Compares the "two_call" path (analyze_clause + extract_key_clauses) with the
+# single "combined" JSON completion on the same clauses and the same model.
+#
+#   python benchmarks/bench_analysis_modes.py --model primary --limit 20
+#   python benchmarks/bench_analysis_modes.py --file contract.pdf
+
+import os
+import sys
+import time
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import MODEL_CONFIG
+from llm_analyzer import (
+    analyze_clause,
+    extract_key_clauses,
+    analyze_clause_combined,
+    get_usage_stats,
+    reset_usage_stats
+)
+
+SAMPLE_CLAUSES = [
+    "The Processor shall retain Personal Data for as long as it deems necessary for its business purposes.",
+    "Either party may terminate this Agreement upon thirty (30) days written notice to the other party.",
+    "The Vendor's total liability under this Agreement shall be unlimited.",
+    "Protected Health Information may be disclosed to subcontractors without a business associate agreement.",
+    "This Agreement may be executed in counterparts, each of which shall be deemed an original.",
+    "All Confidential Information shall be returned or destroyed within ten (10) days of termination.",
+    "The Customer consents to the transfer of personal data to any country at the Supplier's discretion.",
+    "The Supplier shall encrypt all data at rest and in transit using industry-standard algorithms.",
+]
+
+
+def _two_call(config, clause):
+    analysis = analyze_clause(config, clause)
+    analysis.key_phrases = extract_key_clauses(config, clause).strip()
+    return analysis
+
+
+def run_mode(name, fn, config, clauses):
+    reset_usage_stats()
+    latencies, failures = [], 0
+    for clause in clauses:
+        start = time.perf_counter()
+        try:
+            fn(config, clause)
+        except Exception as e:
+            failures += 1
+            print(f"❌ {name} failed: {e}")
+        latencies.append(time.perf_counter() - start)
+
+    usage = get_usage_stats().get(config["model_id"], {})
+    count = len(clauses)
+    return {
+        "mode": name,
+        "clauses": count,
+        "failures": failures,
+        "requests": usage.get("requests", 0),
+        "p50_s": statistics.median(latencies) if latencies else 0.0,
+        "mean_s": statistics.mean(latencies) if latencies else 0.0,
+        "prompt_tokens_per_clause": usage.get("prompt_tokens", 0) / count if count else 0.0,
+        "completion_tokens_per_clause": usage.get("completion_tokens", 0) / count if count else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two_call and combined clause analysis.")
+    parser.add_argument("--model", default="primary", help="Key in MODEL_CONFIG")
+    parser.add_argument("--file", help="Contract (.pdf/.docx) to chunk instead of the built-in sample clauses")
+    parser.add_argument("--limit", type=int, default=len(SAMPLE_CLAUSES))
+    args = parser.parse_args()
+
+    config = MODEL_CONFIG[args.model]
+    if args.file:
+        from data_handler import extract_text_from_file, semantic_chunking
+        clauses = semantic_chunking(extract_text_from_file(args.file))
+    else:
+        clauses = SAMPLE_CLAUSES
+    clauses = clauses[:args.limit]
+
+    print(f"Benchmarking {len(clauses)} clauses on {config['model_id']} ({config['provider']})")
+    results = [
+        run_mode("two_call", _two_call, config, clauses),
+        run_mode("combined", analyze_clause_combined, config, clauses),
+    ]
+    header = f"{'mode':<10}{'requests':>10}{'fail':>6}{'p50 s':>9}{'mean s':>9}{'in tok/cl':>11}{'out tok/cl':>12}"
+    print(header)
+    for r in results:
+        print(
+            f"{r['mode']:<10}{r['requests']:>10}{r['failures']:>6}{r['p50_s']:>9.2f}{r['mean_s']:>9.2f}"
+            f"{r['prompt_tokens_per_clause']:>11.0f}{r['completion_tokens_per_clause']:>12.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+# benchmarks/bench_chunking.py
+#
+# Compares semantic chunking backends on one document: LangChain's
+# SemanticChunker (EMBEDDING_BACKEND=langchain) against
+# embedding_backend.SemanticSplitter with the torch, int8 and onnx encoders at
+# several batch sizes. Each configuration runs in a fresh subprocess, so model
+# load time and peak RSS are per configuration. Each one chunks the document
+# twice. The second pass runs with the sentence cache warm, as when the same
+# clauses turn up in the next contract.
+#
+# Boundary agreement is measured against the first configuration (langchain by
+# default). Precision is the share of our boundaries it also has, recall the
+# share of its boundaries we reproduce, and "same" whether the chunk lists are
+# identical.
+#
+#   python benchmarks/bench_chunking.py
+#   python benchmarks/bench_chunking.py --file contract.pdf --backends langchain,torch,int8,onnx --batch-sizes 32,64,128
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import subprocess
+from itertools import accumulate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+RESULT_PREFIX = "BENCH_RESULT "
+
+PARTIES = ["the Supplier", "the Customer", "the Processor", "the Controller", "the Vendor", "the Provider"]
+TOPICS = [
+    [
+        "{a} shall process Personal Data only on documented instructions from {b}.",
+        "{a} shall notify {b} of any Personal Data breach within {n} hours.",
+        "Data subjects may exercise their rights of access and erasure at any time.",
+        "{a} shall not transfer Personal Data outside the EEA without the consent of {b}.",
+    ],
+    [
+        "Protected Health Information may only be disclosed to subcontractors approved by {b}.",
+        "{a} shall retain medical records for {n} years and then destroy them securely.",
+        "Patients shall be informed of any unauthorized use of their health information.",
+    ],
+    [
+        "The total liability of {a} shall not exceed {n} times the annual fees paid by {b}.",
+        "{a} shall indemnify {b} against all losses arising from third party claims.",
+        "Neither party shall be liable for indirect or consequential damages.",
+    ],
+    [
+        "Invoices issued by {a} are payable by {b} within {n} days of the invoice date.",
+        "Late payments accrue interest at {n} percent per annum.",
+        "{b} may dispute an invoice in good faith by written notice to {a}.",
+    ],
+    [
+        "This Agreement may be executed in counterparts, each of which shall be an original.",
+        "The headings in this Agreement are for convenience only.",
+        "This Agreement constitutes the entire agreement between the parties.",
+    ],
+]
+
+
+def make_text(sentences, seed=0):
+    """Synthetic contract text: paragraphs of 3-12 sentences, each paragraph on one topic."""
+    rng = random.Random(seed)
+    paragraphs = []
+    written = 0
+    while written < sentences:
+        topic = rng.choice(TOPICS)
+        size = min(rng.randint(3, 12), sentences - written)
+        parts = []
+        for _ in range(size):
+            a, b = rng.sample(PARTIES, 2)
+            parts.append(rng.choice(topic).format(a=a, b=b, n=rng.randint(2, 365)))
+        paragraphs.append(f"{len(paragraphs) + 1}. " + " ".join(parts))
+        written += size
+    return "\n".join(paragraphs)
+
+
+def boundaries(chunks):
+    """Character offsets of the chunk boundaries (chunks are sentences joined by single spaces)."""
+    return set(accumulate(len(chunk) + 1 for chunk in chunks[:-1]))
+
+
+def run_single(path):
+    """Child process: chunk the text twice with the configured backend and print a RESULT_PREFIX JSON line."""
+    import resource
+    from embedding_registry import get_chunker, get_stats
+
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    start = time.perf_counter()
+    chunker = get_chunker()
+    load_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    chunks = chunker.split_text(text)
+    cold_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    chunker.split_text(text)
+    warm_seconds = time.perf_counter() - start
+
+    caches = list(get_stats()["embedding_cache"].values())
+    print(RESULT_PREFIX + json.dumps({
+        "backend": caches[0]["backend"] if caches else "langchain",
+        "load_seconds": load_seconds,
+        "cold_seconds": cold_seconds,
+        "warm_seconds": warm_seconds,
+        "chunks": chunks,
+        # ru_maxrss is in KiB on Linux.
+        "peak_rss_mib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }), flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark semantic chunking backends for speed and boundary agreement.")
+    parser.add_argument("--file", help="PDF/DOCX to chunk (default: synthetic contract text)")
+    parser.add_argument("--sentences", type=int, default=2000, help="Sentences of synthetic text")
+    parser.add_argument("--backends", default="langchain,torch,int8,onnx", help="Comma-separated EMBEDDING_BACKEND values; the first is the reference")
+    parser.add_argument("--batch-sizes", default="32,64,128", help="EMBEDDING_BATCH_SIZE values to try for the non-langchain backends")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--single", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        run_single(args.single)
+        return
+
+    if args.file:
+        from data_handler import extract_text_from_file
+        text = extract_text_from_file(args.file)
+    else:
+        text = make_text(args.sentences, seed=args.seed)
+    batch_sizes = [int(s) for s in args.batch_sizes.split(",") if s.strip()]
+    configs = []
+    for backend in [b.strip() for b in args.backends.split(",") if b.strip()]:
+        configs += [(backend, None)] if backend == "langchain" else [(backend, size) for size in batch_sizes]
+
+    rows = []
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "text.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        for backend, batch_size in configs:
+            label = backend if batch_size is None else f"{backend}/{batch_size}"
+            print(f"▶️ {label} on {len(text)} characters...")
+            env = dict(os.environ, EMBEDDING_BACKEND=backend)
+            if batch_size:
+                env["EMBEDDING_BATCH_SIZE"] = str(batch_size)
+            proc = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--single", path],
+                env=env, cwd=ROOT, capture_output=True, text=True
+            )
+            line = next((l for l in reversed(proc.stdout.splitlines()) if l.startswith(RESULT_PREFIX)), None)
+            if line is None:
+                print(f"❌ {label} failed:\n{proc.stdout[-2000:]}{proc.stderr[-2000:]}")
+                continue
+            row = json.loads(line[len(RESULT_PREFIX):])
+            row["label"] = label if row["backend"] == backend else f"{label} (ran as {row['backend']})"
+            rows.append(row)
+
+    if not rows:
+        return
+    reference = rows[0]
+    expected = boundaries(reference["chunks"])
+    print(f"Agreement is measured against {reference['label']} ({len(reference['chunks'])} chunks).")
+    print(f"{'backend':<24}{'load s':>8}{'cold s':>8}{'warm s':>8}{'chunks':>8}{'prec':>7}{'recall':>8}{'same':>6}{'RSS MiB':>9}")
+    for r in rows:
+        found = boundaries(r["chunks"])
+        common = len(found & expected)
+        precision = common / len(found) if found else float(not expected)
+        recall = common / len(expected) if expected else float(not found)
+        print(
+            f"{r['label']:<24}{r['load_seconds']:>8.2f}{r['cold_seconds']:>8.2f}{r['warm_seconds']:>8.2f}"
+            f"{len(r['chunks']):>8}{precision:>7.2f}{recall:>8.2f}{'yes' if r['chunks'] == reference['chunks'] else 'no':>6}"
+            f"{r['peak_rss_mib']:>9.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+# benchmarks/bench_pipeline.py
+#
+# End-to-end throughput of analyze_contract_file with no credentials: LLM
+# calls go to mock_llm_server.py (the "mock" MODEL_CONFIG entry) and sheet
+# writes to the in-memory LocalWorksheet (SHEET_BACKEND=local). Synthetic
+# .docx contracts of each size run in a fresh subprocess, so peak RSS is per
+# size. Semantic chunking still uses the local embedding model, so the number
+# of clauses analyzed can differ a little from the number of paragraphs
+# generated; the report uses the clauses actually analyzed.
+#
+#   python benchmarks/bench_pipeline.py
+#   python benchmarks/bench_pipeline.py --sizes 10,100 --latency-ms 50 --error-rate 0.02 --rate-limit-rate 0.05
+#   python benchmarks/bench_pipeline.py --engine async --sizes 1000
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+RESULT_PREFIX = "BENCH_RESULT "
+
+PARTIES = ["the Supplier", "the Customer", "the Processor", "the Controller", "the Vendor", "the Provider"]
+TEMPLATES = [
+    "{a} shall process Personal Data only on documented instructions from {b} for a period of {n} days.",
+    "{a} shall notify {b} of any Personal Data breach within {n} hours of becoming aware of it.",
+    "Protected Health Information may be disclosed by {a} to subcontractors approved by {b} within {n} days.",
+    "{a} shall maintain the confidentiality of all Confidential Information for {n} years after termination.",
+    "Either party may terminate this Agreement upon {n} days written notice to the other party.",
+    "The total liability of {a} under this Agreement shall not exceed {n} times the annual fees paid by {b}.",
+    "{a} shall indemnify {b} against all losses arising from third party claims up to {n} thousand euros.",
+    "{a} warrants that the services will be performed with reasonable skill and care for {n} months.",
+    "Invoices issued by {a} are payable by {b} within {n} days of the invoice date.",
+    "{a} shall obtain the consent of data subjects before transferring data outside the EEA within {n} days.",
+]
+
+
+def make_contract(path, paragraphs, seed=0):
+    """Writes a .docx with `paragraphs` distinct synthetic clauses."""
+    import docx
+
+    rng = random.Random(seed)
+    doc = docx.Document()
+    for i in range(paragraphs):
+        a, b = rng.sample(PARTIES, 2)
+        doc.add_paragraph(f"{i + 1}. " + rng.choice(TEMPLATES).format(a=a, b=b, n=rng.randint(2, 365)))
+    doc.save(path)
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))] if values else 0.0
+
+
+def run_single(path, engine):
+    """Child process: analyze one contract and print a RESULT_PREFIX JSON line."""
+    import resource
+    from contract_analyzer import analyze_contract_file, analyze_contract_file_async
+    from llm_analyzer import get_usage_stats
+
+    done_at = []
+    start = time.perf_counter()
+
+    def on_result(result):
+        done_at.append(time.perf_counter() - start)
+
+    if engine == "async":
+        import asyncio
+        results = asyncio.run(analyze_contract_file_async(path, on_result=on_result))
+    else:
+        results = analyze_contract_file(path, on_result=on_result)
+    elapsed = time.perf_counter() - start
+
+    usage = get_usage_stats().get("mock-llm", {})
+    clauses = len(results or [])
+    tokens = usage.get("prompt_tokens", 0) + usage.get("completion_tokens", 0)
+    print(RESULT_PREFIX + json.dumps({
+        "clauses": clauses,
+        "seconds": elapsed,
+        "clauses_per_second": clauses / elapsed if elapsed else 0.0,
+        "result_p50_s": percentile(done_at, 0.50),
+        "result_p95_s": percentile(done_at, 0.95),
+        "requests": usage.get("requests", 0),
+        "tokens_per_clause": tokens / clauses if clauses else 0.0,
+        # ru_maxrss is in KiB on Linux.
+        "peak_rss_mib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }), flush=True)
+
+
+def child_env(workdir, port, with_caches):
+    env = dict(
+        os.environ,
+        SHEET_BACKEND="local",
+        MODEL_PREFERENCE_ORDER="mock",
+        MOCK_LLM_PORT=str(port),
+        RESULT_STORE_SQLITE_PATH=os.path.join(workdir, "results.sqlite3"),
+        RESULT_STORE_PARQUET_DIR=os.path.join(workdir, "parquet"),
+        JOB_JOURNAL_PATH=os.path.join(workdir, "jobs.sqlite3"),
+        CLAUSE_CACHE_PATH=os.path.join(workdir, "clause_cache.sqlite3"),
+        CLAUSE_INDEX_PATH=os.path.join(workdir, "clause_index.sqlite3"),
+        EXTRACT_CACHE_PATH=os.path.join(workdir, "extracted_text.sqlite3"),
+    )
+    if not with_caches:
+        env.update(CLAUSE_CACHE_ENABLED="false", CLAUSE_INDEX_ENABLED="false", EXTRACT_CACHE_ENABLED="false")
+    return env
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark analyze_contract_file against the mock LLM server.")
+    parser.add_argument("--sizes", default="10,100,1000,5000", help="Comma-separated paragraph counts")
+    parser.add_argument("--engine", choices=["threads", "async"], default="threads")
+    parser.add_argument("--latency-ms", type=float, help="Median mock request latency (default MOCK_LLM_LATENCY_MS)")
+    parser.add_argument("--error-rate", type=float, help="Share of requests answered with a 500")
+    parser.add_argument("--rate-limit-rate", type=float, help="Share of requests answered with a 429")
+    parser.add_argument("--with-caches", action="store_true", help="Keep the clause cache, near-duplicate index and extraction cache on")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--single", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        run_single(args.single, args.engine)
+        return
+
+    from mock_llm_server import MockLLMServer
+
+    overrides = {
+        key: value for key, value in (
+            ("latency_ms", args.latency_ms),
+            ("error_rate", args.error_rate),
+            ("rate_limit_rate", args.rate_limit_rate),
+        ) if value is not None
+    }
+    rows = []
+    with tempfile.TemporaryDirectory() as workdir, MockLLMServer(port=0, seed=args.seed, **overrides) as server:
+        port = int(server.url.split(":")[2].split("/")[0])
+        for size in [int(s) for s in args.sizes.split(",") if s.strip()]:
+            path = os.path.join(workdir, f"contract_{size}.docx")
+            make_contract(path, size, seed=args.seed)
+            server.reset_stats()
+            print(f"▶️ {size} paragraphs ({args.engine})...")
+            proc = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--single", path, "--engine", args.engine],
+                env=child_env(os.path.join(workdir, str(size)), port, args.with_caches),
+                cwd=ROOT, capture_output=True, text=True
+            )
+            line = next((l for l in reversed(proc.stdout.splitlines()) if l.startswith(RESULT_PREFIX)), None)
+            if line is None:
+                print(f"❌ Run with {size} paragraphs failed:\n{proc.stdout[-2000:]}{proc.stderr[-2000:]}")
+                continue
+            row = json.loads(line[len(RESULT_PREFIX):])
+            stats = server.get_stats()
+            row.update(
+                paragraphs=size,
+                request_p50_s=stats["p50_seconds"],
+                request_p95_s=stats["p95_seconds"],
+                errors=stats["errors"],
+                throttled=stats["throttled"],
+            )
+            rows.append(row)
+
+    header = (
+        f"{'paras':>6}{'clauses':>8}{'secs':>8}{'cl/s':>8}{'req p50':>9}{'req p95':>9}"
+        f"{'res p50':>9}{'res p95':>9}{'reqs':>7}{'500s':>6}{'429s':>6}{'tok/cl':>8}{'RSS MiB':>9}"
+    )
+    print(header)
+    for r in rows:
+        print(
+            f"{r['paragraphs']:>6}{r['clauses']:>8}{r['seconds']:>8.1f}{r['clauses_per_second']:>8.1f}"
+            f"{r['request_p50_s']:>9.3f}{r['request_p95_s']:>9.3f}{r['result_p50_s']:>9.2f}{r['result_p95_s']:>9.2f}"
+            f"{r['requests']:>7}{r['errors']:>6}{r['throttled']:>6}{r['tokens_per_clause']:>8.0f}{r['peak_rss_mib']:>9.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
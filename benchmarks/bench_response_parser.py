@@ -0,0 +1,111 @@
+# benchmarks/bench_response_parser.py
+#
+# Micro-benchmark of response_parser over a corpus of recorded model outputs
+# (benchmarks/data/recorded_responses.jsonl: one {"format": "text"|"json",
+# "response": ...} per line). The text format is also run through the old
+# splitlines/startswith parser for comparison, which never fails and so can't
+# tell a malformed answer from a good one.
+#
+#   python benchmarks/bench_response_parser.py
+#   python benchmarks/bench_response_parser.py --corpus my_responses.jsonl --repeat 20000
+
+import os
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from response_parser import ParseError, parse_text_analysis, parse_json_analysis
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "recorded_responses.jsonl")
+
+
+def legacy_parse(result):
+    """The line parser response_parser replaced."""
+    regulation = "N/A"
+    summary = "N/A"
+    risk_level = "Unknown"
+    risk_percent = "N/A"
+    for line in result.splitlines():
+        if line.startswith("Regulation:"):
+            regulation = line.replace("Regulation:", "").strip()
+        elif line.startswith("Summary:"):
+            summary = line.replace("Summary:", "").strip()
+        elif line.startswith("Risk:"):
+            risk_level = line.replace("Risk:", "").strip()
+        elif line.startswith("Risk Percentage:"):
+            risk_percent = line.replace("Risk Percentage:", "").strip()
+    return regulation, summary, risk_level, risk_percent
+
+
+def load_corpus(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def run(name, parse, responses, repeat):
+    parsed = failed = 0
+    for response in responses:
+        try:
+            parse(response)
+            parsed += 1
+        except ParseError:
+            failed += 1
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for response in responses:
+            try:
+                parse(response)
+            except ParseError:
+                pass
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    for response in responses:
+        try:
+            parse(response)
+        except ParseError:
+            pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    calls = repeat * len(responses)
+    return {
+        "parser": name,
+        "responses": len(responses),
+        "parsed": parsed,
+        "rejected": failed,
+        "us_per_response": elapsed / calls * 1e6 if calls else 0.0,
+        "peak_kib": peak / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark response parsing over recorded model outputs.")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--repeat", type=int, default=5000)
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    text = [row["response"] for row in corpus if row["format"] == "text"]
+    data = [row["response"] for row in corpus if row["format"] == "json"]
+
+    results = [
+        run("legacy text", legacy_parse, text, args.repeat),
+        run("text", parse_text_analysis, text, args.repeat),
+        run("json", parse_json_analysis, data, args.repeat),
+    ]
+    print(f"{'parser':<13}{'responses':>10}{'parsed':>8}{'rejected':>10}{'us/resp':>10}{'peak KiB':>10}")
+    for r in results:
+        print(
+            f"{r['parser']:<13}{r['responses']:>10}{r['parsed']:>8}{r['rejected']:>10}"
+            f"{r['us_per_response']:>10.2f}{r['peak_kib']:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# benchmarks/bench_startup.py
+#
+# Reports how long each project module takes to import in a fresh interpreter
+# (python -X importtime), plus the heaviest third-party imports it pulls in.
+#
+#   python benchmarks/bench_startup.py
+#   python benchmarks/bench_startup.py --top 15 app
+
+import os
+import sys
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = [
+    "config",
+    "data_handler",
+    "llm_analyzer",
+    "contract_analyzer",
+    "pdf_generator",
+    "app",
+]
+
+
+def import_times(module):
+    """Returns {imported module: cumulative microseconds} for `import module` in a fresh process."""
+    env = dict(os.environ)
+    # Building provider clients needs a key, but we only want import cost here.
+    env.setdefault("GROQ_API_KEY", "benchmark")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        last_line = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "unknown error"
+        raise RuntimeError(last_line)
+
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        try:
+            times[name.strip()] = int(cumulative)
+        except ValueError:
+            continue  # header row
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure per-module import time.")
+    parser.add_argument("modules", nargs="*", default=MODULES)
+    parser.add_argument("--top", type=int, default=5, help="Heaviest dependencies to list per module")
+    args = parser.parse_args()
+
+    for module in args.modules:
+        try:
+            times = import_times(module)
+        except RuntimeError as e:
+            print(f"{module:<20} failed to import: {e}")
+            continue
+        total_ms = times.get(module, 0) / 1000
+        print(f"{module:<20} {total_ms:8.1f} ms")
+        # "site" and friends run before the import under test; leave them out.
+        top_level = {
+            name: us for name, us in times.items()
+            if "." not in name and name not in (module, "site", "encodings")
+        }
+        for name, us in sorted(top_level.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+            print(f"    {name:<24} {us / 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+# clause_batcher.py
+
+import itertools
+from config import BATCH_TOKEN_BUDGET, BATCH_SMALL_CLAUSE_TOKENS, BATCH_MAX_CLAUSES
+
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token) good enough for packing prompts."""
+    return max(1, len(text) // 4)
+
+
+def iter_batches(numbered_clauses, token_budget=BATCH_TOKEN_BUDGET,
+                 small_clause_tokens=BATCH_SMALL_CLAUSE_TOKENS, max_clauses=BATCH_MAX_CLAUSES):
+    """
+    Groups (clause, clause_id) pairs (any iterable, e.g. a streaming chunker)
+    into lists of pairs, yielding each batch as soon as it is full.
+    Consecutive short clauses are packed together until the estimated token
+    budget or max_clauses is reached; anything longer than
+    small_clause_tokens gets a batch of its own.
+    """
+    current = []
+    current_tokens = 0
+
+    for item in numbered_clauses:
+        clause = item[0]
+        tokens = estimate_tokens(clause)
+
+        if tokens > small_clause_tokens:
+            yield [item]
+            continue
+
+        if current and (current_tokens + tokens > token_budget or len(current) >= max_clauses):
+            yield current
+            current, current_tokens = [], 0
+        current.append(item)
+        current_tokens += tokens
+
+    if current:
+        yield current
+
+
+def plan_batches(clauses, starting_id, **kwargs):
+    """List form of iter_batches for clauses numbered consecutively from starting_id."""
+    return list(iter_batches(zip(clauses, itertools.count(starting_id)), **kwargs))
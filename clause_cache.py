@@ -0,0 +1,171 @@
+# clause_cache.py
+
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from config import (
+    CLAUSE_CACHE_ENABLED,
+    CLAUSE_CACHE_PATH,
+    CLAUSE_CACHE_MAX_ENTRIES,
+    CLAUSE_CACHE_TTL_SECONDS,
+    CLAUSE_CACHE_MEMORY_ENTRIES,
+    PROMPT_VERSION,
+    ANALYSIS_MODE
+)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_clause(clause):
+    """Collapses whitespace so re-flowed copies of the same template clause share a key."""
+    return _WHITESPACE.sub(" ", clause).strip()
+
+
+def make_cache_key(clause, model_id, prompt_version=PROMPT_VERSION):
+    # The two analysis modes use different prompts, so they never share entries.
+    payload = f"{prompt_version}:{ANALYSIS_MODE}\x1f{model_id}\x1f{normalize_clause(clause)}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ClauseCache:
+    """
+    Content-addressed store of clause analyses backed by SQLite, with a small
+    in-process LRU in front of it. Entries expire after ttl_seconds and the
+    least recently used rows are evicted once max_entries is exceeded.
+    """
+
+    def __init__(self, path=CLAUSE_CACHE_PATH, max_entries=CLAUSE_CACHE_MAX_ENTRIES,
+                 ttl_seconds=CLAUSE_CACHE_TTL_SECONDS, memory_entries=CLAUSE_CACHE_MEMORY_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.memory_entries = memory_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes_since_evict = 0
+        self.stats = {"hits": 0, "memory_hits": 0, "misses": 0, "expired": 0, "evicted": 0, "writes": 0}
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS clause_cache ("
+            " key TEXT PRIMARY KEY,"
+            " model_id TEXT NOT NULL,"
+            " prompt_version TEXT NOT NULL,"
+            " value TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_clause_cache_access ON clause_cache(last_access)")
+        self._conn.commit()
+
+    def _expired(self, created_at, now):
+        return self.ttl_seconds and now - created_at > self.ttl_seconds
+
+    def _remember(self, key, value, created_at):
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, clause, model_id):
+        key = make_cache_key(clause, model_id)
+        now = time.time()
+        with self._lock:
+            cached = self._memory.get(key)
+            if cached is not None and not self._expired(cached[1], now):
+                self._memory.move_to_end(key)
+                self.stats["hits"] += 1
+                self.stats["memory_hits"] += 1
+                return dict(cached[0])
+
+            row = self._conn.execute(
+                "SELECT value, created_at FROM clause_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+            value, created_at = json.loads(row[0]), row[1]
+            if self._expired(created_at, now):
+                self._conn.execute("DELETE FROM clause_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                self._memory.pop(key, None)
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return None
+
+            self._conn.execute("UPDATE clause_cache SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self._remember(key, value, created_at)
+            self.stats["hits"] += 1
+            return dict(value)
+
+    def put(self, clause, model_id, value):
+        key = make_cache_key(clause, model_id)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO clause_cache (key, model_id, prompt_version, value, created_at, last_access)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model_id, PROMPT_VERSION, json.dumps(value), now, now)
+            )
+            self._remember(key, dict(value), now)
+            self.stats["writes"] += 1
+            self._writes_since_evict += 1
+            # Eviction is a full-table count, so only do it every so often.
+            if self._writes_since_evict >= 100:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        self._writes_since_evict = 0
+        if self.ttl_seconds:
+            cur = self._conn.execute(
+                "DELETE FROM clause_cache WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+            )
+            self.stats["evicted"] += cur.rowcount
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM clause_cache").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            cur = self._conn.execute(
+                "DELETE FROM clause_cache WHERE key IN ("
+                " SELECT key FROM clause_cache ORDER BY last_access ASC LIMIT ?)",
+                (overflow,)
+            )
+            self.stats["evicted"] += cur.rowcount
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM clause_cache")
+            self._conn.commit()
+            self._memory.clear()
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_clause_cache():
+    """Returns the process-wide ClauseCache, or None when caching is disabled."""
+    global _cache
+    if not CLAUSE_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ClauseCache()
+    return _cache
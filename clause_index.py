@@ -0,0 +1,188 @@
+# clause_index.py
+#
+# Near-duplicate lookup for clauses. Clauses that only differ in party names,
+# dates or amounts embed almost identically with all-MiniLM-L6-v2, so a new
+# clause whose embedding is within CLAUSE_INDEX_THRESHOLD (cosine similarity)
+# of an already analyzed clause reuses that analysis instead of calling the LLM.
+#
+# SQLite is the durable log of (vector, analysis) pairs; searches run against a
+# NumPy matrix built from it, optionally backed by a memory-mapped file so a
+# large index doesn't have to stay resident.
+
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import atexit
+import threading
+import numpy as np
+from config import (
+    CLAUSE_INDEX_ENABLED,
+    CLAUSE_INDEX_PATH,
+    CLAUSE_INDEX_THRESHOLD,
+    CLAUSE_INDEX_MEMMAP,
+    PROMPT_VERSION,
+    ANALYSIS_MODE,
+    EMBEDDING_MODEL_NAME,
+    EMBEDDING_BACKEND
+)
+
+_INITIAL_CAPACITY = 1024
+
+
+def embed_clauses(clauses):
+    """Unit-length float32 embeddings (one row per clause) from the shared embedding model."""
+    from embedding_registry import get_embeddings
+
+    embeddings = get_embeddings()
+    if hasattr(embeddings, "encode"):
+        return embeddings.encode(list(clauses))  # SentenceEncoder rows are already unit length
+    vectors = np.asarray(embeddings.embed_documents(list(clauses)), dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class ClauseIndex:
+    def __init__(self, path=CLAUSE_INDEX_PATH, threshold=CLAUSE_INDEX_THRESHOLD, memmap=CLAUSE_INDEX_MEMMAP):
+        self.path = path
+        self.threshold = threshold
+        # Analyses from another prompt version or mode aren't interchangeable, vectors
+        # from another embedding model may not even have the same dimension, and
+        # quantized embeddings aren't close enough to full-precision ones to share a threshold.
+        namespace = f"{PROMPT_VERSION}:{ANALYSIS_MODE}:{EMBEDDING_MODEL_NAME}"
+        if EMBEDDING_BACKEND in ("int8", "onnx"):
+            namespace += f":{EMBEDDING_BACKEND}"
+        self.namespace = hashlib.sha256(namespace.encode("utf-8")).hexdigest()[:16]
+        # The memmap is only this process's copy of the SQLite rows, so each process
+        # gets its own file; sharing one would let a worker replace it under another.
+        self.memmap_path = f"{path}.{self.namespace}.{os.getpid()}.f32" if memmap else None
+        self.stats = {"hits": 0, "misses": 0, "added": 0}
+        self._lock = threading.Lock()
+        self._matrix = None
+        self._analyses = []
+        self._size = 0
+        self._last_rowid = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS clause_vectors ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " namespace TEXT NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " analysis TEXT NOT NULL,"
+            " created_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_clause_vectors_namespace ON clause_vectors(namespace, id)")
+        self._conn.commit()
+        if self.memmap_path:
+            atexit.register(self._remove_memmap)
+
+    def _remove_memmap(self):
+        self._matrix = None
+        for leftover in (self.memmap_path, self.memmap_path + ".tmp"):
+            try:
+                os.remove(leftover)
+            except OSError:
+                pass
+
+    def _reserve(self, dim, count):
+        """Makes room for `count` more rows, doubling the matrix (or memmap file) as needed."""
+        needed = self._size + count
+        if self._matrix is not None and needed <= self._matrix.shape[0]:
+            return
+        capacity = max(_INITIAL_CAPACITY, self._matrix.shape[0] * 2 if self._matrix is not None else 0)
+        while capacity < needed:
+            capacity *= 2
+        if self.memmap_path:
+            grown = np.lib.format.open_memmap(self.memmap_path + ".tmp", mode="w+", dtype=np.float32, shape=(capacity, dim))
+            if self._size:
+                grown[:self._size] = self._matrix[:self._size]
+            grown.flush()
+            del grown, self._matrix
+            os.replace(self.memmap_path + ".tmp", self.memmap_path)
+            self._matrix = np.load(self.memmap_path, mmap_mode="r+")
+        else:
+            grown = np.zeros((capacity, dim), dtype=np.float32)
+            if self._size:
+                grown[:self._size] = self._matrix[:self._size]
+            self._matrix = grown
+
+    def _append(self, vectors, analyses):
+        self._reserve(vectors.shape[1], len(vectors))
+        self._matrix[self._size:self._size + len(vectors)] = vectors
+        self._analyses.extend(analyses)
+        self._size += len(vectors)
+
+    def _sync(self):
+        """Pulls in rows added since the last sync, including ones written by other processes."""
+        rows = self._conn.execute(
+            "SELECT id, vector, analysis FROM clause_vectors WHERE namespace = ? AND id > ? ORDER BY id",
+            (self.namespace, self._last_rowid)
+        ).fetchall()
+        if not rows:
+            return
+        vectors = np.stack([np.frombuffer(row[1], dtype=np.float32) for row in rows])
+        self._append(vectors, [row[2] for row in rows])
+        self._last_rowid = rows[-1][0]
+
+    def search(self, vectors):
+        """
+        For each query vector, the analysis of its nearest indexed clause if the
+        similarity reaches the threshold, else None. Returns (analyses, similarities).
+        """
+        with self._lock:
+            self._sync()
+            if self._size == 0:
+                self.stats["misses"] += len(vectors)
+                return [None] * len(vectors), [0.0] * len(vectors)
+            scores = vectors @ self._matrix[:self._size].T
+            best = scores.argmax(axis=1)
+            similarities = scores[np.arange(len(vectors)), best]
+            analyses = []
+            for index, similarity in zip(best, similarities):
+                if similarity >= self.threshold:
+                    self.stats["hits"] += 1
+                    analyses.append(json.loads(self._analyses[index]))
+                else:
+                    self.stats["misses"] += 1
+                    analyses.append(None)
+            return analyses, similarities.tolist()
+
+    def add(self, vectors, analyses):
+        """Indexes analyzed clauses (vectors from embed_clauses, analyses as result dicts without ids)."""
+        if not len(vectors):
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO clause_vectors (namespace, vector, analysis, created_at) VALUES (?, ?, ?, ?)",
+                [(self.namespace, vector.astype(np.float32).tobytes(), json.dumps(analysis), now)
+                 for vector, analysis in zip(vectors, analyses)]
+            )
+            self._conn.commit()
+            self._sync()
+            self.stats["added"] += len(vectors)
+
+    def get_stats(self):
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return dict(self.stats, size=self._size, hit_rate=self.stats["hits"] / lookups if lookups else 0.0)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_clause_index():
+    """Returns the process-wide ClauseIndex, or None when near-duplicate reuse is disabled."""
+    global _index
+    if not CLAUSE_INDEX_ENABLED:
+        return None
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = ClauseIndex()
+    return _index
@@ -0,0 +1,79 @@
+# clause_rewriter.py
+#
+# Deferred rewriting stage. Analysis only assesses risk; AI rewrites are
+# produced when the user asks for them, only for High/Medium clauses, in
+# parallel, and cached per clause so asking again is free.
+
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from llm_analyzer import modify_clause
+from clause_cache import get_clause_cache
+from provider_health import iter_model_configs, record_success, record_failure
+from response_parser import ParseError
+from config import LLM_MAX_WORKERS
+
+REWRITE_RISK_LEVELS = ("High", "Medium")
+
+
+def needs_rewrite(result):
+    return result.get('risk_level') in REWRITE_RISK_LEVELS and 'AI-Modified Clause' not in result
+
+
+def rewrite_clause(clause, risk_level):
+    """
+    Rewrites one clause with the same model fallback as analysis. Returns the
+    'AI-Modified Clause' / 'AI-Modified Risk Level' fields for the result dict.
+    """
+    cache = get_clause_cache()
+    for model_name, config in iter_model_configs():
+        # Rewrites share the clause cache under their own key space.
+        cache_model_id = f"rewrite:{risk_level}:{config['model_id']}"
+        rewrite = cache.get(clause, cache_model_id) if cache else None
+        if rewrite is not None:
+            return rewrite
+
+        start = time.perf_counter()
+        try:
+            modified_clause, modified_risk = modify_clause(config, clause, risk_level)
+        except ParseError as e:
+            # The model answered, just not usefully even after a repair attempt; not a health failure.
+            print(f"⚠️ Unusable rewrite from model: {model_name}. Error: {e}")
+            continue
+        except Exception as e:
+            record_failure(model_name, e)
+            print(f"❌ FAILED to rewrite clause with model: {model_name}. Error: {e}")
+            continue
+        record_success(model_name, time.perf_counter() - start)
+
+        rewrite = {'AI-Modified Clause': modified_clause, 'AI-Modified Risk Level': modified_risk}
+        if cache:
+            cache.put(clause, cache_model_id, rewrite)
+        return rewrite
+
+    print("🚨 ALL MODELS FAILED to rewrite the clause.")
+    return {'AI-Modified Clause': "No modification available.", 'AI-Modified Risk Level': "Unknown"}
+
+
+def iter_rewrites(results, max_workers=LLM_MAX_WORKERS):
+    """
+    Rewrites the High/Medium risk results that don't have a rewrite yet, in
+    parallel, updating each result dict in place. Yields every updated result
+    as soon as its rewrite finishes.
+    """
+    pending = [result for result in results if needs_rewrite(result)]
+    if not pending:
+        return
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(pending)))
+    try:
+        futures = {
+            executor.submit(rewrite_clause, result['clause'], result['risk_level']): result
+            for result in pending
+        }
+        for future in as_completed(futures):
+            result = futures[future]
+            result.update(future.result())
+            yield result
+    finally:
+        # If the caller stops early (a Streamlit rerun closes the generator), drop
+        # the queued rewrites instead of waiting for all of them.
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,189 @@
+# clause_triage.py
+#
+# Local triage between chunking and the LLM. Headings, signature blocks,
+# definitions and standard boilerplate ("may be executed in counterparts")
+# get a Low-risk verdict here instead of a model call. Anything that mentions
+# GDPR/HIPAA, liability, retention or similar regulated terms always goes to
+# the model. An optional nearest-centroid classifier on the clause embeddings
+# catches boilerplate the rules miss.
+
+import re
+import threading
+from config import (
+    CLAUSE_TRIAGE_ENABLED,
+    CLAUSE_TRIAGE_CLASSIFIER,
+    CLAUSE_TRIAGE_CLASSIFIER_MARGIN,
+    CLAUSE_TRIAGE_MAX_HEADING_WORDS
+)
+from response_parser import ClauseAnalysis, Risk
+
+REGULATED_TERMS = re.compile(
+    r"\b("
+    r"gdpr|general data protection|data protection|personal (?:data|information)|data subjects?|"
+    r"controllers?|(?:sub-?)?processors?|processing|consent|erasure|right to be forgotten|data transfers?|"
+    r"hipaa|protected health information|e?phi|health (?:information|data|records)|medical|patients?|"
+    r"covered entit(?:y|ies)|business associates?|"
+    r"liabilit(?:y|ies)|liable|indemnif\w*|hold harmless|damages|warrant(?:y|ies)|penalt(?:y|ies)|insurance|"
+    r"retain\w*|retention|destr(?:oy|uction)|delet\w*|archiv\w*|records?|audits?|"
+    r"confidential\w*|security|encrypt\w*|breach\w*|terminat\w*"
+    r")\b",
+    re.IGNORECASE
+)
+
+TRIVIAL_PATTERNS = [
+    ("signature block", re.compile(r"in witness whereof|^\s*(?:signature|signed|by|name|title|date)\s*:", re.IGNORECASE | re.MULTILINE)),
+    ("counterparts boilerplate", re.compile(r"executed in (?:one or more |any number of |two )?counterparts", re.IGNORECASE)),
+    ("headings boilerplate", re.compile(r"headings?\b.{0,40}\bfor (?:convenience|reference)", re.IGNORECASE)),
+    ("entire agreement boilerplate", re.compile(r"constitutes? the entire (?:agreement|understanding)", re.IGNORECASE)),
+    ("definition", re.compile(r"^\s*[\"“'][^\"”']{1,80}[\"”']\s+(?:means|shall mean|refers to|has the meaning)", re.IGNORECASE)),
+]
+
+# Headings: optional numbering ("1.2", "Article 4", "(a)", "IV.") followed by a
+# short title. A title has no verb and no final period; without numbering it must
+# also be in title case, so short sentences ("Supplier may share all data.") aren't
+# mistaken for one.
+_NUMBERING = re.compile(
+    r"^\s*(?:(?:article|section|clause|schedule|annex|appendix|exhibit|part)\s+[\divxlc]+[.:)]?"
+    r"|\d+(?:\.\d+)*[.)]?|\(?[a-z]\)|[ivxlc]+[.)])\s+",
+    re.IGNORECASE
+)
+_VERBS = re.compile(
+    r"\b(?:shall|may|will|must|should|can|cannot|could|would|is|are|was|were|be|been|has|have|had|does|do|"
+    r"agrees?|acknowledges?|warrants?|represents?|undertakes?|grants?|shares?|sells?|transfers?|discloses?|"
+    r"uses?|provides?|pays?|keeps?|owns?|retains?|means|includes?)\b",
+    re.IGNORECASE
+)
+_MINOR_WORDS = {"and", "or", "of", "the", "a", "an", "to", "in", "on", "for", "by", "with", "&"}
+_SEGMENTS = re.compile(r"(?<=[.?!;])\s+|\n+")
+
+# Exemplars for the optional embedding classifier.
+TRIVIAL_EXAMPLES = [
+    "This Agreement may be executed in counterparts, each of which shall be deemed an original.",
+    "The headings in this Agreement are for convenience only and shall not affect its interpretation.",
+    "IN WITNESS WHEREOF, the parties have executed this Agreement as of the Effective Date.",
+    "This Agreement constitutes the entire agreement between the parties.",
+    "Notices shall be sent to the addresses set out above.",
+    "ARTICLE 1. DEFINITIONS",
+]
+SUBSTANTIVE_EXAMPLES = [
+    "The Processor shall process Personal Data only on documented instructions from the Controller.",
+    "The Supplier shall indemnify the Customer against all losses arising from a breach of this Agreement.",
+    "Records containing protected health information shall be retained for six years and then destroyed.",
+    "Either party may terminate this Agreement immediately upon a material breach by the other party.",
+    "The Customer shall pay all invoices within thirty days, after which interest accrues at 5% per month.",
+    "The Vendor's total liability under this Agreement shall not exceed the fees paid in the prior year.",
+]
+
+_stats = {"checked": 0, "local": 0, "by_reason": {}}
+_stats_lock = threading.Lock()
+_centroids = None
+_centroids_lock = threading.Lock()
+
+
+def _classifier_centroids():
+    global _centroids
+    with _centroids_lock:
+        if _centroids is None:
+            from clause_index import embed_clauses
+            trivial = embed_clauses(TRIVIAL_EXAMPLES).mean(axis=0)
+            substantive = embed_clauses(SUBSTANTIVE_EXAMPLES).mean(axis=0)
+            _centroids = (trivial, substantive)
+        return _centroids
+
+
+def _classify(clause):
+    """True when the clause embeds clearly closer to the boilerplate exemplars."""
+    from clause_index import embed_clauses
+    trivial, substantive = _classifier_centroids()
+    vector = embed_clauses([clause])[0]
+    return float(vector @ trivial - vector @ substantive) >= CLAUSE_TRIAGE_CLASSIFIER_MARGIN
+
+
+def looks_like_heading(clause):
+    text = clause.strip()
+    if not text or text.endswith(".") or _VERBS.search(text):
+        return False
+    if len(text.split()) > CLAUSE_TRIAGE_MAX_HEADING_WORDS:
+        return False
+    title = _NUMBERING.sub("", text, count=1)
+    if title != text:
+        return True
+    return all(
+        word.lower() in _MINOR_WORDS or not word[0].isalpha() or word[0].isupper()
+        for word in title.split()
+    )
+
+
+def boilerplate_reason(clause):
+    """
+    The TRIVIAL_PATTERNS reason when every sentence (or line) of the chunk is
+    boilerplate, else None. A chunk that merely contains "counterparts" or
+    "entire agreement" next to other sentences still goes to the model.
+    """
+    reason = None
+    for segment in _SEGMENTS.split(clause.strip()):
+        if not segment.strip():
+            continue
+        matched = next((name for name, pattern in TRIVIAL_PATTERNS if pattern.search(segment)), None)
+        if matched is None:
+            return None
+        reason = reason or matched
+    return reason
+
+
+def triage_clause(clause):
+    """Returns the reason a clause can be answered locally, or None if it needs the LLM."""
+    if REGULATED_TERMS.search(clause):
+        return None
+    reason = boilerplate_reason(clause)
+    if reason:
+        return reason
+    if looks_like_heading(clause):
+        return "heading"
+    if CLAUSE_TRIAGE_CLASSIFIER:
+        try:
+            if _classify(clause):
+                return "boilerplate (classifier)"
+        except Exception as e:
+            print(f"⚠️ Triage classifier unavailable: {e}")
+    return None
+
+
+def local_verdict(clause, reason):
+    """The ClauseAnalysis for a clause triaged as Low risk."""
+    return ClauseAnalysis(
+        "None",
+        f"Triaged locally as {reason}; no regulatory obligations detected.",
+        Risk.LOW,
+        0
+    )
+
+
+def iter_triaged(numbered_clauses, on_local):
+    """
+    Passes through the (clause, clause_id) pairs that need the LLM. Locally
+    triaged ones go to on_local(clause, clause_id, verdict) instead.
+    """
+    for clause, clause_id in numbered_clauses:
+        reason = triage_clause(clause) if CLAUSE_TRIAGE_ENABLED else None
+        with _stats_lock:
+            _stats["checked"] += 1
+            if reason:
+                _stats["local"] += 1
+                _stats["by_reason"][reason] = _stats["by_reason"].get(reason, 0) + 1
+        if reason is None:
+            yield clause, clause_id
+        else:
+            print(f"🧹 Clause ID: {clause_id} triaged locally ({reason}).")
+            on_local(clause, clause_id, local_verdict(clause, reason))
+
+
+def get_stats():
+    """Clauses checked and answered locally (each one an LLM clause analysis saved), by reason."""
+    with _stats_lock:
+        return {
+            "checked": _stats["checked"],
+            "local": _stats["local"],
+            "by_reason": dict(_stats["by_reason"]),
+            "saved_rate": _stats["local"] / _stats["checked"] if _stats["checked"] else 0.0
+        }
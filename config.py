@@ -1,31 +1,72 @@
 # config.py
 import os
-from groq import Groq
+import threading
 from dotenv import load_dotenv
 
 load_dotenv()
 
+_groq_client = None
+_groq_client_lock = threading.Lock()
+
+
+def get_groq_client():
+    """Shared Groq client, built on first use so importing config stays cheap."""
+    global _groq_client
+    if _groq_client is None:
+        with _groq_client_lock:
+            if _groq_client is None:
+                import httpx
+                from groq import Groq
+                from http_session import build_retry_transport
+                # The SDK's own retries would resend on 5xx and 429; the transport
+                # applies http_session's connection-only retries instead.
+                _groq_client = Groq(
+                    api_key=os.getenv("GROQ_API_KEY"),
+                    http_client=httpx.Client(transport=build_retry_transport("groq")),
+                    max_retries=0
+                )
+    return _groq_client
+
+
+class ModelConfig(dict):
+    """Model settings; config["client"] is only constructed the first time it is read."""
+
+    def __missing__(self, key):
+        if key == "client" and self.get("provider") == "groq":
+            client = get_groq_client()
+            self["client"] = client
+            return client
+        raise KeyError(key)
+
+
+# Offline stand-in for the hosted models (see mock_llm_server.py and benchmarks/bench_pipeline.py).
+MOCK_LLM_HOST = os.getenv("MOCK_LLM_HOST", "127.0.0.1")
+MOCK_LLM_PORT = int(os.getenv("MOCK_LLM_PORT", "8765"))
+
 MODEL_CONFIG = {
-    "primary": {
+    "primary": ModelConfig({
         "provider": "groq",
-        "model_id": "llama-3.3-70b-versatile",
-        "client": Groq(api_key=os.getenv("GROQ_API_KEY"))
-    },
-    "groq_fallback_1": {
+        "model_id": "llama-3.3-70b-versatile"
+    }),
+    "groq_fallback_1": ModelConfig({
         "provider": "groq",
-        "model_id": "llama3-70b-8192", 
-        "client": Groq(api_key=os.getenv("GROQ_API_KEY"))
-    },
-    "groq_fallback_2": {
+        "model_id": "llama3-70b-8192"
+    }),
+    "groq_fallback_2": ModelConfig({
         "provider": "groq",
-        "model_id": "gemma-7b-it", 
-        "client": Groq(api_key=os.getenv("GROQ_API_KEY"))
-    },
-    "github_fallback": {
+        "model_id": "gemma-7b-it"
+    }),
+    "github_fallback": ModelConfig({
         "provider": "github",
         "model_id": "openai/gpt-4o",
         "api_url": "https://models.github.ai/inference/chat/completions"
-    }
+    }),
+    # Only used when listed in MODEL_PREFERENCE_ORDER (e.g. MODEL_PREFERENCE_ORDER=mock).
+    "mock": ModelConfig({
+        "provider": "mock",
+        "model_id": "mock-llm",
+        "api_url": f"http://{MOCK_LLM_HOST}:{MOCK_LLM_PORT}/chat/completions"
+    })
 }
 
 
@@ -34,4 +75,211 @@ MODEL_PREFERENCE_ORDER = [
     "groq_fallback_1", 
     "groq_fallback_2", 
     "github_fallback"
-]
\ No newline at end of file
+]
+if os.getenv("MODEL_PREFERENCE_ORDER"):
+    MODEL_PREFERENCE_ORDER = [name.strip() for name in os.getenv("MODEL_PREFERENCE_ORDER").split(",") if name.strip()]
+
+
+# Embedding model used by data_handler.semantic_chunking
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "sentence-transformers/all-MiniLM-L6-v2")
+EMBEDDING_DEVICE = os.getenv("EMBEDDING_DEVICE", "cpu")
+EMBEDDING_NUM_THREADS = int(os.getenv("EMBEDDING_NUM_THREADS", "0"))  # 0 = torch default
+
+# How sentences are embedded for chunking and the near-duplicate index.
+# "torch" encodes with sentence-transformers directly, "int8" also applies dynamic
+# int8 quantization to the Linear layers (CPU only), and "onnx" uses the ONNX Runtime
+# backend (needs optimum[onnxruntime]; EMBEDDING_ONNX_FILE selects e.g. a quantized
+# onnx/model_qint8_avx512_vnni.onnx). "langchain" keeps HuggingFaceEmbeddings and
+# langchain_experimental's SemanticChunker.
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+EMBEDDING_ONNX_FILE = os.getenv("EMBEDDING_ONNX_FILE", "")
+# Sentence-window embeddings kept in memory across documents (~1.5 KB each); 0 disables.
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "20000"))
+# A chunk boundary is placed where the distance between neighbouring sentence
+# windows is above this percentile (SemanticChunker's default).
+CHUNK_BREAKPOINT_PERCENTILE = float(os.getenv("CHUNK_BREAKPOINT_PERCENTILE", "95"))
+
+
+# Bump PROMPT_VERSION whenever a prompt or its parser changes, so stale cached analyses are ignored.
+PROMPT_VERSION = "3"
+
+# Clause analysis cache (see clause_cache.py)
+CLAUSE_CACHE_ENABLED = os.getenv("CLAUSE_CACHE_ENABLED", "true").lower() == "true"
+CLAUSE_CACHE_PATH = os.getenv("CLAUSE_CACHE_PATH", os.path.join(".cache", "clause_cache.sqlite3"))
+CLAUSE_CACHE_MAX_ENTRIES = int(os.getenv("CLAUSE_CACHE_MAX_ENTRIES", "50000"))
+CLAUSE_CACHE_TTL_SECONDS = int(os.getenv("CLAUSE_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))  # 0 = never expire
+CLAUSE_CACHE_MEMORY_ENTRIES = int(os.getenv("CLAUSE_CACHE_MEMORY_ENTRIES", "2048"))
+
+# "combined" asks for the analysis and key phrases in one JSON completion per clause;
+# "two_call" keeps the original analyze_clause + extract_key_clauses pair.
+ANALYSIS_MODE = os.getenv("ANALYSIS_MODE", "combined")
+
+# Multi-clause batching (combined mode only): short clauses are packed into one prompt
+# up to BATCH_TOKEN_BUDGET estimated input tokens; see clause_batcher.py
+CLAUSE_BATCHING_ENABLED = os.getenv("CLAUSE_BATCHING_ENABLED", "true").lower() == "true"
+BATCH_TOKEN_BUDGET = int(os.getenv("BATCH_TOKEN_BUDGET", "1500"))
+BATCH_SMALL_CLAUSE_TOKENS = int(os.getenv("BATCH_SMALL_CLAUSE_TOKENS", "150"))
+BATCH_MAX_CLAUSES = int(os.getenv("BATCH_MAX_CLAUSES", "8"))
+BATCH_OUTPUT_TOKENS_PER_CLAUSE = int(os.getenv("BATCH_OUTPUT_TOKENS_PER_CLAUSE", "120"))
+BATCH_MAX_OUTPUT_TOKENS = int(os.getenv("BATCH_MAX_OUTPUT_TOKENS", "4000"))
+
+# Per-provider rate limits (see rate_limiter.py). Buckets are tightened further by the
+# x-ratelimit-* response headers; concurrency adapts between min and max (AIMD).
+RATE_LIMITS = {
+    "groq": {
+        "requests_per_minute": int(os.getenv("GROQ_REQUESTS_PER_MINUTE", "30")),
+        "tokens_per_minute": int(os.getenv("GROQ_TOKENS_PER_MINUTE", "12000")),
+        "initial_concurrency": 4,
+        "max_concurrency": 16
+    },
+    "github": {
+        "requests_per_minute": int(os.getenv("GITHUB_REQUESTS_PER_MINUTE", "10")),
+        "tokens_per_minute": int(os.getenv("GITHUB_TOKENS_PER_MINUTE", "8000")),
+        "initial_concurrency": 2,
+        "max_concurrency": 4
+    },
+    "mock": {
+        "requests_per_minute": int(os.getenv("MOCK_REQUESTS_PER_MINUTE", "100000")),
+        "tokens_per_minute": int(os.getenv("MOCK_TOKENS_PER_MINUTE", "100000000")),
+        "initial_concurrency": 16,
+        "max_concurrency": 64
+    },
+    "default": {
+        "requests_per_minute": 30,
+        "tokens_per_minute": 10000
+    }
+}
+RATE_LIMIT_MAX_RETRIES = int(os.getenv("RATE_LIMIT_MAX_RETRIES", "3"))
+RATE_LIMIT_BACKOFF_SECONDS = float(os.getenv("RATE_LIMIT_BACKOFF_SECONDS", "2"))
+# Worker threads feeding the limiters; the AIMD window decides how many are actually in flight.
+LLM_MAX_WORKERS = int(os.getenv("LLM_MAX_WORKERS", "16"))
+
+# asyncio engine (async_llm_analyzer.py / contract_analyzer.analyze_contract_file_async)
+ASYNC_MAX_IN_FLIGHT = int(os.getenv("ASYNC_MAX_IN_FLIGHT", "256"))
+ASYNC_HTTP_MAX_CONNECTIONS = int(os.getenv("ASYNC_HTTP_MAX_CONNECTIONS", "64"))
+ASYNC_HTTP_TIMEOUT_SECONDS = float(os.getenv("ASYNC_HTTP_TIMEOUT_SECONDS", "60"))
+
+# Pooled HTTP sessions (see http_session.py). pool_maxsize should be >= LLM_MAX_WORKERS.
+HTTP_POOL_SETTINGS = {
+    "github": {
+        "pool_connections": 4,
+        "pool_maxsize": int(os.getenv("GITHUB_POOL_MAXSIZE", "16")),
+        "connect_timeout": 5,
+        "read_timeout": 60,
+        "retries": 3,
+        "backoff_factor": 0.5
+    },
+    "default": {
+        "pool_connections": 4,
+        "pool_maxsize": 16,
+        "connect_timeout": 5,
+        "read_timeout": 60,
+        "retries": 3,
+        "backoff_factor": 0.5
+    }
+}
+# Needs the optional "h2" package (pip install httpx[http2]); falls back to HTTP/1.1 keep-alive without it.
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "false").lower() == "true"
+
+# Per-model circuit breakers (see provider_health.py)
+CIRCUIT_BREAKER_SETTINGS = {
+    "window_seconds": 60,
+    "min_requests": 5,
+    "error_rate_threshold": 0.5,
+    "consecutive_failures": 3,
+    "cooldown_seconds": int(os.getenv("CIRCUIT_BREAKER_COOLDOWN_SECONDS", "30"))
+}
+# How long a get_preferred_model_and_config() models.list() probe result is reused.
+PROBE_CACHE_SECONDS = int(os.getenv("PROBE_CACHE_SECONDS", "300"))
+
+# Streaming extraction: characters buffered before each incremental chunking pass.
+STREAM_CHUNK_WINDOW_CHARS = int(os.getenv("STREAM_CHUNK_WINDOW_CHARS", "8000"))
+
+# Batch mode (batch_runner.py): processes used for parsing + chunking.
+BATCH_EXTRACT_WORKERS = int(os.getenv("BATCH_EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Google Sheets output (see sheet_sink.py). SHEET_BACKEND=local writes to an offline
+# stand-in (in memory, or a CSV file when LOCAL_SHEET_PATH is set) instead of Google Sheets.
+SHEET_BACKEND = os.getenv("SHEET_BACKEND", "google")
+LOCAL_SHEET_PATH = os.getenv("LOCAL_SHEET_PATH") or None
+SHEET_FLUSH_ROWS = int(os.getenv("SHEET_FLUSH_ROWS", "50"))
+SHEET_FLUSH_SECONDS = float(os.getenv("SHEET_FLUSH_SECONDS", "10"))
+# Clause IDs are reserved in blocks of SHEET_ID_BLOCK_SIZE from a SQLite counter shared by
+# every process on this machine (queue workers, batch runs, the app), so they never hand
+# out the same ID. Leaving SHEET_ID_ALLOCATOR_PATH empty falls back to a per-process
+# row-count cursor, which is only safe with a single writer (one queue worker).
+# SHEET_ID_COUNTER_CELL optionally mirrors the next ID into a cell outside the header row
+# (e.g. "H2") for writers on other machines; it's read and bumped under the same lock.
+SHEET_ID_ALLOCATOR_PATH = os.getenv("SHEET_ID_ALLOCATOR_PATH", os.path.join(".cache", "clause_ids.sqlite3"))
+SHEET_ID_COUNTER_CELL = os.getenv("SHEET_ID_COUNTER_CELL", "")
+SHEET_ID_BLOCK_SIZE = int(os.getenv("SHEET_ID_BLOCK_SIZE", "100"))
+
+# Local copies of every analysis (see result_store.py): comma-separated "sqlite" and/or "parquet".
+RESULT_STORE_BACKENDS = os.getenv("RESULT_STORE_BACKENDS", "sqlite")
+RESULT_STORE_SQLITE_PATH = os.getenv("RESULT_STORE_SQLITE_PATH", os.path.join(".cache", "results.sqlite3"))
+RESULT_STORE_PARQUET_DIR = os.getenv("RESULT_STORE_PARQUET_DIR", os.path.join(".cache", "results_parquet"))
+
+# Checkpoint journal for resumable analysis jobs (see job_journal.py).
+JOB_JOURNAL_ENABLED = os.getenv("JOB_JOURNAL_ENABLED", "true").lower() == "true"
+JOB_JOURNAL_PATH = os.getenv("JOB_JOURNAL_PATH", os.path.join(".cache", "jobs.sqlite3"))
+
+# Background analysis queue (see job_queue.py). JOB_QUEUE_WORKERS worker processes are
+# started by the Streamlit app; set it to 0 when workers run separately (python job_queue.py).
+# More than one worker needs SHEET_ID_ALLOCATOR_PATH, or they'd hand out the same Clause IDs.
+JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", os.path.join(".cache", "queue.sqlite3"))
+JOB_QUEUE_UPLOAD_DIR = os.getenv("JOB_QUEUE_UPLOAD_DIR", os.path.join(".cache", "uploads"))
+JOB_QUEUE_WORKERS = int(os.getenv("JOB_QUEUE_WORKERS", "1"))
+JOB_QUEUE_POLL_SECONDS = float(os.getenv("JOB_QUEUE_POLL_SECONDS", "1"))
+JOB_QUEUE_STALE_SECONDS = float(os.getenv("JOB_QUEUE_STALE_SECONDS", "60"))
+
+# Near-duplicate reuse (see clause_index.py): a clause whose embedding has at least this
+# cosine similarity to an analyzed clause reuses its analysis. CLAUSE_INDEX_MEMMAP keeps
+# the search matrix in a memory-mapped file instead of RAM.
+CLAUSE_INDEX_ENABLED = os.getenv("CLAUSE_INDEX_ENABLED", "true").lower() == "true"
+CLAUSE_INDEX_PATH = os.getenv("CLAUSE_INDEX_PATH", os.path.join(".cache", "clause_index.sqlite3"))
+CLAUSE_INDEX_THRESHOLD = float(os.getenv("CLAUSE_INDEX_THRESHOLD", "0.97"))
+CLAUSE_INDEX_MEMMAP = os.getenv("CLAUSE_INDEX_MEMMAP", "false").lower() == "true"
+
+# Local triage before the LLM (see clause_triage.py). The optional classifier compares
+# clause embeddings against boilerplate/substantive exemplars.
+CLAUSE_TRIAGE_ENABLED = os.getenv("CLAUSE_TRIAGE_ENABLED", "true").lower() == "true"
+CLAUSE_TRIAGE_CLASSIFIER = os.getenv("CLAUSE_TRIAGE_CLASSIFIER", "false").lower() == "true"
+CLAUSE_TRIAGE_CLASSIFIER_MARGIN = float(os.getenv("CLAUSE_TRIAGE_CLASSIFIER_MARGIN", "0.1"))
+CLAUSE_TRIAGE_MAX_HEADING_WORDS = int(os.getenv("CLAUSE_TRIAGE_MAX_HEADING_WORDS", "8"))
+
+# Stream batch completions so each clause result is reported as soon as its entry arrives.
+LLM_STREAMING_ENABLED = os.getenv("LLM_STREAMING_ENABLED", "true").lower() == "true"
+
+# Text extraction (see text_extractor.py): PDFs with at least PDF_PARALLEL_MIN_PAGES pages
+# are parsed in PDF_PAGES_PER_SHARD page ranges across PDF_EXTRACT_WORKERS processes.
+EXTRACT_CACHE_ENABLED = os.getenv("EXTRACT_CACHE_ENABLED", "true").lower() == "true"
+EXTRACT_CACHE_PATH = os.getenv("EXTRACT_CACHE_PATH", os.path.join(".cache", "extracted_text.sqlite3"))
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(min(8, os.cpu_count() or 1))))
+PDF_PAGES_PER_SHARD = int(os.getenv("PDF_PAGES_PER_SHARD", "25"))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "50"))
+# Shards submitted ahead of the one being consumed (0 = two per worker), which bounds
+# how much parsed text can be waiting in memory.
+PDF_MAX_SHARDS_IN_FLIGHT = int(os.getenv("PDF_MAX_SHARDS_IN_FLIGHT", "0"))
+
+# A response that fails to parse is sent back to the same model with the error this many
+# times (see response_parser.build_repair_prompt) before falling back to the next model.
+RESPONSE_PARSE_RETRIES = int(os.getenv("RESPONSE_PARSE_RETRIES", "1"))
+
+# Mock LLM server behaviour: log-normal latency around MOCK_LLM_LATENCY_MS plus
+# MOCK_LLM_MS_PER_TOKEN per output token; shares of requests answered with 500 / 429.
+MOCK_LLM_LATENCY_MS = float(os.getenv("MOCK_LLM_LATENCY_MS", "300"))
+MOCK_LLM_LATENCY_SIGMA = float(os.getenv("MOCK_LLM_LATENCY_SIGMA", "0.5"))
+MOCK_LLM_MS_PER_TOKEN = float(os.getenv("MOCK_LLM_MS_PER_TOKEN", "2"))
+MOCK_LLM_ERROR_RATE = float(os.getenv("MOCK_LLM_ERROR_RATE", "0.0"))
+MOCK_LLM_RATE_LIMIT_RATE = float(os.getenv("MOCK_LLM_RATE_LIMIT_RATE", "0.0"))
+MOCK_LLM_RETRY_AFTER_SECONDS = int(os.getenv("MOCK_LLM_RETRY_AFTER_SECONDS", "1"))  # Retry-After must be whole seconds
+
+# Tracing and metrics (see telemetry.py). Each run's stage breakdown is written to
+# METRICS_DIR/runs/<job id>.json and process totals to METRICS_DIR/metrics.prom.
+# PROFILER=cprofile or pyinstrument profiles each run into METRICS_DIR/profiles.
+TELEMETRY_ENABLED = os.getenv("TELEMETRY_ENABLED", "true").lower() == "true"
+METRICS_DIR = os.getenv("METRICS_DIR", ".metrics")
+METRICS_EXPORT_FORMATS = [f.strip() for f in os.getenv("METRICS_EXPORT_FORMATS", "json,prometheus").split(",") if f.strip()]
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", "20000"))
+PROFILER = os.getenv("PROFILER", "").lower()
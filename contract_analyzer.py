@@ -1,129 +1,686 @@
 # contract_analyzer.py (Updated with improved fallback logic)
 
+import os
+import time
+import queue
+import asyncio
+import threading
 from data_handler import (
     connect_sheet,
-    extract_text_from_file,
-    semantic_chunking,
-    get_next_id,
-    update_sheet_with_data
+    hash_file,
+    iter_text_from_file,
+    iter_semantic_chunks
 )
-from llm_analyzer import get_preferred_model_and_config, analyze_clause, extract_key_clauses
-from config import MODEL_PREFERENCE_ORDER, MODEL_CONFIG
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from llm_analyzer import (
+    get_preferred_model_and_config,
+    analyze_clause,
+    extract_key_clauses,
+    analyze_clause_combined,
+    analyze_clauses_batch
+)
+from config import (
+    ANALYSIS_MODE,
+    CLAUSE_BATCHING_ENABLED,
+    LLM_MAX_WORKERS,
+    LLM_STREAMING_ENABLED,
+    ASYNC_MAX_IN_FLIGHT
+)
+import telemetry
+import async_llm_analyzer
+from response_parser import ParseError
+from clause_batcher import iter_batches
+from rate_limiter import get_rate_limit_metrics
+from embedding_registry import get_stats as get_embedding_stats
+from clause_cache import get_clause_cache
+from clause_index import get_clause_index, embed_clauses
+from clause_triage import iter_triaged, get_stats as get_triage_stats
+from provider_health import iter_model_configs, record_success, record_failure, get_health
+from sheet_sink import get_sheet_sink
+from result_store import result_to_row, SheetResultSink, MultiSink, get_local_sinks
+from job_journal import start_job, make_job_id
+from concurrent.futures import ThreadPoolExecutor, wait
+
+def combined_to_analysis(combined):
+    """Maps a ClauseAnalysis (see response_parser) onto the result dict keys."""
+    return combined.to_analysis()
+
+
+def build_clause_result(clause, clause_id, analysis):
+    """Builds the (result dict, sheet row) pair for one analyzed clause."""
+    result = {'clause_id': clause_id, 'clause': clause}
+    result.update(analysis)
+    return result, result_to_row(result)
+
+
+def cached_clause_result(clause, clause_id, model_name, config):
+    """The clause's cached (result, row) for this model, or None."""
+    cache = get_clause_cache()
+    analysis = cache.get(clause, config["model_id"]) if cache else None
+    if analysis is None:
+        return None
+    print(f"⚡ Cache hit for Clause ID: {clause_id} with model: {model_name}")
+    return build_clause_result(clause, clause_id, analysis)
+
+
+def separate_to_analysis(analyzed, key_clauses):
+    """Merges the separate-mode analysis and key clause responses into result dict keys."""
+    analyzed.key_phrases = key_clauses.strip()
+    return combined_to_analysis(analyzed)
+
+
+def finish_clause(clause, clause_id, model_name, config, analysis, started):
+    """Records the model's success, caches the analysis and builds the (result, row) pair."""
+    record_success(model_name, time.perf_counter() - started)
+    cache = get_clause_cache()
+    if cache:
+        cache.put(clause, config["model_id"], analysis)
+    print(f"✅ Successfully analyzed Clause ID: {clause_id} with model: {model_name}")
+    return build_clause_result(clause, clause_id, analysis)
+
+
+def record_clause_failure(clause_id, model_name, config, error):
+    if isinstance(error, ParseError):
+        # The model answered, just not usefully even after a repair attempt; not a health failure.
+        print(f"⚠️ Unusable response for Clause ID: {clause_id} from model: {model_name}. Error: {error}")
+        telemetry.count("fallbacks_total", model=config["model_id"], reason="unparseable")
+    else:
+        record_failure(model_name, error)
+        telemetry.count("fallbacks_total", model=config["model_id"], reason="error")
+        print(f"❌ FAILED to analyze Clause ID: {clause_id} with model: {model_name}. Error: {error}")
+
+
+def all_models_failed(clause_id):
+    telemetry.count("clause_failures_total")
+    print(f"🚨 ALL MODELS FAILED for Clause ID: {clause_id}. Returning empty data.")
+    return None, None
+
 
 def analyze_single_clause(clause, clause_id):
     """
     Helper to analyze a single clause in parallel with robust model fallback.
-    It will try each model in MODEL_PREFERENCE_ORDER until one succeeds.
+    It will try each model in MODEL_PREFERENCE_ORDER until one succeeds,
+    skipping models whose circuit breaker is open.
+    """
+    with telemetry.span("clause", attrs={"clause_id": clause_id}):
+        for model_name, config in iter_model_configs():
+            try:
+                print(f"Attempting to analyze Clause ID: {clause_id} with model: {model_name}")
+                output = cached_clause_result(clause, clause_id, model_name, config)
+                if output is not None:
+                    return output
+
+                start = time.perf_counter()
+                if ANALYSIS_MODE == "combined":
+                    analysis = combined_to_analysis(analyze_clause_combined(config, clause))
+                else:
+                    key_clauses = extract_key_clauses(config, clause)
+                    analysis = separate_to_analysis(analyze_clause(config, clause), key_clauses)
+                return finish_clause(clause, clause_id, model_name, config, analysis, start)
+            except Exception as e:
+                record_clause_failure(clause_id, model_name, config, e)
+                continue # Try the next model in the preference order
+
+        # This part is reached only if all models fail for a clause
+        return all_models_failed(clause_id)
+
+
+def analysis_from_result(result):
+    return {key: value for key, value in result.items() if key not in ('clause_id', 'clause')}
+
+
+def match_near_duplicates(batch):
+    """
+    Looks the batch's clauses up in the clause index. Returns (outputs, pending,
+    vectors): results for near-duplicates by batch position, the positions that
+    still need the LLM, and the clause embeddings (None if the index is off).
+    """
+    index = get_clause_index()
+    if index is None:
+        return {}, list(range(len(batch))), None
+    try:
+        with telemetry.span("near_duplicate_lookup"):
+            vectors = embed_clauses([clause for clause, _ in batch])
+            analyses, similarities = index.search(vectors)
+    except Exception as e:
+        print(f"⚠️ Near-duplicate lookup failed, analyzing normally: {e}")
+        return {}, list(range(len(batch))), None
+
+    outputs = {}
+    pending = []
+    for i, analysis in enumerate(analyses):
+        if analysis is None:
+            pending.append(i)
+            continue
+        clause, clause_id = batch[i]
+        print(f"♻️ Clause ID: {clause_id} is a near-duplicate ({similarities[i]:.3f}) of an analyzed clause. Reusing its analysis.")
+        outputs[i] = build_clause_result(clause, clause_id, analysis)
+    return outputs, pending, vectors
+
+
+def remember_analyses(vectors, positions, outputs):
+    """Adds freshly analyzed clauses to the clause index."""
+    index = get_clause_index()
+    if index is None or vectors is None:
+        return
+    analyzed = [i for i in positions if outputs[i][0]]
+    try:
+        index.add([vectors[i] for i in analyzed], [analysis_from_result(outputs[i][0]) for i in analyzed])
+    except Exception as e:
+        print(f"⚠️ Could not add clauses to the near-duplicate index: {e}")
+
+
+def analyze_clause_batch(batch, on_preview=None):
+    """
+    Analyzes a list of (clause, clause_id) pairs, answering near-duplicates of
+    already analyzed clauses from the clause index and sending the rest to the
+    LLM. Returns a list of (result, row) pairs in batch order. With on_preview,
+    batch completions are streamed and on_preview([result]) is called for each
+    clause as soon as its entry arrives.
+    """
+    with telemetry.span("batch", attrs={"clause_ids": [clause_id for _, clause_id in batch]}):
+        outputs, pending, vectors = match_near_duplicates(batch)
+        if pending:
+            outputs.update(zip(pending, _analyze_clause_batch([batch[i] for i in pending], on_preview)))
+            remember_analyses(vectors, pending, outputs)
+        return [outputs[i] for i in range(len(batch))]
+
+
+def take_cached(batch, pending, outputs, config):
+    """Fills outputs with cached analyses from this model; returns the positions still pending."""
+    cache = get_clause_cache()
+    if not cache:
+        return pending
+    still_pending = []
+    for i in pending:
+        clause, clause_id = batch[i]
+        analysis = cache.get(clause, config["model_id"])
+        if analysis is not None:
+            outputs[i] = build_clause_result(clause, clause_id, analysis)
+        else:
+            still_pending.append(i)
+    return still_pending
+
+
+def record_batch_failure(clause_ids, model_name, config, error):
+    """
+    Logs a failed batch request. Returns True when the batch should go
+    straight to per-clause requests (a malformed response), False to try the
+    next model.
+    """
+    if isinstance(error, ValueError):
+        # The model answered, just not usefully; that's not a health failure.
+        print(f"⚠️ Malformed batch response for Clause IDs: {clause_ids}. Falling back to per-clause requests. Error: {error}")
+        telemetry.count("batch_fallbacks_total", model=config["model_id"], reason="unparseable")
+        return True
+    record_failure(model_name, error)
+    telemetry.count("fallbacks_total", model=config["model_id"], reason="error")
+    print(f"❌ FAILED to analyze batch {clause_ids} with model: {model_name}. Error: {error}")
+    return False
+
+
+def finish_batch(batch, pending, parsed, outputs, model_name, config, started):
+    """
+    Records the model's success and fills outputs with the parsed entries.
+    Returns the positions the response didn't cover.
+    """
+    record_success(model_name, time.perf_counter() - started)
+    cache = get_clause_cache()
+    for position, i in enumerate(pending):
+        if position in parsed:
+            clause, clause_id = batch[i]
+            analysis = combined_to_analysis(parsed[position])
+            if cache:
+                cache.put(clause, config["model_id"], analysis)
+            outputs[i] = build_clause_result(clause, clause_id, analysis)
+    missing = [i for position, i in enumerate(pending) if position not in parsed]
+    print(f"✅ Batch analyzed {len(pending) - len(missing)}/{len(pending)} clauses with model: {model_name}")
+    return missing
+
+
+def _analyze_clause_batch(batch, on_preview=None):
+    """
+    Analyzes a list of (clause, clause_id) pairs with one batched prompt.
+    Cached clauses are skipped, and any clause the batch response didn't
+    cover (or a malformed response altogether) falls back to
+    analyze_single_clause. Returns a list of (result, row) pairs in batch order.
+    """
+    if len(batch) == 1:
+        return [analyze_single_clause(*batch[0])]
+
+    outputs = {}
+    pending = list(range(len(batch)))
+
+    for model_name, config in iter_model_configs():
+        pending = take_cached(batch, pending, outputs, config)
+        if len(pending) <= 1:
+            break
+
+        clause_ids = [batch[i][1] for i in pending]
+        on_entry = None
+        if on_preview:
+            def on_entry(position, entry, pending=pending):
+                clause, clause_id = batch[pending[position]]
+                on_preview([build_clause_result(clause, clause_id, combined_to_analysis(entry))[0]])
+
+        start = time.perf_counter()
+        try:
+            print(f"Attempting to analyze Clause IDs: {clause_ids} as one batch with model: {model_name}")
+            parsed = analyze_clauses_batch(config, [batch[i][0] for i in pending], on_entry=on_entry)
+        except Exception as e:
+            if record_batch_failure(clause_ids, model_name, config, e):
+                break
+            continue
+        pending = finish_batch(batch, pending, parsed, outputs, model_name, config, start)
+        break
+
+    for i in pending:
+        outputs[i] = analyze_single_clause(*batch[i])
+    return [outputs[i] for i in range(len(batch))]
+
+
+EXPECTED_HEADER = ["Clause ID", "Regulation", "Key Clauses (AI)", "Risk Level (AI)", "Risk % (AI)", "AI Summary"]
+
+
+def open_sheet_sink(wks):
+    """Shared SheetSink for the worksheet, with the header checked (once per process)."""
+    sink = get_sheet_sink(wks, EXPECTED_HEADER)
+    sink.ensure_header()
+    return sink
+
+
+def open_result_sink(sheet_sink):
+    """Google Sheets plus the local result stores from RESULT_STORE_BACKENDS."""
+    return MultiSink([SheetResultSink(sheet_sink)] + get_local_sinks())
+
+
+def describe_contract(file_path):
+    return {"hash": hash_file(file_path), "name": os.path.basename(file_path)}
+
+
+def iter_clause_batches(numbered_clauses):
+    """
+    Yields LLM work units as (clause, clause_id) pairs arrive: packed batches
+    in combined mode, single clauses otherwise.
+    """
+    if ANALYSIS_MODE == "combined" and CLAUSE_BATCHING_ENABLED:
+        yield from iter_batches(numbered_clauses)
+    else:
+        for item in numbered_clauses:
+            yield [item]
+
+
+class ResultEmitter:
+    """
+    Hands clause results to on_result as early as possible. A streamed batch
+    entry (a preview) is passed on right away, but it isn't checkpointed,
+    since a failed stream can still fall back to another model. When the work
+    unit completes, its final result is passed on again only if it differs
+    from the preview, so a later call for a clause_id supersedes an earlier one.
     """
-    for model_name in MODEL_PREFERENCE_ORDER:
+
+    def __init__(self, on_result=None):
+        self.on_result = on_result
+        self._emitted = {}
+        self._lock = threading.Lock()
+
+    def _send(self, results):
+        if not self.on_result:
+            return
+        for result in results:
+            try:
+                self.on_result(result)
+            except Exception as e:
+                print(f"⚠️ on_result callback failed: {e}")
+
+    def emit(self, results):
+        with self._lock:
+            changed = [result for result in results if self._emitted.get(result['clause_id']) != result]
+            self._emitted.update((result['clause_id'], result) for result in changed)
+        self._send(changed)
+
+    def preview(self, results):
+        with self._lock:
+            fresh = [result for result in results if result['clause_id'] not in self._emitted]
+            self._emitted.update((result['clause_id'], result) for result in fresh)
+        self._send(fresh)
+
+
+def collect_outputs(outputs, analysis_results, sink, lock, contract, job, emitter=None):
+    """Keeps the successful results of one batch, hands them to the result sink and checkpoints them."""
+    results = []
+    with lock:
+        for result, row in outputs:
+            if result and row: # Only append if the analysis was successful
+                analysis_results.append(result)
+                results.append(result)
+    sink.add(contract, results)
+    job.record(results)
+    if emitter:
+        emitter.emit(results)
+
+
+def local_result_collector(analysis_results, sink, lock, contract, job, emitter=None):
+    """on_local callback for clause_triage.iter_triaged: records triaged clauses like analyzed ones."""
+    def on_local(clause, clause_id, verdict):
+        outputs = [build_clause_result(clause, clause_id, combined_to_analysis(verdict))]
+        collect_outputs(outputs, analysis_results, sink, lock, contract, job, emitter)
+    return on_local
+
+
+def restore_resumed_results(job, wks, sink, contract, analysis_results, lock, emitter=None):
+    """
+    Adds the clauses checkpointed by an interrupted run to this one, re-sending
+    any whose rows never reached the sheet (they may still have been buffered).
+    """
+    if not job.resumed_results:
+        return
+    with lock:
+        analysis_results.extend(job.resumed_results)
+    in_sheet = {str(value) for value in wks.get_col(1, include_tailing_empty=False)}
+    missing = [result for result in job.resumed_results if str(result['clause_id']) not in in_sheet]
+    sink.add(contract, missing)
+    if emitter:
+        emitter.emit(job.resumed_results)
+    print(f"Reused {len(job.resumed_results)} checkpointed clauses ({len(missing)} re-sent to the sheet).")
+
+
+def print_run_stats():
+    cache = get_clause_cache()
+    if cache:
+        stats = cache.get_stats()
+        print(f"Clause cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%} hit rate).")
+    triage = get_triage_stats()
+    if triage["local"]:
+        print(f"Triage: {triage['local']}/{triage['checked']} clauses answered locally, "
+              f"saving {triage['local']} LLM clause analyses ({triage['saved_rate']:.0%}).")
+    index = get_clause_index()
+    if index:
+        stats = index.get_stats()
+        print(f"Near-duplicate index: {stats['hits']} reused, {stats['misses']} sent on "
+              f"({stats['hit_rate']:.0%} hit rate, {stats['size']} clauses indexed).")
+    for provider, metrics in get_rate_limit_metrics().items():
+        print(f"Rate limiter [{provider}]: {metrics['requests']} requests, {metrics['throttles']} throttles, "
+              f"{metrics['retries']} retries, concurrency {metrics['concurrency_limit']}.")
+    for model_name, health in get_health().items():
+        if health["state"] != "closed" or health["error_rate"]:
+            print(f"Model health [{model_name}]: {health['state']}, {health['error_rate']:.0%} errors in the last window.")
+
+
+def iter_contract_clauses(file_path):
+    """Streams clauses out of a contract while later pages are still being parsed."""
+    print("Reading contract...")
+    # "chunk" self time excludes the page extraction it pulls from.
+    return telemetry.timed_iter("chunk", iter_semantic_chunks(telemetry.timed_iter("extract", iter_text_from_file(file_path))))
+
+
+def print_extraction_stats(num_clauses, num_requests):
+    print(f"Extracted {num_clauses} clauses from the document, sent as {num_requests} LLM requests.")
+    chunk_stats = get_embedding_stats()["last_chunking"]
+    if chunk_stats:
+        print(f"Semantic chunking took {chunk_stats['seconds']:.2f}s for {chunk_stats['chars']} characters.")
+
+
+@telemetry.traced_run
+def analyze_contract_file(file_path, on_result=None):
+    """
+    Analyze a contract file and return the analysis results. on_result, if
+    given, is called (from worker threads) with each clause result as soon as
+    it completes; see iter_contract_results for a generator version.
+    """
+    job = None
+    try:
+        with telemetry.span("sheet_connect"):
+            wks = connect_sheet()
+        if not wks:
+            print("Failed to connect to Google Sheets")
+            return None
+
+        contract = describe_contract(file_path)
+        telemetry.set_run_id(make_job_id(contract["hash"]))
+        job = start_job(contract)
+        sheet_sink = open_sheet_sink(wks)
+        sink = open_result_sink(sheet_sink)
+        analysis_results = []
+        results_lock = threading.Lock()
+        emitter = ResultEmitter(on_result)
+        # Streaming only pays off when someone is watching the previews.
+        on_preview = emitter.preview if LLM_STREAMING_ENABLED and on_result else None
+
+        def collect(future):
+            try:
+                collect_outputs(future.result(), analysis_results, sink, results_lock, contract, job, emitter)
+            except Exception as e:
+                print(f"Error processing future result: {e}")
+
+        # Parallel execution. Batches are submitted as soon as the streaming
+        # chunker emits them, so the first LLM calls start while later pages
+        # are still being parsed, and finished rows reach the sheet in
+        # micro-batches while the rest are still running.
+        with ThreadPoolExecutor(max_workers=LLM_MAX_WORKERS) as executor:
+            futures = []
+            num_clauses = 0
+            numbered_clauses = iter_triaged(
+                job.iter_pending(iter_contract_clauses(file_path), sheet_sink.iter_ids()),
+                local_result_collector(analysis_results, sink, results_lock, contract, job, emitter)
+            )
+            for batch in iter_clause_batches(numbered_clauses):
+                future = executor.submit(telemetry.bind(analyze_clause_batch), batch, on_preview)
+                future.add_done_callback(telemetry.bind(collect))
+                futures.append(future)
+                num_clauses += len(batch)
+            print_extraction_stats(num_clauses, len(futures))
+            restore_resumed_results(job, wks, sink, contract, analysis_results, results_lock, emitter)
+            wait(futures)
+
+        analysis_results.sort(key=lambda x: x['clause_id'])
+        sink.flush()
+        job.finish()
+        print("Analysis completed and data updated in Google Sheets.")
+        print_run_stats()
+
+        return analysis_results
+
+    except FileNotFoundError as e:
+        print(f"Error: {e}. Please check the file path.")
+        return None
+    except Exception as e:
+        if job:
+            job.finish(error=e)
+        print(f"An unexpected error occurred: {e}")
+        return None
+
+
+def iter_contract_results(file_path):
+    """
+    Runs analyze_contract_file in a background thread and yields each clause
+    result as soon as it completes (streamed batch entries included), in
+    completion order rather than clause order.
+    """
+    results = queue.Queue()
+    done = object()
+
+    def run():
         try:
-            print(f"Attempting to analyze Clause ID: {clause_id} with model: {model_name}")
-            config = MODEL_CONFIG.get(model_name)
-            if not config:
-                print(f"⚠️ Config for model '{model_name}' not found. Skipping.")
+            analyze_contract_file(file_path, on_result=results.put)
+        finally:
+            results.put(done)
+
+    threading.Thread(target=run, name="contract-analysis", daemon=True).start()
+    while True:
+        result = results.get()
+        if result is done:
+            return
+        yield result
+
+
+async def analyze_single_clause_async(clause, clause_id):
+    """asyncio version of analyze_single_clause with the same model fallback and cache."""
+    with telemetry.span("clause", attrs={"clause_id": clause_id}):
+        for model_name, config in iter_model_configs():
+            try:
+                output = cached_clause_result(clause, clause_id, model_name, config)
+                if output is not None:
+                    return output
+
+                start = time.perf_counter()
+                if ANALYSIS_MODE == "combined":
+                    analysis = combined_to_analysis(await async_llm_analyzer.analyze_clause_combined(config, clause))
+                else:
+                    # The two requests are independent, so they run concurrently here.
+                    analyzed, key_clauses = await asyncio.gather(
+                        async_llm_analyzer.analyze_clause(config, clause),
+                        async_llm_analyzer.extract_key_clauses(config, clause)
+                    )
+                    analysis = separate_to_analysis(analyzed, key_clauses)
+                return finish_clause(clause, clause_id, model_name, config, analysis, start)
+            except Exception as e:
+                record_clause_failure(clause_id, model_name, config, e)
                 continue
 
-            regulation, summary, risk_level, risk_percent, ai_modified_clause, ai_modified_risk_level = analyze_clause(config, clause)
-            key_clauses = extract_key_clauses(config, clause)
-
-            result = {
-                'clause_id': clause_id,
-                'clause': clause,
-                'regulation': regulation,
-                'key_clauses': key_clauses,
-                'risk_level': risk_level,
-                'risk_percent': risk_percent,
-                'summary': summary,
-                'AI-Modified Clause': ai_modified_clause,
-                'AI-Modified Risk Level': ai_modified_risk_level
-            }
-
-            row = [
-                clause_id,
-                regulation,
-                key_clauses,
-                risk_level,
-                risk_percent,
-                summary
-            ]
-            
-            print(f"✅ Successfully analyzed Clause ID: {clause_id} with model: {model_name}")
-            return result, row
+        return all_models_failed(clause_id)
+
+
+async def analyze_clause_batch_async(batch):
+    """asyncio version of analyze_clause_batch."""
+    with telemetry.span("batch", attrs={"clause_ids": [clause_id for _, clause_id in batch]}):
+        # Embedding and the index search are CPU/SQLite work, so they stay off the event loop.
+        outputs, pending, vectors = await asyncio.to_thread(match_near_duplicates, batch)
+        if pending:
+            outputs.update(zip(pending, await _analyze_clause_batch_async([batch[i] for i in pending])))
+            await asyncio.to_thread(remember_analyses, vectors, pending, outputs)
+        return [outputs[i] for i in range(len(batch))]
+
 
+async def _analyze_clause_batch_async(batch):
+    """asyncio version of _analyze_clause_batch."""
+    if len(batch) == 1:
+        return [await analyze_single_clause_async(*batch[0])]
+
+    outputs = {}
+    pending = list(range(len(batch)))
+
+    for model_name, config in iter_model_configs():
+        pending = take_cached(batch, pending, outputs, config)
+        if len(pending) <= 1:
+            break
+
+        clause_ids = [batch[i][1] for i in pending]
+        start = time.perf_counter()
+        try:
+            parsed = await async_llm_analyzer.analyze_clauses_batch(config, [batch[i][0] for i in pending])
         except Exception as e:
-            print(f"❌ FAILED to analyze Clause ID: {clause_id} with model: {model_name}. Error: {e}")
-            continue # Try the next model in the preference order
+            if record_batch_failure(clause_ids, model_name, config, e):
+                break
+            continue
+        pending = finish_batch(batch, pending, parsed, outputs, model_name, config, start)
+        break
 
-    # This part is reached only if all models fail for a clause
-    print(f"🚨 ALL MODELS FAILED for Clause ID: {clause_id}. Returning empty data.")
-    return None, None
+    fallbacks = await asyncio.gather(*(analyze_single_clause_async(*batch[i]) for i in pending))
+    outputs.update(zip(pending, fallbacks))
+    return [outputs[i] for i in range(len(batch))]
+
+
+async def _iterate_in_thread(iterable):
+    """Drives a blocking iterator in a worker thread and yields its items on the event loop."""
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    done = object()
+
+    def produce():
+        try:
+            for item in iterable:
+                loop.call_soon_threadsafe(queue.put_nowait, (item, None))
+            loop.call_soon_threadsafe(queue.put_nowait, (done, None))
+        except BaseException as e:
+            loop.call_soon_threadsafe(queue.put_nowait, (done, e))
+
+    producer = loop.run_in_executor(None, telemetry.bind(produce))
+    while True:
+        item, error = await queue.get()
+        if error is not None:
+            raise error
+        if item is done:
+            break
+        yield item
+    await producer
 
 
-def analyze_contract_file(file_path):
+@telemetry.traced_run
+async def analyze_contract_file_async(file_path, max_in_flight=ASYNC_MAX_IN_FLIGHT, on_result=None):
     """
-    Analyze a contract file and return the analysis results.
+    asyncio version of analyze_contract_file. Up to max_in_flight clause
+    batches are awaited at once on a single thread (the provider rate limiters
+    still decide how many requests are actually on the wire); blocking Sheets,
+    parsing and chunking work runs in worker threads.
     """
+    job = None
     try:
-        wks = connect_sheet()
+        with telemetry.span("sheet_connect"):
+            wks = await asyncio.to_thread(connect_sheet)
         if not wks:
             print("Failed to connect to Google Sheets")
             return None
 
-        expected_header = ["Clause ID", "Regulation", "Key Clauses (AI)", "Risk Level (AI)", "Risk % (AI)", "AI Summary"]
-
-        current_header = wks.get_row(1, include_tailing_empty=False)
-        if current_header != expected_header:
-            wks.update_row(1, expected_header)
-            print("Header updated to match required columns.")
+        contract = await asyncio.to_thread(describe_contract, file_path)
+        telemetry.set_run_id(make_job_id(contract["hash"]))
+        job = await asyncio.to_thread(start_job, contract)
+        sheet_sink = await asyncio.to_thread(open_sheet_sink, wks)
+        sink = open_result_sink(sheet_sink)
 
-        print("Reading contract...")
-        contract_text = extract_text_from_file(file_path)
-        clauses = semantic_chunking(contract_text)
-        print(f"Extracted {len(clauses)} clauses from the document.")
+        semaphore = asyncio.Semaphore(max_in_flight)
 
-        starting_id = get_next_id(wks)
+        async def run(batch):
+            async with semaphore:
+                return await analyze_clause_batch_async(batch)
 
+        # Parsing and chunking run in a worker thread; each batch becomes a task as soon as it's emitted.
+        tasks = []
+        num_clauses = 0
         analysis_results = []
-        rows_to_append = []
-
-        # Parallel execution
-        with ThreadPoolExecutor() as executor:
-            futures = {
-                executor.submit(analyze_single_clause, clause, starting_id + i): (i, clause)
-                for i, clause in enumerate(clauses)
-            }
-
-            for future in as_completed(futures):
-                try:
-                    result, row = future.result()
-                    if result and row: # Only append if the analysis was successful
-                        analysis_results.append(result)
-                        rows_to_append.append(row)
-                except Exception as e:
-                    print(f"Error processing future result: {e}")
-
-        
-        if analysis_results:
-            analysis_results.sort(key=lambda x: x['clause_id'])
-        if rows_to_append:
-            rows_to_append.sort(key=lambda x: x[0])
-
-        update_sheet_with_data(wks, rows_to_append)
-        print("Analysis completed and data updated in Google Sheets.")
+        results_lock = threading.Lock()
+        emitter = ResultEmitter(on_result)
+        batches = iter_clause_batches(iter_triaged(
+            job.iter_pending(iter_contract_clauses(file_path), sheet_sink.iter_ids()),
+            local_result_collector(analysis_results, sink, results_lock, contract, job, emitter)
+        ))
+        async for batch in _iterate_in_thread(batches):
+            tasks.append(asyncio.create_task(run(batch)))
+            num_clauses += len(batch)
+        print_extraction_stats(num_clauses, len(tasks))
 
+        await asyncio.to_thread(restore_resumed_results, job, wks, sink, contract, analysis_results, results_lock, emitter)
+        for next_done in asyncio.as_completed(tasks):
+            try:
+                outputs = await next_done
+            except Exception as e:
+                print(f"Error processing batch result: {e}")
+                continue
+            # sink.add may flush to the sheet, which blocks.
+            await asyncio.to_thread(collect_outputs, outputs, analysis_results, sink, results_lock, contract, job, emitter)
+
+        analysis_results.sort(key=lambda x: x['clause_id'])
+        await asyncio.to_thread(sink.flush)
+        await asyncio.to_thread(job.finish)
+        print("Analysis completed and data updated in Google Sheets.")
+        print_run_stats()
         return analysis_results
 
     except FileNotFoundError as e:
         print(f"Error: {e}. Please check the file path.")
         return None
     except Exception as e:
+        if job:
+            job.finish(error=e)
         print(f"An unexpected error occurred: {e}")
         return None
+    finally:
+        await async_llm_analyzer.aclose_clients()
 
 
 def batch_analyze_contracts(file_paths):
-    results = {}
-    for file_path in file_paths:
-        results[file_path] = analyze_contract_file(file_path)
-    return results
\ No newline at end of file
+    """
+    Analyze several contracts together and return {file_path: analysis results}.
+    See batch_runner.run_batch for how the work is shared across documents.
+    """
+    from batch_runner import run_batch
+    return run_batch(file_paths)
\ No newline at end of file
@@ -1,12 +1,18 @@
 import os
-import pygsheets
-import docx
-from pypdf import PdfReader
+import time
+import hashlib
 from dotenv import load_dotenv
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_experimental.text_splitter import SemanticChunker
+from embedding_registry import get_chunker, record_chunking_time
+from config import STREAM_CHUNK_WINDOW_CHARS, SHEET_BACKEND, LOCAL_SHEET_PATH
+
+# pygsheets, python-docx and pypdf are imported inside the functions that use
+# them; together they dominate import time and most callers only need one.
 
 def connect_sheet():
+    if SHEET_BACKEND == "local":
+        from sheet_sink import get_local_worksheet
+        return get_local_worksheet(LOCAL_SHEET_PATH)
+
     load_dotenv()
     creds_path = os.getenv("GOOGLE_SHEET_API_CRED")
     sheet_id = os.getenv("GOOGLE_SHEET_ID")
@@ -14,6 +20,7 @@ def connect_sheet():
     if not creds_path or not os.path.exists(creds_path):
         raise FileNotFoundError(f"Service account JSON not found at {creds_path}")
     try:
+        import pygsheets
         gc = pygsheets.authorize(service_file=creds_path)
         sh = gc.open_by_key(sheet_id)
         return sh.sheet1
@@ -21,32 +28,93 @@ def connect_sheet():
         print(f"Connection failed: {e}")
         return None
 
+_file_hashes = {}
+
+def hash_file(file_path):
+    """sha256 of the file contents; identifies a contract across runs and renames."""
+    stat = os.stat(file_path)
+    key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+    digest = _file_hashes.get(key)
+    if digest is None:
+        sha = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                sha.update(block)
+        digest = _file_hashes[key] = sha.hexdigest()
+    return digest
+
+def iter_text_from_file(file_path, parallel=True):
+    """
+    Yields the text of each PDF page or DOCX paragraph as soon as it is parsed.
+    See text_extractor for the sharded PDF parsing and extracted-text cache.
+    """
+    from text_extractor import iter_document_text
+    return iter_document_text(file_path, parallel)
+
 def extract_text_from_file(file_path):
-    if file_path.endswith('.pdf'):
-        reader = PdfReader(file_path)
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text() + "\n"
-        return text
-    elif file_path.endswith('.docx'):
-        doc = docx.Document(file_path)
-        text = ""
-        for para in doc.paragraphs:
-            text += para.text + "\n"
-        return text
-    else:
+    if not file_path.endswith(('.pdf', '.docx')):
         raise ValueError("Unsupported file format. Please use a .pdf or .docx file.")
+    return "".join(part + "\n" for part in iter_text_from_file(file_path))
 
 def semantic_chunking(text):
-    embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-    text_splitter = SemanticChunker(embeddings)
-    clauses = text_splitter.create_documents([text])
-    return [doc.page_content for doc in clauses]
+    text_splitter = get_chunker()
+    start = time.perf_counter()
+    clauses = text_splitter.split_text(text)
+    record_chunking_time(time.perf_counter() - start, len(text), len(clauses))
+    return clauses
+
+def iter_semantic_chunks(text_parts, window_chars=STREAM_CHUNK_WINDOW_CHARS):
+    """
+    Incremental semantic_chunking over an iterable of text parts (pages or
+    paragraphs). Text is chunked once at least window_chars have been
+    buffered; every chunk except the last is emitted straight away, and the
+    last one is carried into the next window because it may continue on the
+    following page. Boundaries can differ slightly from chunking the whole
+    document at once, since breakpoints are computed per window.
+    """
+    text_splitter = get_chunker()
+    buffer = []
+    buffered = 0
+    total_chars = 0
+    total_clauses = 0
+    seconds = 0.0
+
+    def split(text):
+        nonlocal seconds
+        start = time.perf_counter()
+        chunks = text_splitter.split_text(text)
+        seconds += time.perf_counter() - start
+        return chunks
+
+    for part in text_parts:
+        buffer.append(part + "\n")
+        buffered += len(part) + 1
+        total_chars += len(part) + 1
+        if buffered < window_chars:
+            continue
+
+        chunks = split("".join(buffer))
+        carry = chunks.pop() if chunks else ""
+        # A window that never finds a breakpoint would otherwise be re-chunked forever.
+        if len(carry) >= 2 * window_chars:
+            chunks.append(carry)
+            carry = ""
+        for chunk in chunks:
+            total_clauses += 1
+            yield chunk
+        buffer = [carry + "\n"] if carry else []
+        buffered = len(carry) + 1 if carry else 0
+
+    if buffer and "".join(buffer).strip():
+        for chunk in split("".join(buffer)):
+            total_clauses += 1
+            yield chunk
+    record_chunking_time(seconds, total_chars, total_clauses)
 
 def get_next_id(wks):
     """Gets the next available Clause ID from the sheet."""
-    all_values = wks.get_all_values(include_tailing_empty=False)
-    return len(all_values)
+    # Clause IDs live in column A, so one column is enough to count the rows.
+    return len(wks.get_col(1, include_tailing_empty=False))
 
 def update_sheet_with_data(wks, data):
     """Appends a list of rows to the sheet."""
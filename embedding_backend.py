@@ -0,0 +1,144 @@
+# embedding_backend.py
+#
+# Sentence embeddings and semantic chunking without LangChain.
+#
+# SentenceEncoder calls sentence-transformers directly. It encodes in
+# EMBEDDING_BATCH_SIZE batches, with optional int8 dynamic quantization or
+# ONNX Runtime. Repeated texts are answered from an in-memory LRU cache
+# shared across documents: standard clauses recur between contracts, and
+# iter_semantic_chunks re-chunks the sentences it carries over between
+# windows. It also implements embed_documents / embed_query, so clause_index
+# and clause_triage can keep using it through get_embeddings().
+#
+# SemanticSplitter uses the same algorithm as langchain_experimental's
+# SemanticChunker: sentence windows (buffer_size=1) and a percentile
+# breakpoint on the cosine distance between neighbouring windows. The
+# distances and breakpoints are computed in one NumPy pass instead of
+# per-pair Python loops.
+
+import re
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+from config import EMBEDDING_BATCH_SIZE, EMBEDDING_ONNX_FILE, EMBEDDING_CACHE_SIZE, CHUNK_BREAKPOINT_PERCENTILE
+
+BACKENDS = ("torch", "int8", "onnx")
+_SENTENCE_END = re.compile(r"(?<=[.?!])\s+")
+
+
+def _load_model(model_name, device, backend):
+    """(model, backend actually used). ONNX and int8 fall back to plain torch when unavailable."""
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "onnx":
+        try:
+            model_kwargs = {"file_name": EMBEDDING_ONNX_FILE} if EMBEDDING_ONNX_FILE else None
+            return SentenceTransformer(model_name, device=device, backend="onnx", model_kwargs=model_kwargs), "onnx"
+        except Exception as e:
+            print(f"⚠️ ONNX embedding backend unavailable ({e}); using torch.")
+            backend = "torch"
+
+    model = SentenceTransformer(model_name, device=device)
+    if backend == "int8":
+        if device != "cpu":
+            print(f"⚠️ int8 quantization is CPU-only; using unquantized weights on {device}.")
+            return model, "torch"
+        import torch
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    return model, backend
+
+
+def _cache_key(text):
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+class SentenceEncoder:
+    """Batched, cached sentence-transformers encoder exposing the LangChain Embeddings methods."""
+
+    def __init__(self, model_name, device="cpu", backend="torch", batch_size=EMBEDDING_BATCH_SIZE,
+                 cache_size=EMBEDDING_CACHE_SIZE):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown embedding backend: {backend}")
+        self.model, self.backend = _load_model(model_name, device, backend)
+        self.dimension = self.model.get_sentence_embedding_dimension()
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def encode(self, texts):
+        """Unit-length float32 embeddings, one row per text."""
+        # HuggingFaceEmbeddings does the same, so vectors match the LangChain backend.
+        texts = [text.replace("\n", " ") for text in texts]
+        vectors = np.empty((len(texts), self.dimension), dtype=np.float32)
+        missing = {}
+        with self._lock:
+            for i, text in enumerate(texts):
+                key = _cache_key(text)
+                cached = self._cache.get(key)
+                if cached is None:
+                    missing.setdefault(key, (text, []))[1].append(i)
+                else:
+                    self._cache.move_to_end(key)
+                    vectors[i] = cached
+            self._hits += len(texts) - sum(len(rows) for _, rows in missing.values())
+            self._misses += len(missing)
+        if not missing:
+            return vectors
+
+        encoded = self.model.encode(
+            [text for text, _ in missing.values()],
+            batch_size=self.batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        ).astype(np.float32, copy=False)
+        with self._lock:
+            for (key, (_, rows)), vector in zip(missing.items(), encoded):
+                vectors[rows] = vector
+                if self.cache_size > 0:
+                    self._cache[key] = vector.copy()
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return vectors
+
+    def embed_documents(self, texts):
+        return self.encode(list(texts)).tolist()
+
+    def embed_query(self, text):
+        return self.encode([text])[0].tolist()
+
+    def get_cache_stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "backend": self.backend,
+                "cached": len(self._cache),
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0
+            }
+
+
+class SemanticSplitter:
+    """Drop-in for SemanticChunker.split_text on top of a SentenceEncoder."""
+
+    def __init__(self, encoder, breakpoint_percentile=CHUNK_BREAKPOINT_PERCENTILE, buffer_size=1):
+        self.encoder = encoder
+        self.breakpoint_percentile = breakpoint_percentile
+        self.buffer_size = buffer_size
+
+    def split_text(self, text):
+        sentences = _SENTENCE_END.split(text)
+        if len(sentences) == 1:
+            return sentences
+        b = self.buffer_size
+        windows = [" ".join(sentences[max(0, i - b):i + b + 1]) for i in range(len(sentences))]
+        vectors = self.encoder.encode(windows)
+        distances = 1.0 - np.einsum("ij,ij->i", vectors[:-1], vectors[1:])
+        threshold = np.percentile(distances, self.breakpoint_percentile)
+        bounds = [0] + (np.flatnonzero(distances > threshold) + 1).tolist() + [len(sentences)]
+        return [" ".join(sentences[start:stop]) for start, stop in zip(bounds, bounds[1:])]
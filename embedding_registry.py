@@ -0,0 +1,100 @@
+# embedding_registry.py
+
+import time
+import threading
+from collections import deque
+from config import EMBEDDING_MODEL_NAME, EMBEDDING_DEVICE, EMBEDDING_NUM_THREADS, EMBEDDING_BACKEND
+
+_lock = threading.Lock()
+_embeddings = {}
+_chunkers = {}
+_load_times = {}
+_chunking_times = deque(maxlen=500)
+
+
+def _apply_thread_count():
+    if EMBEDDING_NUM_THREADS and EMBEDDING_NUM_THREADS > 0:
+        import torch
+        torch.set_num_threads(EMBEDDING_NUM_THREADS)
+
+
+def get_embeddings(model_name=None, device=None):
+    """
+    Returns the process-wide embedding model for (model_name, device),
+    loading it on first use. Safe to call from multiple threads. This is an
+    embedding_backend.SentenceEncoder unless EMBEDDING_BACKEND is "langchain".
+    """
+    key = (model_name or EMBEDDING_MODEL_NAME, device or EMBEDDING_DEVICE)
+    embeddings = _embeddings.get(key)
+    if embeddings is not None:
+        return embeddings
+
+    with _lock:
+        if key not in _embeddings:
+            _apply_thread_count()
+            start = time.perf_counter()
+            if EMBEDDING_BACKEND == "langchain":
+                from langchain_huggingface import HuggingFaceEmbeddings
+                _embeddings[key] = HuggingFaceEmbeddings(
+                    model_name=key[0],
+                    model_kwargs={"device": key[1]}
+                )
+                backend = "langchain"
+            else:
+                from embedding_backend import SentenceEncoder
+                _embeddings[key] = SentenceEncoder(key[0], key[1], EMBEDDING_BACKEND)
+                backend = _embeddings[key].backend
+            _load_times[key] = time.perf_counter() - start
+            print(f"✅ Loaded embedding model {key[0]} ({backend}) on {key[1]} in {_load_times[key]:.2f}s")
+        return _embeddings[key]
+
+
+def get_chunker(model_name=None, device=None):
+    """Returns the shared chunker (split_text) built on top of get_embeddings()."""
+    key = (model_name or EMBEDDING_MODEL_NAME, device or EMBEDDING_DEVICE)
+    chunker = _chunkers.get(key)
+    if chunker is not None:
+        return chunker
+
+    embeddings = get_embeddings(*key)
+    with _lock:
+        if key not in _chunkers:
+            if EMBEDDING_BACKEND == "langchain":
+                from langchain_experimental.text_splitter import SemanticChunker
+                _chunkers[key] = SemanticChunker(embeddings)
+            else:
+                from embedding_backend import SemanticSplitter
+                _chunkers[key] = SemanticSplitter(embeddings)
+        return _chunkers[key]
+
+
+def warm_up(model_name=None, device=None):
+    """Loads the model and runs one tiny encode so the first contract doesn't pay for it."""
+    embeddings = get_embeddings(model_name, device)
+    embeddings.embed_query("warm up")
+    get_chunker(model_name, device)
+
+
+def record_chunking_time(seconds, num_chars, num_clauses):
+    _chunking_times.append({
+        "seconds": seconds,
+        "chars": num_chars,
+        "clauses": num_clauses
+    })
+
+
+def get_stats():
+    """Load times per model, recent per-document chunking times and embedding cache use."""
+    timings = list(_chunking_times)
+    total = sum(t["seconds"] for t in timings)
+    return {
+        "load_seconds": {f"{name}@{device}": secs for (name, device), secs in _load_times.items()},
+        "documents_chunked": len(timings),
+        "avg_chunking_seconds": total / len(timings) if timings else 0.0,
+        "last_chunking": timings[-1] if timings else None,
+        "embedding_cache": {
+            f"{name}@{device}": embeddings.get_cache_stats()
+            for (name, device), embeddings in list(_embeddings.items())
+            if hasattr(embeddings, "get_cache_stats")
+        }
+    }
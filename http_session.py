@@ -0,0 +1,175 @@
+# http_session.py
+
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from config import HTTP_POOL_SETTINGS, HTTP2_ENABLED
+
+LATENCY_BUCKETS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+
+_lock = threading.Lock()
+_sessions = {}
+_histograms = {}
+
+
+def http2_available():
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _settings(provider):
+    return HTTP_POOL_SETTINGS.get(provider, HTTP_POOL_SETTINGS["default"])
+
+
+# Every provider call is a POST the provider may bill for, so the transports
+# only retry failed connections, where nothing was sent. 5xx responses and
+# read errors go to the caller's model fallback, and 429s to rate_limiter so
+# they count against the provider's budget.
+
+
+def build_retry_transport(provider, asynchronous=False, **kwargs):
+    """httpx transport that retries failed connections only (see above)."""
+    import httpx
+    transport = httpx.AsyncHTTPTransport if asynchronous else httpx.HTTPTransport
+    return transport(retries=_settings(provider)["retries"], **kwargs)
+
+
+def _build_session(provider):
+    settings = _settings(provider)
+    if HTTP2_ENABLED and http2_available():
+        import httpx
+        # httpx.Client ignores its own limits/http2 when a transport is given,
+        # so the pool settings go on the transport.
+        return httpx.Client(
+            transport=build_retry_transport(
+                provider,
+                http2=True,
+                limits=httpx.Limits(
+                    max_connections=settings["pool_maxsize"],
+                    max_keepalive_connections=settings["pool_maxsize"]
+                )
+            )
+        )
+
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    retry = Retry(
+        total=settings["retries"],
+        connect=settings["retries"],
+        read=False,
+        status=0,
+        other=0,
+        backoff_factor=settings["backoff_factor"],
+        # urllib3 retries any 429 carrying Retry-After on its own when this is on,
+        # which would hide throttling from rate_limiter.
+        respect_retry_after_header=False,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(
+        pool_connections=settings["pool_connections"],
+        pool_maxsize=settings["pool_maxsize"],
+        max_retries=retry
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session(provider):
+    """Shared keep-alive session for a provider (requests, or httpx when HTTP/2 is on)."""
+    session = _sessions.get(provider)
+    if session is None:
+        with _lock:
+            session = _sessions.get(provider)
+            if session is None:
+                session = _build_session(provider)
+                _sessions[provider] = session
+    return session
+
+
+def post(provider, url, **kwargs):
+    """POSTs through the provider's pooled session with its connect/read timeouts."""
+    settings = _settings(provider)
+    timeout = (settings["connect_timeout"], settings["read_timeout"])
+    session = get_session(provider)
+    if type(session).__module__.startswith("httpx"):
+        import httpx
+        timeout = httpx.Timeout(settings["read_timeout"], connect=settings["connect_timeout"])
+    start = time.perf_counter()
+    try:
+        return session.post(url, timeout=timeout, **kwargs)
+    finally:
+        record_latency(provider, time.perf_counter() - start)
+
+
+@contextmanager
+def post_stream(provider, url, **kwargs):
+    """
+    Streaming POST through the provider's pooled session. Yields
+    (response headers, iterator of decoded text lines) and raises for HTTP
+    errors before any line is read. Latency covers the whole stream.
+    """
+    settings = _settings(provider)
+    session = get_session(provider)
+    start = time.perf_counter()
+    try:
+        if type(session).__module__.startswith("httpx"):
+            import httpx
+            timeout = httpx.Timeout(settings["read_timeout"], connect=settings["connect_timeout"])
+            with session.stream("POST", url, timeout=timeout, **kwargs) as response:
+                if response.is_error:
+                    response.read()
+                response.raise_for_status()
+                yield response.headers, response.iter_lines()
+        else:
+            timeout = (settings["connect_timeout"], settings["read_timeout"])
+            with session.post(url, timeout=timeout, stream=True, **kwargs) as response:
+                response.raise_for_status()
+                # SSE responses often omit the charset; requests would assume latin-1.
+                response.encoding = response.encoding if "charset" in response.headers.get("content-type", "") else "utf-8"
+                yield response.headers, response.iter_lines(decode_unicode=True)
+    finally:
+        record_latency(provider, time.perf_counter() - start)
+
+
+def record_latency(provider, seconds):
+    index = bisect.bisect_left(LATENCY_BUCKETS, seconds)
+    with _lock:
+        histogram = _histograms.setdefault(
+            provider, {"counts": [0] * (len(LATENCY_BUCKETS) + 1), "count": 0, "sum": 0.0}
+        )
+        histogram["counts"][index] += 1
+        histogram["count"] += 1
+        histogram["sum"] += seconds
+
+
+def get_latency_histograms():
+    """
+    Per-provider request latency histograms. "buckets" maps each upper bound
+    in seconds ("+Inf" last) to the number of requests that finished within it.
+    """
+    with _lock:
+        snapshot = {provider: dict(h, counts=list(h["counts"])) for provider, h in _histograms.items()}
+    histograms = {}
+    for provider, h in snapshot.items():
+        bounds = [str(b) for b in LATENCY_BUCKETS] + ["+Inf"]
+        histograms[provider] = {
+            "buckets": dict(zip(bounds, h["counts"])),
+            "count": h["count"],
+            "mean_seconds": h["sum"] / h["count"] if h["count"] else 0.0
+        }
+    return histograms
+
+
+def close_sessions():
+    with _lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
@@ -0,0 +1,261 @@
+# job_journal.py
+#
+# Checkpoint journal for contract analysis jobs. Every finished clause is
+# recorded (by position and content hash) together with its result, so if a
+# run dies halfway -- an exception, a Streamlit rerun, a pod restart -- the
+# next run of the same contract only pays for the clauses that are missing.
+
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from clause_cache import normalize_clause
+from config import JOB_JOURNAL_ENABLED, JOB_JOURNAL_PATH, PROMPT_VERSION, ANALYSIS_MODE
+
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+
+def clause_hash(clause):
+    return hashlib.sha256(normalize_clause(clause).encode("utf-8")).hexdigest()
+
+
+def make_job_id(contract_hash):
+    """Jobs are per contract, prompt version and analysis mode; a prompt change starts over."""
+    return hashlib.sha256(f"{PROMPT_VERSION}:{ANALYSIS_MODE}:{contract_hash}".encode("utf-8")).hexdigest()[:16]
+
+
+class JobJournal:
+    def __init__(self, path=JOB_JOURNAL_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " job_id TEXT PRIMARY KEY,"
+            " contract_hash TEXT NOT NULL,"
+            " contract_name TEXT,"
+            " status TEXT NOT NULL,"
+            " total INTEGER,"
+            " done INTEGER NOT NULL DEFAULT 0,"
+            " resumed INTEGER NOT NULL DEFAULT 0,"
+            " attempts INTEGER NOT NULL DEFAULT 1,"
+            " error TEXT,"
+            " started_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS job_clauses ("
+            " job_id TEXT NOT NULL,"
+            " clause_index INTEGER NOT NULL,"
+            " clause_hash TEXT NOT NULL,"
+            " clause_id INTEGER NOT NULL,"
+            " result_json TEXT NOT NULL,"
+            " PRIMARY KEY (job_id, clause_index))"
+        )
+        self._conn.commit()
+
+    def start(self, contract):
+        """
+        Opens the job for a contract. An interrupted or failed job is resumed
+        from its checkpoints; a completed one is started over.
+        """
+        job_id = make_job_id(contract["hash"])
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT status, started_at FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if row is None or row[0] == COMPLETED:
+                started_at = now
+                self._conn.execute("DELETE FROM job_clauses WHERE job_id = ?", (job_id,))
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO jobs (job_id, contract_hash, contract_name, status, started_at, updated_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    (job_id, contract["hash"], contract.get("name"), RUNNING, now, now)
+                )
+                finished = {}
+            else:
+                started_at = row[1]
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, error = NULL, attempts = attempts + 1, updated_at = ? WHERE job_id = ?",
+                    (RUNNING, now, job_id)
+                )
+                finished = {
+                    index: (h, json.loads(result_json))
+                    for index, h, result_json in self._conn.execute(
+                        "SELECT clause_index, clause_hash, result_json FROM job_clauses WHERE job_id = ?", (job_id,)
+                    )
+                }
+            self._conn.commit()
+        if finished:
+            print(f"↩️ Resuming job {job_id} for {contract.get('name')}: {len(finished)} clauses already checkpointed.")
+        return AnalysisJob(self, job_id, finished, f"{job_id}-{round(started_at * 1000)}")
+
+    def record(self, job_id, entries):
+        """entries: (clause_index, clause_hash, result) for newly finished clauses."""
+        if not entries:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO job_clauses (job_id, clause_index, clause_hash, clause_id, result_json)"
+                " VALUES (?, ?, ?, ?, ?)",
+                [(job_id, index, h, result["clause_id"], json.dumps(result)) for index, h, result in entries]
+            )
+            self._conn.execute(
+                "UPDATE jobs SET done = (SELECT COUNT(*) FROM job_clauses WHERE job_id = ?), updated_at = ?"
+                " WHERE job_id = ?",
+                (job_id, time.time(), job_id)
+            )
+            self._conn.commit()
+
+    def update(self, job_id, **fields):
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {assignments} WHERE job_id = ?", list(fields.values()) + [job_id])
+            self._conn.commit()
+
+    def get_results(self, job_id):
+        """Results checkpointed so far for a job, in clause order."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT result_json FROM job_clauses WHERE job_id = ? ORDER BY clause_id", (job_id,)
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def get_job(self, job_id):
+        jobs = self.list_jobs(job_id=job_id)
+        return jobs[0] if jobs else None
+
+    def list_jobs(self, limit=20, job_id=None):
+        """Most recently updated jobs first, as plain dicts for the UI."""
+        sql = ("SELECT job_id, contract_hash, contract_name, status, total, done, resumed, attempts, error,"
+               " started_at, updated_at FROM jobs")
+        params = []
+        if job_id:
+            sql += " WHERE job_id = ?"
+            params.append(job_id)
+        sql += " ORDER BY updated_at DESC LIMIT ?"
+        params.append(limit)
+        columns = ["job_id", "contract_hash", "contract_name", "status", "total", "done", "resumed",
+                   "attempts", "error", "started_at", "updated_at"]
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [dict(zip(columns, row)) for row in rows]
+
+
+class AnalysisJob:
+    """One run of a contract through the analyzer, backed by the journal."""
+
+    def __init__(self, journal, job_id, finished, run_id):
+        self.journal = journal
+        self.job_id = job_id
+        # Stays the same when the job is resumed, changes when it's started over.
+        self.run_id = run_id
+        self.resumed_results = []
+        self._finished = finished
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def iter_pending(self, clauses, ids):
+        """
+        Yields (clause, clause_id) for the clauses that still need analysis,
+        taking ids from `ids` only for those. Checkpointed clauses (same
+        position, same text) are collected into resumed_results instead.
+        """
+        total = 0
+        for index, clause in enumerate(clauses):
+            total += 1
+            h = clause_hash(clause)
+            checkpoint = self._finished.get(index)
+            if checkpoint and checkpoint[0] == h:
+                self.resumed_results.append(checkpoint[1])
+                continue
+            clause_id = next(ids)
+            with self._lock:
+                self._pending[clause_id] = (index, h)
+            yield clause, clause_id
+        self.journal.update(self.job_id, total=total, resumed=len(self.resumed_results))
+
+    def record(self, results):
+        """Checkpoints newly finished results."""
+        with self._lock:
+            entries = [self._pending[result["clause_id"]] + (result,) for result in results
+                       if result["clause_id"] in self._pending]
+        self.journal.record(self.job_id, entries)
+
+    def finish(self, error=None):
+        """
+        Marks the job completed, or failed if it raised or some clauses never
+        got a result -- a failed job is resumed by the next run.
+        """
+        if error is None:
+            job = self.status()
+            missing = (job["total"] or 0) - job["done"]
+            if missing > 0:
+                error = f"{missing} clauses could not be analyzed"
+        if error is None:
+            self.journal.update(self.job_id, status=COMPLETED, error=None)
+        else:
+            self.journal.update(self.job_id, status=FAILED, error=str(error))
+
+    def status(self):
+        return self.journal.get_job(self.job_id)
+
+
+class UntrackedJob:
+    """Stand-in with the AnalysisJob interface for when the journal is disabled."""
+
+    job_id = None
+
+    def __init__(self):
+        self.run_id = f"untracked-{time.time_ns()}"
+        self.resumed_results = []
+
+    def iter_pending(self, clauses, ids):
+        return zip(clauses, ids)
+
+    def record(self, results):
+        pass
+
+    def finish(self, error=None):
+        pass
+
+    def status(self):
+        return None
+
+
+_journal = None
+_journal_lock = threading.Lock()
+
+
+def get_job_journal():
+    """Process-wide JobJournal, or None when JOB_JOURNAL_ENABLED is off."""
+    global _journal
+    if not JOB_JOURNAL_ENABLED:
+        return None
+    with _journal_lock:
+        if _journal is None:
+            _journal = JobJournal()
+        return _journal
+
+
+def start_job(contract):
+    """
+    Starts or resumes the journaled job for a contract, and tags the contract
+    dict with the job's run_id so result stores can replace an earlier run's rows.
+    """
+    job = None
+    journal = get_job_journal()
+    if journal is not None:
+        try:
+            job = journal.start(contract)
+        except sqlite3.Error as e:
+            print(f"⚠️ Job journal unavailable, running without checkpoints: {e}")
+    job = job or UntrackedJob()
+    contract["run_id"] = job.run_id
+    return job
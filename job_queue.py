@@ -0,0 +1,259 @@
+# job_queue.py
+#
+# SQLite-backed queue of contract analysis jobs, worked by separate processes
+# so the Streamlit request thread only submits and polls. Progress and partial
+# results come from the job journal, which every worker checkpoints into.
+#
+#   python job_queue.py --workers 2
+
+import os
+import sys
+import time
+import shutil
+import sqlite3
+import argparse
+import threading
+import subprocess
+from config import (
+    JOB_QUEUE_PATH,
+    JOB_QUEUE_UPLOAD_DIR,
+    JOB_QUEUE_POLL_SECONDS,
+    JOB_QUEUE_STALE_SECONDS,
+    SHEET_ID_ALLOCATOR_PATH
+)
+from job_journal import get_job_journal, make_job_id
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+_COLUMNS = ["queue_id", "file_path", "contract_name", "contract_hash", "status", "worker_pid", "error",
+            "submitted_at", "started_at", "heartbeat_at", "finished_at"]
+
+
+class JobQueue:
+    def __init__(self, path=JOB_QUEUE_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        # isolation_level=None so claim() can take the write lock with BEGIN IMMEDIATE.
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS queue ("
+            " queue_id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " file_path TEXT NOT NULL,"
+            " contract_name TEXT,"
+            " contract_hash TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " worker_pid INTEGER,"
+            " error TEXT,"
+            " submitted_at REAL NOT NULL,"
+            " started_at REAL,"
+            " heartbeat_at REAL,"
+            " finished_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_queue_status ON queue(status, queue_id)")
+
+    def _row(self, row):
+        return dict(zip(_COLUMNS, row)) if row else None
+
+    def submit(self, file_path, contract_name=None):
+        """
+        Copies the contract into the upload directory and queues it. If the same
+        contract is already queued or running, that entry's id is returned instead.
+        """
+        from data_handler import hash_file
+
+        contract_hash = hash_file(file_path)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT queue_id FROM queue WHERE contract_hash = ? AND status IN (?, ?)",
+                (contract_hash, QUEUED, RUNNING)
+            ).fetchone()
+            if row:
+                return row[0]
+            os.makedirs(JOB_QUEUE_UPLOAD_DIR, exist_ok=True)
+            # Absolute, so a worker started from another directory still finds it.
+            stored_path = os.path.abspath(os.path.join(JOB_QUEUE_UPLOAD_DIR, contract_hash + os.path.splitext(file_path)[1]))
+            shutil.copyfile(file_path, stored_path)
+            cursor = self._conn.execute(
+                "INSERT INTO queue (file_path, contract_name, contract_hash, status, submitted_at) VALUES (?, ?, ?, ?, ?)",
+                (stored_path, contract_name or os.path.basename(file_path), contract_hash, QUEUED, time.time())
+            )
+            return cursor.lastrowid
+
+    def claim(self, worker_pid):
+        """
+        Atomically takes the oldest queued job, or a running one whose worker
+        stopped heartbeating (the journal lets it pick up where that worker died).
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    f"SELECT {', '.join(_COLUMNS)} FROM queue"
+                    " WHERE status = ? OR (status = ? AND heartbeat_at < ?)"
+                    " ORDER BY queue_id LIMIT 1",
+                    (QUEUED, RUNNING, now - JOB_QUEUE_STALE_SECONDS)
+                ).fetchone()
+                if row:
+                    self._conn.execute(
+                        "UPDATE queue SET status = ?, worker_pid = ?, started_at = ?, heartbeat_at = ? WHERE queue_id = ?",
+                        (RUNNING, worker_pid, now, now, row[0])
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return self._row(row)
+
+    def heartbeat(self, queue_id):
+        with self._lock:
+            self._conn.execute("UPDATE queue SET heartbeat_at = ? WHERE queue_id = ?", (time.time(), queue_id))
+
+    def finish(self, queue_id, error=None):
+        status = COMPLETED if error is None else FAILED
+        with self._lock:
+            self._conn.execute(
+                "UPDATE queue SET status = ?, error = ?, finished_at = ? WHERE queue_id = ?",
+                (status, error, time.time(), queue_id)
+            )
+
+    def get(self, queue_id):
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM queue WHERE queue_id = ?", (queue_id,)
+            ).fetchone()
+        return self._row(row)
+
+    def get_progress(self, queue_id):
+        """
+        Queue entry plus journal progress: done, total (None until chunking
+        finishes), eta_seconds and the partial results checkpointed so far.
+        """
+        entry = self.get(queue_id)
+        if entry is None:
+            return None
+        entry.update(done=0, total=None, eta_seconds=None, results=[])
+        journal = get_job_journal()
+        if journal is None:
+            return entry
+        job_id = make_job_id(entry["contract_hash"])
+        job = journal.get_job(job_id)
+        if job is None or entry["started_at"] is None:
+            return entry
+        entry.update(done=job["done"], total=job["total"], results=journal.get_results(job_id))
+
+        # Clauses reused from checkpoints cost nothing, so the rate only counts this run's work.
+        elapsed = time.time() - entry["started_at"]
+        analyzed = job["done"] - job["resumed"]
+        if entry["status"] == RUNNING and job["total"] and analyzed > 0 and elapsed > 0:
+            entry["eta_seconds"] = (job["total"] - job["done"]) * elapsed / analyzed
+        return entry
+
+    def list_entries(self, limit=20):
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM queue ORDER BY queue_id DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [self._row(row) for row in rows]
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue()
+        return _queue
+
+
+def _heartbeat(queue, queue_id, stop):
+    while not stop.wait(JOB_QUEUE_STALE_SECONDS / 4):
+        queue.heartbeat(queue_id)
+
+
+def run_worker(poll_seconds=JOB_QUEUE_POLL_SECONDS, once=False):
+    """Worker process loop: claim a job, analyze it, record the outcome, repeat."""
+    from contract_analyzer import analyze_contract_file
+
+    from embedding_registry import warm_up
+
+    queue = get_job_queue()
+    pid = os.getpid()
+    threading.Thread(target=warm_up, name="embedding-warm-up", daemon=True).start()
+    print(f"👷 Worker {pid} waiting for jobs...")
+    while True:
+        entry = queue.claim(pid)
+        if entry is None:
+            if once:
+                return
+            time.sleep(poll_seconds)
+            continue
+
+        print(f"👷 Worker {pid} picked up job {entry['queue_id']} ({entry['contract_name']}).")
+        stop = threading.Event()
+        threading.Thread(target=_heartbeat, args=(queue, entry["queue_id"], stop), daemon=True).start()
+        error = None
+        try:
+            if analyze_contract_file(entry["file_path"]) is None:
+                journal = get_job_journal()
+                job = journal.get_job(make_job_id(entry["contract_hash"])) if journal else None
+                error = (job and job["error"]) or "Analysis failed; see the worker log."
+        except Exception as e:
+            error = str(e)
+        finally:
+            stop.set()
+        queue.finish(entry["queue_id"], error)
+        if error is None:
+            try:
+                os.unlink(entry["file_path"])
+            except OSError:
+                pass
+        print(f"👷 Worker {pid} finished job {entry['queue_id']}: {'completed' if error is None else error}")
+
+
+def spawn_workers(count, once=False):
+    """
+    Starts `count` worker processes running this module; returns their Popen
+    handles. Workers inherit the caller's working directory, so relative
+    queue, journal, upload and metrics paths resolve to the same files.
+    """
+    if count > 1 and not SHEET_ID_ALLOCATOR_PATH:
+        # Without the shared allocator each worker hands out Clause IDs from its own
+        # cursor, so concurrent workers writing to one sheet would reuse IDs.
+        print(f"⚠️ SHEET_ID_ALLOCATOR_PATH is empty; starting 1 worker instead of {count}.")
+        count = 1
+    command = [sys.executable, os.path.abspath(__file__), "--workers", "1"]
+    if once:
+        command.append("--once")
+    return [subprocess.Popen(command) for _ in range(count)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run contract analysis queue workers.")
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker processes")
+    parser.add_argument("--once", action="store_true", help="Exit once the queue is empty")
+    args = parser.parse_args(argv)
+
+    if args.workers <= 1:
+        run_worker(once=args.once)
+        return 0
+    workers = spawn_workers(args.workers, once=args.once)
+    try:
+        for worker in workers:
+            worker.wait()
+    except KeyboardInterrupt:
+        for worker in workers:
+            worker.terminate()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,38 +1,91 @@
 # llm_analyzer.py (Updated with stricter rule)
 
 import os
-import requests
-from groq import Groq
-from groq.types.chat.chat_completion import ChatCompletion
-from config import MODEL_CONFIG, MODEL_PREFERENCE_ORDER
+import re
+import json
+import time
+import threading
+import http_session
+import provider_health
+import telemetry
+from config import (
+    BATCH_OUTPUT_TOKENS_PER_CLAUSE,
+    BATCH_MAX_OUTPUT_TOKENS,
+    LLM_MAX_WORKERS,
+    RESPONSE_PARSE_RETRIES
+)
+from response_parser import (
+    ParseError,
+    Risk,
+    parse_text_analysis,
+    parse_json_analysis,
+    analysis_from_json,
+    load_json_object,
+    require,
+    build_repair_prompt
+)
+from clause_batcher import estimate_tokens
+from rate_limiter import run_rate_limited
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
+_usage_lock = threading.Lock()
+_usage = {}
+
+def record_usage(model_id, prompt_tokens, completion_tokens):
+    with _usage_lock:
+        stats = _usage.setdefault(model_id, {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0})
+        stats["requests"] += 1
+        stats["prompt_tokens"] += prompt_tokens or 0
+        stats["completion_tokens"] += completion_tokens or 0
+    telemetry.count("llm_requests_total", model=model_id)
+    telemetry.count("llm_tokens_total", prompt_tokens or 0, model=model_id, kind="prompt")
+    telemetry.count("llm_tokens_total", completion_tokens or 0, model=model_id, kind="completion")
+
+def get_usage_stats():
+    """Requests and token counts per model_id since the process started (or the last reset)."""
+    with _usage_lock:
+        return {model_id: dict(stats) for model_id, stats in _usage.items()}
+
+def reset_usage_stats():
+    with _usage_lock:
+        _usage.clear()
+
+def _probe_model(model_name, config):
+    if config["provider"] == "groq":
+        api_key = os.getenv("GROQ_API_KEY")
+        if not api_key:
+            raise RuntimeError("GROQ_API_KEY not found")
+        config["client"].models.list()
+    elif config["provider"] == "github":
+        if not os.getenv("GITHUB_PAT"):
+            raise RuntimeError("GITHUB_PAT not found")
+
 def get_preferred_model_and_config():
-    for model_name in MODEL_PREFERENCE_ORDER:
-        config = MODEL_CONFIG.get(model_name)
-        if config:
+    """
+    Returns the first model in MODEL_PREFERENCE_ORDER whose circuit isn't open
+    and whose connectivity probe passes. Probe results are cached for
+    PROBE_CACHE_SECONDS so repeated calls don't hit models.list() every time.
+    """
+    for model_name, config in provider_health.iter_model_configs():
+        probe = provider_health.get_cached_probe(model_name)
+        if probe is None:
             try:
-                if config["provider"] == "groq":
-                    api_key = os.getenv("GROQ_API_KEY")
-                    if not api_key:
-                        print(f"❌ GROQ_API_KEY not found. Skipping {model_name}.")
-                        continue
-                    test_client = Groq(api_key=api_key)
-                    test_client.models.list()
-                    config["client"] = test_client
-                elif config["provider"] == "github":
-                    pat = os.getenv("GITHUB_PAT")
-                    if not pat:
-                        print(f"❌ GITHUB_PAT not found. Skipping {model_name}.")
-                        continue
-                print(f"✅ Using model: {config['model_id']} from {config['provider']}")
-                return config
+                _probe_model(model_name, config)
+                provider_health.cache_probe(model_name, True)
+                probe = (True, None)
             except Exception as e:
-                print(f"❌ Model {config['model_id']} from {config['provider']} failed. Trying next model... Error: {e}")
-                continue
+                provider_health.cache_probe(model_name, False, e)
+                provider_health.record_failure(model_name, e)
+                probe = (False, str(e))
+        ok, error = probe
+        if ok:
+            print(f"✅ Using model: {config['model_id']} from {config['provider']}")
+            return config
+        print(f"❌ Model {config['model_id']} from {config['provider']} failed. Trying next model... Error: {error}")
     raise Exception("All configured models failed to connect.")
 
-def _call_github_models_api(config, prompt, max_tokens):
+def _github_request(config, prompt, max_tokens, response_format=None):
+    """(headers, JSON body) for a GitHub Models chat completion."""
     pat = os.getenv("GITHUB_PAT")
     headers = {
         "Authorization": f"Bearer {pat}",
@@ -44,81 +97,365 @@ def _call_github_models_api(config, prompt, max_tokens):
         "messages": [{"role": "user", "content": prompt}],
         "max_tokens": max_tokens
     }
-    response = requests.post(config["api_url"], headers=headers, json=data)
+    if response_format:
+        data["response_format"] = response_format
+    return headers, data
+
+def _call_github_models_api(config, prompt, max_tokens, response_format=None):
+    """Returns (text, response headers, total tokens used)."""
+    headers, data = _github_request(config, prompt, max_tokens, response_format)
+    response = http_session.post(config["provider"], config["api_url"], headers=headers, json=data)
     response.raise_for_status()
     result = response.json()
-    return result["choices"][0]["message"]["content"].strip()
+    usage = result.get("usage") or {}
+    record_usage(config["model_id"], usage.get("prompt_tokens"), usage.get("completion_tokens"))
+    return result["choices"][0]["message"]["content"].strip(), response.headers, usage.get("total_tokens")
 
-def analyze_clause(config, clause):
-    # This prompt is updated with the stricter rule for AI modification.
-    prompt = (
-        f"Analyze this contract clause for compliance risk. Return the result in this format ONLY:\n"
-        f"Regulation: <GDPR/HIPAA/Other/None>\n"
-        f"Summary: <your 1-2 sentence summary under 100 words>\n"
-        f"Risk: <High/Medium/Low>\n"
-        f"Risk Percentage: <A percentage value from 0-100>\n"
-        f"AI-Modified Clause: <Rewrite any High or Medium risk clause to reduce its risk. If the original risk is Low, return the original clause.>\n"
-        f"AI-Modified Risk Level: <Reassess the rewritten clause's risk. Must be Low.>\n\n"
-        f"Clause: {clause}"
+def _call_groq_api(config, prompt, max_tokens, response_format=None):
+    """Returns (text, response headers, total tokens used)."""
+    kwargs = {"response_format": response_format} if response_format else {}
+    start = time.perf_counter()
+    try:
+        raw = config["client"].chat.completions.with_raw_response.create(
+            model=config["model_id"],
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=max_tokens,
+            **kwargs
+        )
+    finally:
+        http_session.record_latency("groq", time.perf_counter() - start)
+    chat = raw.parse()
+    usage = chat.usage
+    record_usage(
+        config["model_id"],
+        usage.prompt_tokens if usage else None,
+        usage.completion_tokens if usage else None
     )
+    return chat.choices[0].message.content.strip(), raw.headers, usage.total_tokens if usage else None
 
-    if config["provider"] == "groq":
-        chat: ChatCompletion = config["client"].chat.completions.create(
+def _stream_github_models_api(config, prompt, max_tokens, response_format=None, on_token=None):
+    """Streaming (SSE) version of _call_github_models_api; on_token gets each text delta."""
+    headers, data = _github_request(config, prompt, max_tokens, response_format)
+    data["stream"] = True
+    data["stream_options"] = {"include_usage": True}
+    pieces = []
+    usage = {}
+    with http_session.post_stream(config["provider"], config["api_url"], headers=headers, json=data) as (response_headers, lines):
+        for line in lines:
+            if not line or not line.startswith("data:"):
+                continue
+            payload = line[len("data:"):].strip()
+            if payload == "[DONE]":
+                break
+            chunk = json.loads(payload)
+            usage = chunk.get("usage") or usage
+            for choice in chunk.get("choices") or []:
+                piece = (choice.get("delta") or {}).get("content")
+                if piece:
+                    pieces.append(piece)
+                    on_token(piece)
+    record_usage(config["model_id"], usage.get("prompt_tokens"), usage.get("completion_tokens"))
+    return "".join(pieces).strip(), response_headers, usage.get("total_tokens")
+
+def _stream_groq_api(config, prompt, max_tokens, response_format=None, on_token=None):
+    """Streaming version of _call_groq_api; on_token gets each text delta."""
+    kwargs = {"response_format": response_format} if response_format else {}
+    pieces = []
+    usage = None
+    start = time.perf_counter()
+    try:
+        raw = config["client"].chat.completions.with_raw_response.create(
             model=config["model_id"],
             messages=[{"role": "user", "content": prompt}],
-            max_tokens=400,
+            max_tokens=max_tokens,
+            stream=True,
+            **kwargs
         )
-        result = chat.choices[0].message.content.strip()
-    elif config["provider"] == "github":
-        result = _call_github_models_api(config, prompt, max_tokens=400)
+        for chunk in raw.parse():
+            # Groq reports usage on the final chunk, under x_groq.
+            usage = chunk.usage or (chunk.x_groq.usage if chunk.x_groq else None) or usage
+            piece = chunk.choices[0].delta.content if chunk.choices else None
+            if piece:
+                pieces.append(piece)
+                on_token(piece)
+    finally:
+        http_session.record_latency("groq", time.perf_counter() - start)
+    record_usage(
+        config["model_id"],
+        usage.prompt_tokens if usage else None,
+        usage.completion_tokens if usage else None
+    )
+    return "".join(pieces).strip(), raw.headers, usage.total_tokens if usage else None
+
+def _complete(config, prompt, max_tokens, response_format=None, on_token=None):
+    """
+    Sends a single-message chat completion to the configured provider and
+    returns the text. Calls go through the provider's rate limiter, which
+    retries 429s on the same model before the error reaches the fallback loop.
+    With on_token the completion is streamed and on_token gets each text delta.
+    """
+    if config["provider"] == "groq":
+        send = _stream_groq_api if on_token else _call_groq_api
+    elif config["provider"] in ("github", "mock"):
+        # The mock provider (mock_llm_server.py) speaks the same OpenAI-style protocol as GitHub Models.
+        send = _stream_github_models_api if on_token else _call_github_models_api
     else:
         raise ValueError(f"Unknown provider: {config['provider']}")
+    stream_kwargs = {"on_token": on_token} if on_token else {}
+    estimated_tokens = estimate_tokens(prompt) + max_tokens
+    with telemetry.span("llm_request", model=config["model_id"]):
+        return run_rate_limited(
+            config["provider"],
+            estimated_tokens,
+            lambda: send(config, prompt, max_tokens, response_format=response_format, **stream_kwargs)
+        )
 
-    regulation = "N/A"
-    summary = "N/A"
-    risk_level = "Unknown"
-    risk_percent = "N/A"
-    ai_modified_clause = "No modification available."
-    ai_modified_risk_level = "Unknown"
-
-    for line in result.splitlines():
-        if line.startswith("Regulation:"):
-            regulation = line.replace("Regulation:", "").strip()
-        elif line.startswith("Summary:"):
-            summary = line.replace("Summary:", "").strip()
-        elif line.startswith("Risk:"):
-            risk_level = line.replace("Risk:", "").strip()
-        elif line.startswith("Risk Percentage:"):
-            risk_percent = line.replace("Risk Percentage:", "").strip()
-        elif line.startswith("AI-Modified Clause:"):
-            ai_modified_clause = line.replace("AI-Modified Clause:", "").strip()
-        elif line.startswith("AI-Modified Risk Level:"):
-            ai_modified_risk_level = line.replace("AI-Modified Risk Level:", "").strip()
-
-    return regulation, summary, risk_level, risk_percent, ai_modified_clause, ai_modified_risk_level
+def build_analysis_prompt(clause):
+    # Rewrites are a separate, on-demand step (see modify_clause), so analysis
+    # only pays for the risk assessment.
+    return (
+        f"Analyze this contract clause for compliance risk. Return the result in this format ONLY:\n"
+        f"Regulation: <GDPR/HIPAA/Other/None>\n"
+        f"Summary: <your 1-2 sentence summary under 100 words>\n"
+        f"Risk: <High/Medium/Low>\n"
+        f"Risk Percentage: <A percentage value from 0-100>\n\n"
+        f"Clause: {clause}"
+    )
 
-def extract_key_clauses(config, clause):
-    prompt = (
+def parse_analysis_response(result):
+    """ClauseAnalysis for a build_analysis_prompt response; raises ParseError if a field is missing or invalid."""
+    return parse_text_analysis(result)
+
+def _complete_parsed(config, prompt, max_tokens, parse, response_format=None):
+    """
+    _complete followed by parse(). A response that fails to parse is sent back
+    to the same model with the error (up to RESPONSE_PARSE_RETRIES times)
+    before the ParseError reaches the caller's model fallback.
+    """
+    result = _complete(config, prompt, max_tokens, response_format=response_format)
+    for attempt in range(RESPONSE_PARSE_RETRIES + 1):
+        try:
+            return parse(result)
+        except ParseError as e:
+            if attempt == RESPONSE_PARSE_RETRIES:
+                raise
+            print(f"⚠️ Unparseable response from {config['model_id']} ({e}); asking for a corrected answer.")
+            telemetry.count("parse_retries_total", model=config["model_id"])
+            result = _complete(config, build_repair_prompt(prompt, result, e), max_tokens, response_format=response_format)
+
+def analyze_clause(config, clause):
+    return _complete_parsed(config, build_analysis_prompt(clause), 200, parse_analysis_response)
+
+def build_key_clauses_prompt(clause):
+    return (
         f"Read the following contract clause. "
         f"Extract the most important phrases that summarize its core obligation or purpose. "
         f"Return only the phrases as a comma-separated list. "
         f"Clause: {clause}"
     )
 
-    if config["provider"] == "groq":
-        chat: ChatCompletion = config["client"].chat.completions.create(
-            model=config["model_id"],
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=100,
-        )
-        result = chat.choices[0].message.content.strip()
-    elif config["provider"] == "github":
-        result = _call_github_models_api(config, prompt, max_tokens=100)
-    else:
-        raise ValueError(f"Unknown provider: {config['provider']}")
-    return result
+def extract_key_clauses(config, clause):
+    return _complete(config, build_key_clauses_prompt(clause), max_tokens=100)
+
+COMBINED_RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "regulation": {"type": "string", "enum": ["GDPR", "HIPAA", "Other", "None"]},
+        "summary": {"type": "string"},
+        "risk": {"type": "string", "enum": ["High", "Medium", "Low"]},
+        "risk_percentage": {"type": "integer", "minimum": 0, "maximum": 100},
+        "key_phrases": {"type": "array", "items": {"type": "string"}}
+    },
+    "required": ["regulation", "summary", "risk", "risk_percentage", "key_phrases"],
+    "additionalProperties": False
+}
+
+MODIFY_RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "modified_clause": {"type": "string"},
+        "modified_risk": {"type": "string", "enum": ["High", "Medium", "Low"]}
+    },
+    "required": ["modified_clause", "modified_risk"],
+    "additionalProperties": False
+}
+
+_COMBINED_FIELD_RULES = (
+    "Field rules:\n"
+    "- summary: 1-2 sentences, under 100 words.\n"
+    "- risk_percentage: an integer from 0-100.\n"
+    "- key_phrases: the most important phrases that summarize the clause's core obligation or purpose.\n"
+)
+
+def build_combined_prompt(clause):
+    return (
+        f"Analyze this contract clause for compliance risk and extract its key phrases. "
+        f"Respond with a single JSON object ONLY, matching this JSON schema:\n"
+        f"{json.dumps(COMBINED_RESPONSE_SCHEMA)}\n"
+        f"{_COMBINED_FIELD_RULES}\n"
+        f"Clause: {clause}"
+    )
+
+def parse_combined_response(text):
+    """
+    Strictly parses the JSON returned for build_combined_prompt into a
+    ClauseAnalysis. Raises ParseError (a ValueError) on anything that doesn't
+    match COMBINED_RESPONSE_SCHEMA.
+    """
+    return parse_json_analysis(text)
+
+def analyze_clause_combined(config, clause):
+    """
+    One completion per clause covering everything analyze_clause and
+    extract_key_clauses return, as a ClauseAnalysis with key_phrases filled in.
+    """
+    return _complete_parsed(
+        config,
+        build_combined_prompt(clause),
+        250,
+        parse_combined_response,
+        response_format={"type": "json_object"}
+    )
+
+def build_batch_prompt(clauses):
+    numbered = "\n".join(f"[{i}] {clause}" for i, clause in enumerate(clauses))
+    return (
+        f"Analyze each of the following {len(clauses)} contract clauses for compliance risk and extract its key phrases. "
+        f"Respond with a single JSON object ONLY of the form {{\"results\": [...]}}, with exactly one entry per clause. "
+        f"Each entry must have an integer \"index\" equal to the clause number in brackets, and otherwise match this JSON schema:\n"
+        f"{json.dumps(COMBINED_RESPONSE_SCHEMA)}\n"
+        f"{_COMBINED_FIELD_RULES}\n"
+        f"Clauses:\n{numbered}"
+    )
+
+def parse_batch_response(text, count):
+    """
+    Parses a build_batch_prompt response into {index: ClauseAnalysis}. Entries
+    that are missing, duplicated or fail validation are left out so the caller
+    can re-run just those clauses; ValueError is raised if nothing usable came back.
+    """
+    results = load_json_object(text).get("results")
+    if not isinstance(results, list):
+        raise ParseError("results", "Batch response has no 'results' list")
+
+    parsed = {}
+    for item in results:
+        entry = _batch_entry(item, count, parsed)
+        if entry:
+            parsed[entry[0]] = entry[1]
+    if not parsed:
+        raise ParseError("results", "Batch response contained no valid entries")
+    return parsed
+
+def _batch_entry(item, count, parsed):
+    """(index, ClauseAnalysis) for one batch results item, or None if it can't be used."""
+    if not isinstance(item, dict):
+        return None
+    index = item.get("index")
+    if not isinstance(index, int) or isinstance(index, bool) or not 0 <= index < count or index in parsed:
+        return None
+    try:
+        return index, analysis_from_json(item)
+    except ParseError as e:
+        print(f"⚠️ Dropping malformed batch entry {index}: {e}")
+        return None
+
+_RESULTS_LIST = re.compile(r'"results"\s*:\s*\[')
+
+class BatchStreamParser:
+    """
+    Pulls complete entries out of a streamed build_batch_prompt response as
+    they arrive, so each clause can be reported before the batch finishes.
+    feed() returns the (index, ClauseAnalysis) entries completed by a delta.
+    """
+
+    def __init__(self, count):
+        self.count = count
+        self.entries = {}
+        self._text = ""
+        self._pos = None
+        self._start = None
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, piece):
+        self._text += piece
+        completed = []
+        if self._pos is None:
+            match = _RESULTS_LIST.search(self._text)
+            if not match:
+                return completed
+            self._pos = match.end()
 
-def analyze_clauses_parallel(config, clauses, max_workers=5):
+        text = self._text
+        for i in range(self._pos, len(text)):
+            char = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "{":
+                if self._depth == 0:
+                    self._start = i
+                self._depth += 1
+            elif char == "}" and self._depth:
+                self._depth -= 1
+                if self._depth == 0:
+                    entry = self._accept(text[self._start:i + 1])
+                    if entry:
+                        completed.append(entry)
+        self._pos = len(text)
+        return completed
+
+    def _accept(self, span):
+        try:
+            item = json.loads(span)
+        except json.JSONDecodeError:
+            return None
+        entry = _batch_entry(item, self.count, self.entries)
+        if entry:
+            self.entries[entry[0]] = entry[1]
+        return entry
+
+def batch_max_tokens(count):
+    return min(BATCH_MAX_OUTPUT_TOKENS, 100 + BATCH_OUTPUT_TOKENS_PER_CLAUSE * count)
+
+def analyze_clauses_batch(config, clauses, on_entry=None):
+    """
+    One completion for several clauses; see parse_batch_response for the return
+    value. With on_entry the completion is streamed and on_entry(index, entry)
+    is called for each clause as soon as its entry is complete.
+    """
+    on_token = None
+    if on_entry:
+        parser = BatchStreamParser(len(clauses))
+
+        def on_token(piece):
+            for index, entry in parser.feed(piece):
+                on_entry(index, entry)
+
+    result = _complete(
+        config,
+        build_batch_prompt(clauses),
+        max_tokens=batch_max_tokens(len(clauses)),
+        response_format={"type": "json_object"},
+        on_token=on_token
+    )
+    try:
+        return parse_batch_response(result, len(clauses))
+    except ValueError:
+        # Entries already reported stay valid even if the full response doesn't parse (e.g. truncated).
+        if on_entry and parser.entries:
+            return dict(parser.entries)
+        raise
+
+def analyze_clauses_parallel(config, clauses, max_workers=LLM_MAX_WORKERS):
     results = []
     with ThreadPoolExecutor(max_workers=max_workers) as executor:
         futures = {executor.submit(analyze_clause, config, c): c for c in clauses}
@@ -129,7 +466,7 @@ def analyze_clauses_parallel(config, clauses, max_workers=5):
                 print(f"Error analyzing clause: {e}")
     return results
 
-def extract_clauses_parallel(config, clauses, max_workers=5):
+def extract_clauses_parallel(config, clauses, max_workers=LLM_MAX_WORKERS):
     results = []
     with ThreadPoolExecutor(max_workers=max_workers) as executor:
         futures = {executor.submit(extract_key_clauses, config, c): c for c in clauses}
@@ -140,25 +477,33 @@ def extract_clauses_parallel(config, clauses, max_workers=5):
                 print(f"Error extracting key clause: {e}")
     return results
 
-def modify_clause(config, clause, risk_level):
-    if risk_level.lower() == "low":
-        return clause
-
-    prompt = (
+def build_modify_prompt(clause, risk_level):
+    return (
         f"The following contract clause has been assessed as {risk_level} risk. "
         f"Rewrite this clause to make it compliant with relevant regulations (e.g., GDPR, HIPAA), "
-        f"while keeping the legal meaning intact. Return only the rewritten clause text.\n\n"
+        f"while keeping the legal meaning intact, then reassess the rewritten clause's risk. "
+        f"Respond with a single JSON object ONLY, matching this JSON schema:\n"
+        f"{json.dumps(MODIFY_RESPONSE_SCHEMA)}\n\n"
         f"Original Clause:\n{clause}"
     )
 
-    if config["provider"] == "groq":
-        chat = config["client"].chat.completions.create(
-            model=config["model_id"],
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=300,
-        )
-        return chat.choices[0].message.content.strip()
-    elif config["provider"] == "github":
-        return _call_github_models_api(config, prompt, max_tokens=300)
-    else:
-        raise ValueError(f"Unknown provider: {config['provider']}")
\ No newline at end of file
+def parse_modify_response(text):
+    """Returns (modified clause, modified risk level); raises ValueError on a malformed response."""
+    data = load_json_object(text)
+    modified_clause = require(data, "modified_clause", str).strip()
+    if not modified_clause:
+        raise ParseError("modified_clause", "Rewrite response has an empty clause")
+    return modified_clause, Risk.parse(require(data, "modified_risk", str)).value
+
+def modify_clause(config, clause, risk_level):
+    """Rewrites a High/Medium risk clause. Returns (modified clause, reassessed risk level)."""
+    if risk_level.lower() == "low":
+        return clause, "Low"
+
+    return _complete_parsed(
+        config,
+        build_modify_prompt(clause, risk_level),
+        400,
+        parse_modify_response,
+        response_format={"type": "json_object"}
+    )
\ No newline at end of file
@@ -0,0 +1,269 @@
+# mock_llm_server.py
+#
+# Local stand-in for an OpenAI-compatible chat completions endpoint, used by
+# the "mock" entry in MODEL_CONFIG so the pipeline can be benchmarked without
+# Groq/GitHub credentials. Answers are deterministic per clause and follow
+# whichever prompt they're given (analysis, combined JSON, batch, key phrases,
+# rewrite). Latency is log-normal plus a per-output-token cost; a configurable
+# share of requests fail with 500s or 429s (with Retry-After).
+#
+#   python mock_llm_server.py --port 8765 --latency-ms 300 --error-rate 0.01 --rate-limit-rate 0.02
+
+import re
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from config import (
+    MOCK_LLM_HOST,
+    MOCK_LLM_PORT,
+    MOCK_LLM_LATENCY_MS,
+    MOCK_LLM_LATENCY_SIGMA,
+    MOCK_LLM_MS_PER_TOKEN,
+    MOCK_LLM_ERROR_RATE,
+    MOCK_LLM_RATE_LIMIT_RATE,
+    MOCK_LLM_RETRY_AFTER_SECONDS
+)
+
+_BATCH_CLAUSE = re.compile(r"^\[(\d+)\] ", re.M)
+_SINGLE_CLAUSE = re.compile(r"(?:Original Clause:\n|Clause: )(.*)", re.S)
+_RISK_LEVELS = ("High", "Medium", "Low")
+_KEYWORDS = {
+    "GDPR": ("personal data", "data subject", "gdpr", "processor", "controller", "consent"),
+    "HIPAA": ("health", "hipaa", "phi", "medical", "patient"),
+    "Other": ("liability", "indemn", "confidential", "terminate", "warrant"),
+}
+
+
+def _estimate_tokens(text):
+    return max(1, len(text) // 4)
+
+
+def mock_analysis(clause):
+    """Deterministic analysis dict for one clause (COMBINED_RESPONSE_SCHEMA shape)."""
+    digest = hashlib.sha256(clause.encode("utf-8")).digest()
+    lowered = clause.lower()
+    regulation = next((name for name, words in _KEYWORDS.items() if any(w in lowered for w in words)), "None")
+    risk = "Low" if regulation == "None" else _RISK_LEVELS[digest[0] % 3]
+    base = {"High": 70, "Medium": 40, "Low": 5}[risk]
+    words = clause.split()
+    return {
+        "regulation": regulation,
+        "summary": f"{regulation} {risk.lower()}-risk clause: {' '.join(words[:12])}.",
+        "risk": risk,
+        "risk_percentage": base + digest[1] % 25,
+        "key_phrases": [" ".join(words[i:i + 3]) for i in range(0, min(len(words), 9), 3)],
+    }
+
+
+def mock_completion(prompt):
+    """The text a well-behaved model would return for one of llm_analyzer's prompts."""
+    if "{\"results\": [...]}" in prompt:
+        parts = _BATCH_CLAUSE.split(prompt.split("Clauses:\n", 1)[-1])
+        clauses = zip(parts[1::2], parts[2::2])
+        return json.dumps({"results": [dict(mock_analysis(clause.strip()), index=int(i)) for i, clause in clauses]})
+
+    match = _SINGLE_CLAUSE.search(prompt)
+    clause = match.group(1).split("\n\nYour previous response", 1)[0].strip() if match else prompt
+    if "Original Clause:" in prompt:
+        return json.dumps({"modified_clause": f"{clause} Such processing shall comply with applicable law.", "modified_risk": "Low"})
+    if "comma-separated list" in prompt:
+        return ", ".join(mock_analysis(clause)["key_phrases"])
+    analysis = mock_analysis(clause)
+    if "Risk Percentage:" in prompt:
+        return (
+            f"Regulation: {analysis['regulation']}\n"
+            f"Summary: {analysis['summary']}\n"
+            f"Risk: {analysis['risk']}\n"
+            f"Risk Percentage: {analysis['risk_percentage']}%"
+        )
+    return json.dumps(analysis)
+
+
+class MockLLMServer:
+    """
+    Threaded HTTP server answering POST /chat/completions (streaming or not)
+    and GET /stats (request counts and served latencies). Use start()/stop()
+    or a with block; `url` is the completions endpoint.
+    """
+
+    def __init__(self, host=MOCK_LLM_HOST, port=MOCK_LLM_PORT, latency_ms=MOCK_LLM_LATENCY_MS,
+                 latency_sigma=MOCK_LLM_LATENCY_SIGMA, ms_per_token=MOCK_LLM_MS_PER_TOKEN,
+                 error_rate=MOCK_LLM_ERROR_RATE, rate_limit_rate=MOCK_LLM_RATE_LIMIT_RATE,
+                 retry_after=MOCK_LLM_RETRY_AFTER_SECONDS, seed=None):
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.ms_per_token = ms_per_token
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "errors": 0, "throttled": 0, "latencies": []}
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/chat/completions"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        print(f"🧪 Mock LLM server listening on {self.url}")
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats = {"requests": 0, "errors": 0, "throttled": 0, "latencies": []}
+
+    def get_stats(self):
+        with self._lock:
+            latencies = sorted(self._stats["latencies"])
+            stats = {key: value for key, value in self._stats.items() if key != "latencies"}
+
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))] if latencies else 0.0
+
+        stats.update(p50_seconds=percentile(0.50), p95_seconds=percentile(0.95))
+        return stats
+
+    def _draw(self, completion_tokens):
+        """(outcome, seconds): outcome is "ok", "error" or "throttled"."""
+        with self._lock:
+            roll = self._random.random()
+            latency = self._random.lognormvariate(0, self.latency_sigma) * self.latency_ms / 1000
+        if roll < self.rate_limit_rate:
+            return "throttled", 0.0
+        if roll < self.rate_limit_rate + self.error_rate:
+            return "error", latency
+        return "ok", latency + completion_tokens * self.ms_per_token / 1000
+
+    def _record(self, outcome, seconds):
+        with self._lock:
+            self._stats["requests"] += 1
+            if outcome == "error":
+                self._stats["errors"] += 1
+            elif outcome == "throttled":
+                self._stats["throttled"] += 1
+            else:
+                self._stats["latencies"].append(seconds)
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, status, body, headers=None):
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                if self.path.rstrip("/") == "/stats":
+                    self._send_json(200, server.get_stats())
+                else:
+                    self._send_json(404, {"error": "not found"})
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                prompt = "".join(m.get("content", "") for m in request.get("messages", []))
+                text = mock_completion(prompt)
+                usage = {"prompt_tokens": _estimate_tokens(prompt), "completion_tokens": _estimate_tokens(text)}
+                usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+
+                outcome, seconds = server._draw(usage["completion_tokens"])
+                start = time.perf_counter()
+                if outcome == "throttled":
+                    server._record(outcome, 0.0)
+                    self._send_json(429, {"error": {"message": "Rate limit reached"}}, {"retry-after": str(server.retry_after)})
+                    return
+                if outcome == "error":
+                    time.sleep(seconds)
+                    server._record(outcome, seconds)
+                    self._send_json(500, {"error": {"message": "Mock upstream error"}})
+                    return
+
+                if request.get("stream"):
+                    self._stream(request, text, usage, seconds)
+                else:
+                    time.sleep(seconds)
+                    self._send_json(200, {
+                        "model": request.get("model"),
+                        "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                        "usage": usage
+                    })
+                server._record(outcome, time.perf_counter() - start)
+
+            def _stream(self, request, text, usage, seconds):
+                pieces = [text[i:i + 16] for i in range(0, len(text), 16)] or [""]
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+                def send_event(body):
+                    data = f"data: {body}\n\n".encode("utf-8")
+                    self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                    self.wfile.flush()
+
+                for piece in pieces:
+                    time.sleep(seconds / len(pieces))
+                    send_event(json.dumps({"model": request.get("model"), "choices": [{"index": 0, "delta": {"content": piece}}]}))
+                send_event(json.dumps({"choices": [], "usage": usage}))
+                send_event("[DONE]")
+                self.wfile.write(b"0\r\n\r\n")
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the mock OpenAI-compatible LLM server.")
+    parser.add_argument("--host", default=MOCK_LLM_HOST)
+    parser.add_argument("--port", type=int, default=MOCK_LLM_PORT)
+    parser.add_argument("--latency-ms", type=float, default=MOCK_LLM_LATENCY_MS)
+    parser.add_argument("--latency-sigma", type=float, default=MOCK_LLM_LATENCY_SIGMA)
+    parser.add_argument("--ms-per-token", type=float, default=MOCK_LLM_MS_PER_TOKEN)
+    parser.add_argument("--error-rate", type=float, default=MOCK_LLM_ERROR_RATE)
+    parser.add_argument("--rate-limit-rate", type=float, default=MOCK_LLM_RATE_LIMIT_RATE)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    server = MockLLMServer(
+        args.host, args.port, args.latency_ms, args.latency_sigma, args.ms_per_token,
+        args.error_rate, args.rate_limit_rate, seed=args.seed
+    )
+    server.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+# provider_health.py
+
+import time
+import threading
+from collections import deque
+from config import (
+    MODEL_CONFIG,
+    MODEL_PREFERENCE_ORDER,
+    CIRCUIT_BREAKER_SETTINGS,
+    PROBE_CACHE_SECONDS
+)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Per-model breaker over a sliding window of outcomes. It opens when the
+    window's error rate (or a run of consecutive failures) crosses the
+    threshold, rejects calls for cooldown_seconds, then lets a single trial
+    request through (half-open) to decide whether to close again.
+    """
+
+    def __init__(self, window_seconds=60, min_requests=5, error_rate_threshold=0.5,
+                 consecutive_failures=3, cooldown_seconds=30):
+        self.window_seconds = window_seconds
+        self.min_requests = min_requests
+        self.error_rate_threshold = error_rate_threshold
+        self.consecutive_failures = consecutive_failures
+        self.cooldown_seconds = cooldown_seconds
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self.trial_started = 0.0
+        self.failure_streak = 0
+        self.last_error = None
+        self._events = deque()
+        self._lock = threading.Lock()
+
+    def _trim(self, now):
+        while self._events and now - self._events[0][0] > self.window_seconds:
+            self._events.popleft()
+
+    def allow(self):
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            now = time.monotonic()
+            if self.state == OPEN and now - self.opened_at >= self.cooldown_seconds:
+                self.state = HALF_OPEN
+                self.trial_in_flight = False
+            # A trial that never reported back (e.g. answered from cache) is retried after a cooldown.
+            if self.state == HALF_OPEN and (not self.trial_in_flight or now - self.trial_started >= self.cooldown_seconds):
+                self.trial_in_flight = True
+                self.trial_started = now
+                return True
+            return False
+
+    def record(self, ok, latency=None, error=None):
+        with self._lock:
+            now = time.monotonic()
+            self._events.append((now, ok, latency))
+            self._trim(now)
+            if ok:
+                self.failure_streak = 0
+                if self.state != CLOSED:
+                    print("✅ Circuit closed again after a successful trial request.")
+                self.state = CLOSED
+                self.trial_in_flight = False
+                return
+
+            self.failure_streak += 1
+            self.last_error = str(error) if error else None
+            failures = sum(1 for _, event_ok, _ in self._events if not event_ok)
+            error_rate = failures / len(self._events)
+            should_open = (
+                self.state == HALF_OPEN
+                or self.failure_streak >= self.consecutive_failures
+                or (len(self._events) >= self.min_requests and error_rate >= self.error_rate_threshold)
+            )
+            if should_open and self.state != OPEN:
+                self.state = OPEN
+                self.opened_at = now
+                self.trial_in_flight = False
+
+    def snapshot(self):
+        with self._lock:
+            self._trim(time.monotonic())
+            latencies = sorted(latency for _, ok, latency in self._events if ok and latency is not None)
+            failures = sum(1 for _, ok, _ in self._events if not ok)
+            return {
+                "state": self.state,
+                "requests": len(self._events),
+                "error_rate": failures / len(self._events) if self._events else 0.0,
+                "p50_latency": latencies[len(latencies) // 2] if latencies else None,
+                "p95_latency": latencies[int(len(latencies) * 0.95)] if latencies else None,
+                "last_error": self.last_error
+            }
+
+
+_lock = threading.Lock()
+_breakers = {}
+_probes = {}
+
+
+def get_breaker(model_name):
+    breaker = _breakers.get(model_name)
+    if breaker is None:
+        with _lock:
+            breaker = _breakers.setdefault(model_name, CircuitBreaker(**CIRCUIT_BREAKER_SETTINGS))
+    return breaker
+
+
+def record_success(model_name, latency):
+    get_breaker(model_name).record(True, latency=latency)
+
+
+def record_failure(model_name, error=None):
+    breaker = get_breaker(model_name)
+    was_open = breaker.state == OPEN
+    breaker.record(False, error=error)
+    if breaker.state == OPEN and not was_open:
+        print(f"🔌 Circuit opened for model: {model_name}. Routing to the next healthy model for {breaker.cooldown_seconds}s.")
+
+
+def iter_model_configs():
+    """
+    Yields (model_name, config) in MODEL_PREFERENCE_ORDER, skipping models
+    whose circuit is open. If every circuit is open, all models are yielded
+    anyway so the clause still gets a chance instead of failing outright.
+    """
+    available = []
+    for model_name in MODEL_PREFERENCE_ORDER:
+        config = MODEL_CONFIG.get(model_name)
+        if not config:
+            print(f"⚠️ Config for model '{model_name}' not found. Skipping.")
+            continue
+        available.append((model_name, config))
+
+    yielded = False
+    for model_name, config in available:
+        if get_breaker(model_name).allow():
+            yielded = True
+            yield model_name, config
+    if not yielded:
+        yield from available
+
+
+def get_cached_probe(model_name):
+    """Returns the cached (ok, error) probe result for a model, or None if it has expired."""
+    with _lock:
+        probe = _probes.get(model_name)
+    if probe and time.monotonic() - probe[0] < PROBE_CACHE_SECONDS:
+        return probe[1], probe[2]
+    return None
+
+
+def cache_probe(model_name, ok, error=None):
+    with _lock:
+        _probes[model_name] = (time.monotonic(), ok, str(error) if error else None)
+
+
+def get_health():
+    """Breaker state, error rate and latency percentiles per model."""
+    return {model_name: breaker.snapshot() for model_name, breaker in list(_breakers.items())}
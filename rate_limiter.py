@@ -0,0 +1,297 @@
+# rate_limiter.py
+
+import re
+import time
+import random
+import asyncio
+import threading
+import telemetry
+from collections import deque
+from config import RATE_LIMITS, RATE_LIMIT_MAX_RETRIES, RATE_LIMIT_BACKOFF_SECONDS
+
+_DURATION_PART = re.compile(r"([\d.]+)(ms|h|m|s)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def parse_reset_duration(value):
+    """Parses rate-limit reset values such as "7.66s", "2m59.56s", "120ms" or "30" into seconds."""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def _header_int(headers, name):
+    try:
+        return int(float(headers.get(name)))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at capacity per `period` seconds."""
+
+    def __init__(self, capacity, period=60.0):
+        self.capacity = float(capacity)
+        self.rate = self.capacity / period
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until `amount` can be taken (0 if available now). Caller holds the lock."""
+        self._refill(now)
+        if now < self.paused_until:
+            return self.paused_until - now
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount):
+        self.tokens -= min(amount, self.capacity)
+
+    def refund(self, amount):
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+    def clamp(self, remaining, reset_seconds, now):
+        """Trusts the provider's view of what's left in the current window."""
+        self._refill(now)
+        self.tokens = min(self.tokens, float(remaining))
+        if remaining <= 0 and reset_seconds:
+            self.paused_until = max(self.paused_until, now + reset_seconds)
+
+
+class ProviderLimiter:
+    """
+    Requests/min and tokens/min buckets for one provider plus an AIMD
+    concurrency window: every success grows the window by ~1 slot per window's
+    worth of requests, every 429 halves it.
+    """
+
+    def __init__(self, provider, requests_per_minute, tokens_per_minute,
+                 initial_concurrency=4, min_concurrency=1, max_concurrency=16):
+        self.provider = provider
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.concurrency = float(initial_concurrency)
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self.waiting = 0
+        self._cond = threading.Condition()
+        self._completions = deque()
+        self.metrics = {"requests": 0, "throttles": 0, "retries": 0, "tokens": 0, "wait_seconds": 0.0}
+
+    def acquire(self, estimated_tokens):
+        start = time.monotonic()
+        with self._cond:
+            self.waiting += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    if self.in_flight < int(self.concurrency):
+                        delay = max(self.requests.wait_time(1, now), self.tokens.wait_time(estimated_tokens, now))
+                        if delay <= 0:
+                            break
+                    else:
+                        delay = None
+                    self._cond.wait(timeout=delay)
+                self.requests.take(1)
+                self.tokens.take(estimated_tokens)
+                self.in_flight += 1
+            finally:
+                self.waiting -= 1
+            self.metrics["wait_seconds"] += time.monotonic() - start
+
+    def try_acquire(self, estimated_tokens):
+        """Non-blocking acquire. Returns 0 on success, otherwise seconds to wait (None = until a slot frees)."""
+        with self._cond:
+            now = time.monotonic()
+            if self.in_flight >= int(self.concurrency):
+                return None
+            delay = max(self.requests.wait_time(1, now), self.tokens.wait_time(estimated_tokens, now))
+            if delay > 0:
+                return delay
+            self.requests.take(1)
+            self.tokens.take(estimated_tokens)
+            self.in_flight += 1
+            return 0
+
+    async def acquire_async(self, estimated_tokens):
+        """asyncio counterpart of acquire(); sleeps on the event loop instead of blocking a thread."""
+        start = time.monotonic()
+        with self._cond:
+            self.waiting += 1
+        try:
+            while True:
+                delay = self.try_acquire(estimated_tokens)
+                if delay == 0:
+                    break
+                await asyncio.sleep(0.05 if delay is None else min(delay, 1.0))
+        finally:
+            with self._cond:
+                self.waiting -= 1
+                self.metrics["wait_seconds"] += time.monotonic() - start
+
+    def release(self, estimated_tokens, used_tokens=None, throttled=False, headers=None, retry_after=None):
+        with self._cond:
+            now = time.monotonic()
+            self.in_flight -= 1
+            if used_tokens is not None:
+                self.tokens.refund(max(0, estimated_tokens - used_tokens))
+                self.metrics["tokens"] += used_tokens
+            if headers:
+                self._apply_headers(headers, now)
+            if throttled:
+                self.metrics["throttles"] += 1
+                self.concurrency = max(self.min_concurrency, self.concurrency / 2)
+                if retry_after:
+                    self.requests.paused_until = max(self.requests.paused_until, now + retry_after)
+            else:
+                self.metrics["requests"] += 1
+                self._completions.append(now)
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1.0 / max(1.0, self.concurrency))
+            self._cond.notify_all()
+
+    def _apply_headers(self, headers, now):
+        remaining_requests = _header_int(headers, "x-ratelimit-remaining-requests")
+        if remaining_requests is not None:
+            self.requests.clamp(remaining_requests, parse_reset_duration(headers.get("x-ratelimit-reset-requests")), now)
+        remaining_tokens = _header_int(headers, "x-ratelimit-remaining-tokens")
+        if remaining_tokens is not None:
+            self.tokens.clamp(remaining_tokens, parse_reset_duration(headers.get("x-ratelimit-reset-tokens")), now)
+
+    def record_retry(self):
+        with self._cond:
+            self.metrics["retries"] += 1
+        telemetry.count("rate_limit_retries_total", provider=self.provider)
+
+    def get_metrics(self):
+        with self._cond:
+            now = time.monotonic()
+            while self._completions and now - self._completions[0] > 60:
+                self._completions.popleft()
+            metrics = dict(self.metrics)
+            metrics.update({
+                "in_flight": self.in_flight,
+                "queue_depth": self.waiting,
+                "concurrency_limit": int(self.concurrency),
+                "requests_last_minute": len(self._completions),
+            })
+            return metrics
+
+
+def is_throttle_error(error):
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status == 429
+
+
+def _error_headers(error):
+    response = getattr(error, "response", None)
+    return getattr(response, "headers", None) or {}
+
+
+def _backoff_delay(attempt, retry_after, provider):
+    backoff = RATE_LIMIT_BACKOFF_SECONDS * (2 ** (attempt - 1))
+    delay = max(retry_after or 0, backoff) * random.uniform(1.0, 1.5)
+    print(f"⏳ {provider} throttled (429). Retrying in {delay:.1f}s (attempt {attempt}/{RATE_LIMIT_MAX_RETRIES}).")
+    return delay
+
+
+def run_rate_limited(provider, estimated_tokens, send):
+    """
+    Calls send() under the provider's limiter. send must return
+    (text, headers, used_tokens). 429s are retried on the same model with
+    jittered exponential backoff (honouring Retry-After) before the error is
+    re-raised for the caller's model fallback.
+    """
+    limiter = get_limiter(provider)
+    attempt = 0
+    while True:
+        with telemetry.span("rate_limit_wait", provider=provider):
+            limiter.acquire(estimated_tokens)
+        try:
+            text, headers, used_tokens = send()
+        except Exception as e:
+            if not is_throttle_error(e):
+                limiter.release(estimated_tokens)
+                raise
+            headers = _error_headers(e)
+            retry_after = parse_reset_duration(headers.get("retry-after"))
+            limiter.release(estimated_tokens, throttled=True, headers=headers, retry_after=retry_after)
+            if attempt >= RATE_LIMIT_MAX_RETRIES:
+                raise
+            attempt += 1
+            limiter.record_retry()
+            time.sleep(_backoff_delay(attempt, retry_after, provider))
+            continue
+        except BaseException:
+            # KeyboardInterrupt/SystemExit mid-request: give the slot back before unwinding.
+            limiter.release(estimated_tokens)
+            raise
+        limiter.release(estimated_tokens, used_tokens=used_tokens, headers=headers)
+        return text
+
+
+async def run_rate_limited_async(provider, estimated_tokens, send):
+    """asyncio version of run_rate_limited; send is a coroutine function with the same contract."""
+    limiter = get_limiter(provider)
+    attempt = 0
+    while True:
+        with telemetry.span("rate_limit_wait", provider=provider):
+            await limiter.acquire_async(estimated_tokens)
+        try:
+            text, headers, used_tokens = await send()
+        except Exception as e:
+            if not is_throttle_error(e):
+                limiter.release(estimated_tokens)
+                raise
+            headers = _error_headers(e)
+            retry_after = parse_reset_duration(headers.get("retry-after"))
+            limiter.release(estimated_tokens, throttled=True, headers=headers, retry_after=retry_after)
+            if attempt >= RATE_LIMIT_MAX_RETRIES:
+                raise
+            attempt += 1
+            limiter.record_retry()
+            await asyncio.sleep(_backoff_delay(attempt, retry_after, provider))
+            continue
+        except BaseException:
+            # Cancellation: give the slot back so other tasks aren't starved.
+            limiter.release(estimated_tokens)
+            raise
+        limiter.release(estimated_tokens, used_tokens=used_tokens, headers=headers)
+        return text
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(provider):
+    limiter = _limiters.get(provider)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.get(provider)
+            if limiter is None:
+                limiter = ProviderLimiter(provider, **RATE_LIMITS.get(provider, RATE_LIMITS["default"]))
+                _limiters[provider] = limiter
+    return limiter
+
+
+def get_rate_limit_metrics():
+    """Live throughput, queue depth and throttle counts per provider."""
+    return {provider: limiter.get_metrics() for provider, limiter in list(_limiters.items())}
@@ -0,0 +1,171 @@
+# response_parser.py
+#
+# Parsing and validation of model responses into ClauseAnalysis records.
+# Every parser makes a single pass over the response and raises ParseError
+# (a ValueError) naming what was wrong, so callers can ask the same model for
+# a corrected answer (see build_repair_prompt) before falling back to another.
+
+import re
+import json
+from enum import Enum
+
+REGULATIONS = ("GDPR", "HIPAA", "Other", "None")
+
+
+class Risk(Enum):
+    HIGH = "High"
+    MEDIUM = "Medium"
+    LOW = "Low"
+    UNKNOWN = "Unknown"
+
+    @classmethod
+    def parse(cls, value):
+        """Risk for a model-supplied level (case-insensitive); ParseError if it isn't one."""
+        risk = _RISK_BY_NAME.get(str(value).strip().lower())
+        if risk is None:
+            raise ParseError("risk", f"Unknown risk level: {value}")
+        return risk
+
+
+_RISK_BY_NAME = {risk.value.lower(): risk for risk in Risk if risk is not Risk.UNKNOWN}
+
+
+class ParseError(ValueError):
+    """A response that doesn't match the requested format; `field` is the first offending field."""
+
+    def __init__(self, field, message):
+        super().__init__(message)
+        self.field = field
+
+
+class ClauseAnalysis:
+    """One clause's analysis. risk is a Risk and risk_percent an int from 0-100."""
+
+    __slots__ = ("regulation", "summary", "risk", "risk_percent", "key_phrases")
+
+    def __init__(self, regulation, summary, risk, risk_percent, key_phrases=""):
+        self.regulation = regulation
+        self.summary = summary
+        self.risk = risk
+        self.risk_percent = risk_percent
+        self.key_phrases = key_phrases
+
+    def __eq__(self, other):
+        return isinstance(other, ClauseAnalysis) and self.as_tuple() == other.as_tuple()
+
+    def __repr__(self):
+        return f"ClauseAnalysis({self.regulation!r}, {self.risk.value!r}, {self.risk_percent!r})"
+
+    def as_tuple(self):
+        return (self.regulation, self.summary, self.risk.value, self.risk_percent, self.key_phrases)
+
+    def to_analysis(self):
+        """The result dict keys; risk_percent keeps its "N%" display form, risk_score the int."""
+        return {
+            'regulation': self.regulation,
+            'key_clauses': self.key_phrases,
+            'risk_level': self.risk.value,
+            'risk_percent': f"{self.risk_percent}%",
+            'risk_score': self.risk_percent,
+            'summary': self.summary
+        }
+
+
+def _percent(value, field="risk_percentage"):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ParseError(field, f"Risk percentage has type {type(value).__name__}")
+    if not 0 <= value <= 100:
+        raise ParseError(field, f"Risk percentage out of range: {value}")
+    return round(value)
+
+
+# Line-format responses (build_analysis_prompt). One regex split finds every
+# "Field:" label at the start of a line; each value runs up to the next label,
+# so a summary that wraps onto several lines is kept whole.
+_TEXT_FIELDS = re.compile(r"^[ \t>*_#-]*((?i:regulation|summary|risk percentage|risk))[*_]*[ \t]*:[*_]*[ \t]*", re.M)
+_PERCENT_VALUE = re.compile(r"-?\d+(?:\.\d+)?")
+_REGULATION_BY_NAME = {name.lower(): name for name in REGULATIONS}
+
+
+def parse_text_analysis(text):
+    """Parses a "Regulation: / Summary: / Risk: / Risk Percentage:" response; key_phrases is left empty."""
+    parts = _TEXT_FIELDS.split(text)
+    values = {}
+    # Walk backwards so the first occurrence of a repeated label wins.
+    for i in range(len(parts) - 2, 0, -2):
+        values[parts[i].lower()] = parts[i + 1]
+
+    regulation = values.get("regulation", "").strip()
+    summary = " ".join(values.get("summary", "").split())
+    risk = values.get("risk", "").strip().rstrip(".")
+    percent = _PERCENT_VALUE.search(values.get("risk percentage", ""))
+    if not regulation:
+        raise ParseError("regulation", "Response is missing 'regulation'")
+    if not summary:
+        raise ParseError("summary", "Response is missing 'summary'")
+    if not percent:
+        raise ParseError("risk percentage", "Response is missing a numeric 'risk percentage'")
+    return ClauseAnalysis(
+        _REGULATION_BY_NAME.get(regulation.lower(), regulation),
+        summary,
+        Risk.parse(risk),
+        _percent(float(percent.group()))
+    )
+
+
+# JSON responses (build_combined_prompt, build_batch_prompt entries).
+_CODE_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+
+def load_json_object(text):
+    try:
+        data = json.loads(_CODE_FENCE.sub("", text.strip()))
+    except json.JSONDecodeError as e:
+        raise ParseError(None, f"Response is not valid JSON: {e}")
+    if not isinstance(data, dict):
+        raise ParseError(None, "Response is not a JSON object")
+    return data
+
+
+def require(data, field, expected_type):
+    if field not in data:
+        raise ParseError(field, f"Response is missing '{field}'")
+    value = data[field]
+    if not isinstance(value, expected_type) or isinstance(value, bool):
+        raise ParseError(field, f"Response field '{field}' has type {type(value).__name__}")
+    return value
+
+
+def analysis_from_json(data):
+    """Validates one COMBINED_RESPONSE_SCHEMA object (already decoded) into a ClauseAnalysis."""
+    regulation = require(data, "regulation", str).strip()
+    if regulation not in REGULATIONS:
+        raise ParseError("regulation", f"Unknown regulation: {regulation}")
+    summary = require(data, "summary", str).strip()
+    if not summary:
+        raise ParseError("summary", "Response has an empty summary")
+    risk = Risk.parse(require(data, "risk", str))
+    risk_percent = _percent(require(data, "risk_percentage", (int, float)))
+    key_phrases = require(data, "key_phrases", list)
+    if not all(isinstance(phrase, str) for phrase in key_phrases):
+        raise ParseError("key_phrases", "Response key_phrases must be strings")
+    return ClauseAnalysis(
+        regulation,
+        summary,
+        risk,
+        risk_percent,
+        ", ".join(phrase.strip() for phrase in key_phrases if phrase.strip())
+    )
+
+
+def parse_json_analysis(text):
+    return analysis_from_json(load_json_object(text))
+
+
+def build_repair_prompt(prompt, response, error):
+    """Follow-up prompt asking for a corrected answer after `response` failed to parse with `error`."""
+    return (
+        f"{prompt}\n\n"
+        f"Your previous response could not be used ({error}):\n{response[:1000]}\n\n"
+        f"Respond again, following the required format exactly and with nothing else."
+    )
@@ -0,0 +1,302 @@
+# result_store.py
+#
+# Result sinks for analyzed clauses. Google Sheets stays the shared output,
+# while the SQLite / Parquet stores keep the full analysis result dict (clause
+# text included) locally, indexed for historical queries and dashboards. AI
+# rewrites are produced later, on request, and live in the clause cache only.
+
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+import telemetry
+from config import (
+    RESULT_STORE_BACKENDS,
+    RESULT_STORE_SQLITE_PATH,
+    RESULT_STORE_PARQUET_DIR
+)
+
+_PERCENT = re.compile(r"-?\d+(?:\.\d+)?")
+
+
+def result_to_row(result):
+    """The Google Sheets row for one result dict (matches EXPECTED_HEADER)."""
+    return [
+        result['clause_id'],
+        result['regulation'],
+        result['key_clauses'],
+        result['risk_level'],
+        result['risk_percent'],
+        result['summary']
+    ]
+
+
+def parse_risk_percent(value):
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _PERCENT.search(str(value or ""))
+    return float(match.group()) if match else None
+
+
+class ResultSink:
+    """
+    Destination for analyzed clauses. `contract` is a dict with the contract's
+    "hash" (sha256 of the file), "name" and, once its job has started, "run_id".
+    Stores that keep history replace a contract's rows from earlier runs when
+    a new run_id first arrives; a resumed run keeps its run_id.
+    """
+
+    def add(self, contract, results):
+        raise NotImplementedError
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
+
+
+class SheetResultSink(ResultSink):
+    """Adapts a sheet_sink.SheetSink to the ResultSink interface."""
+
+    def __init__(self, sheet_sink):
+        self.sheet_sink = sheet_sink
+
+    def add(self, contract, results):
+        self.sheet_sink.add([result_to_row(result) for result in results])
+
+    def flush(self):
+        self.sheet_sink.flush()
+
+
+class SQLiteResultSink(ResultSink):
+    """One row per (contract, clause) of the contract's latest run, with the full result as JSON plus indexed columns."""
+
+    def __init__(self, path=RESULT_STORE_SQLITE_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS clause_results ("
+            " contract_hash TEXT NOT NULL,"
+            " contract_name TEXT,"
+            " clause_id INTEGER NOT NULL,"
+            " regulation TEXT,"
+            " risk_level TEXT,"
+            " risk_percent REAL,"
+            " analyzed_at REAL NOT NULL,"
+            " result_json TEXT NOT NULL,"
+            " run_id TEXT,"
+            " PRIMARY KEY (contract_hash, clause_id))"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(clause_results)")}
+        if "run_id" not in columns:
+            self._conn.execute("ALTER TABLE clause_results ADD COLUMN run_id TEXT")
+        self._runs = {}
+        for column in ("clause_id", "regulation", "risk_level"):
+            self._conn.execute(
+                f"CREATE INDEX IF NOT EXISTS idx_clause_results_{column} ON clause_results({column})"
+            )
+        self._conn.commit()
+
+    def add(self, contract, results):
+        if not results:
+            return
+        now = time.time()
+        records = [
+            (
+                contract["hash"],
+                contract.get("name"),
+                result["clause_id"],
+                result.get("regulation"),
+                result.get("risk_level"),
+                parse_risk_percent(result.get("risk_score", result.get("risk_percent"))),
+                now,
+                json.dumps(result),
+                contract.get("run_id")
+            )
+            for result in results
+        ]
+        with self._lock:
+            run_id = contract.get("run_id")
+            if run_id and self._runs.get(contract["hash"]) != run_id:
+                # Clause IDs are new on every run, so an earlier run's rows would be counted twice.
+                self._conn.execute(
+                    "DELETE FROM clause_results WHERE contract_hash = ? AND run_id IS NOT ?",
+                    (contract["hash"], run_id)
+                )
+                self._runs[contract["hash"]] = run_id
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO clause_results"
+                " (contract_hash, contract_name, clause_id, regulation, risk_level, risk_percent, analyzed_at, result_json, run_id)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                records
+            )
+            self._conn.commit()
+
+    def query(self, contract_hash=None, regulation=None, risk_level=None, limit=None):
+        """Stored result dicts matching every given filter, in clause order."""
+        clauses, params = [], []
+        for column, value in (("contract_hash", contract_hash), ("regulation", regulation), ("risk_level", risk_level)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        sql = "SELECT result_json FROM clause_results"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY contract_hash, clause_id"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def list_contracts(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT contract_hash, contract_name, COUNT(*), MAX(analyzed_at)"
+                " FROM clause_results GROUP BY contract_hash ORDER BY MAX(analyzed_at) DESC"
+            ).fetchall()
+        return [
+            {"hash": h, "name": name, "clauses": count, "analyzed_at": analyzed_at}
+            for h, name, count, analyzed_at in rows
+        ]
+
+    def risk_summary(self, contract_hash=None):
+        """Clause counts and average risk % per (regulation, risk level)."""
+        sql = "SELECT regulation, risk_level, COUNT(*), AVG(risk_percent) FROM clause_results"
+        params = []
+        if contract_hash:
+            sql += " WHERE contract_hash = ?"
+            params.append(contract_hash)
+        sql += " GROUP BY regulation, risk_level ORDER BY regulation, risk_level"
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [
+            {"regulation": regulation, "risk_level": risk_level, "clauses": count, "avg_risk_percent": avg}
+            for regulation, risk_level, count, avg in rows
+        ]
+
+
+class ParquetResultSink(ResultSink):
+    """
+    Appends results as Parquet files partitioned by contract hash
+    (<dir>/contract_hash=<hash>/part-<run_id>-<n>.parquet). The first write of
+    a new run removes the partition's files from earlier runs. Needs the
+    optional pyarrow package.
+    """
+
+    def __init__(self, directory=RESULT_STORE_PARQUET_DIR, flush_rows=500):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ImportError("The parquet result store needs pyarrow (pip install pyarrow).")
+        self.directory = directory
+        self.flush_rows = flush_rows
+        self._buffer = {}
+        self._buffered = 0
+        self._runs = {}
+        self._lock = threading.Lock()
+
+    def add(self, contract, results):
+        with self._lock:
+            rows = self._buffer.setdefault((contract["hash"], contract.get("run_id") or "norun"), [])
+            for result in results:
+                rows.append({
+                    "contract_hash": contract["hash"],
+                    "contract_name": contract.get("name"),
+                    "clause_id": result["clause_id"],
+                    "regulation": result.get("regulation"),
+                    "risk_level": result.get("risk_level"),
+                    "risk_percent": parse_risk_percent(result.get("risk_score", result.get("risk_percent"))),
+                    "result_json": json.dumps(result)
+                })
+            self._buffered += len(results)
+            if self._buffered >= self.flush_rows:
+                self._write()
+
+    def _write(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        for (contract_hash, run_id), rows in self._buffer.items():
+            if not rows:
+                continue
+            partition = os.path.join(self.directory, f"contract_hash={contract_hash}")
+            os.makedirs(partition, exist_ok=True)
+            if self._runs.get(contract_hash) != run_id:
+                for name in os.listdir(partition):
+                    if not name.startswith(f"part-{run_id}-"):
+                        os.unlink(os.path.join(partition, name))
+                self._runs[contract_hash] = run_id
+            path = os.path.join(partition, f"part-{run_id}-{time.time_ns()}.parquet")
+            pq.write_table(pa.Table.from_pylist(rows), path)
+        self._buffer = {}
+        self._buffered = 0
+
+    def flush(self):
+        with self._lock:
+            self._write()
+
+
+class MultiSink(ResultSink):
+    """
+    Fans results out to several sinks. The first sink is the primary one and
+    its errors propagate; failures in the others (local stores) are only logged.
+    """
+
+    def __init__(self, sinks):
+        self.sinks = sinks
+
+    def _each(self, method, *args):
+        for i, sink in enumerate(self.sinks):
+            try:
+                with telemetry.span("result_store", sink=type(sink).__name__, method=method):
+                    getattr(sink, method)(*args)
+            except Exception as e:
+                if i == 0:
+                    raise
+                print(f"⚠️ {type(sink).__name__}.{method} failed: {e}")
+
+    def add(self, contract, results):
+        self._each("add", contract, results)
+
+    def flush(self):
+        self._each("flush")
+
+
+_local_sinks = None
+_local_sinks_lock = threading.Lock()
+
+
+def get_local_sinks():
+    """Process-wide local stores listed in RESULT_STORE_BACKENDS ("sqlite", "parquet")."""
+    global _local_sinks
+    with _local_sinks_lock:
+        if _local_sinks is None:
+            sinks = []
+            for backend in filter(None, (b.strip() for b in RESULT_STORE_BACKENDS.split(","))):
+                try:
+                    if backend == "sqlite":
+                        sinks.append(SQLiteResultSink())
+                    elif backend == "parquet":
+                        sinks.append(ParquetResultSink())
+                    else:
+                        print(f"⚠️ Unknown result store backend '{backend}'. Skipping.")
+                except Exception as e:
+                    print(f"⚠️ Could not open the {backend} result store: {e}")
+            _local_sinks = sinks
+        return _local_sinks
+
+
+def get_sqlite_store():
+    """The SQLite store used for local queries, or None when it isn't enabled."""
+    for sink in get_local_sinks():
+        if isinstance(sink, SQLiteResultSink):
+            return sink
+    return None
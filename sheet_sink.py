@@ -0,0 +1,316 @@
+# sheet_sink.py
+
+import os
+import re
+import csv
+import time
+import sqlite3
+import threading
+import telemetry
+from config import (
+    SHEET_FLUSH_ROWS,
+    SHEET_FLUSH_SECONDS,
+    SHEET_ID_ALLOCATOR_PATH,
+    SHEET_ID_COUNTER_CELL,
+    SHEET_ID_BLOCK_SIZE
+)
+
+_CELL = re.compile(r"^([A-Z]+)(\d+)$")
+
+
+def _parse_cell(address):
+    match = _CELL.match(address.strip().upper())
+    if not match:
+        raise ValueError(f"Unsupported cell address: {address}")
+    letters, row = match.groups()
+    col = 0
+    for letter in letters:
+        col = col * 26 + (ord(letter) - ord("A") + 1)
+    return int(row), col
+
+
+class LocalWorksheet:
+    """
+    Offline stand-in for the pygsheets Worksheet methods this project uses.
+    Rows live in memory and, when a path is given, are mirrored to a CSV file.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.rows = []
+        self.api_calls = 0
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, newline="", encoding="utf-8") as f:
+                self.rows = [row for row in csv.reader(f)]
+
+    def _save(self):
+        if self.path:
+            with open(self.path, "w", newline="", encoding="utf-8") as f:
+                csv.writer(f).writerows(self.rows)
+
+    def _trim(self, values, include_tailing_empty):
+        values = list(values)
+        if not include_tailing_empty:
+            while values and values[-1] in ("", None):
+                values.pop()
+        return values
+
+    def get_row(self, row, include_tailing_empty=True):
+        with self._lock:
+            self.api_calls += 1
+            values = self.rows[row - 1] if row <= len(self.rows) else []
+            return self._trim(values, include_tailing_empty)
+
+    def update_row(self, row, values):
+        with self._lock:
+            self.api_calls += 1
+            while len(self.rows) < row:
+                self.rows.append([])
+            self.rows[row - 1] = [str(v) for v in values]
+            self._save()
+
+    def get_col(self, col, include_tailing_empty=True):
+        with self._lock:
+            self.api_calls += 1
+            values = [row[col - 1] if len(row) >= col else "" for row in self.rows]
+            return self._trim(values, include_tailing_empty)
+
+    def get_value(self, address):
+        row, col = _parse_cell(address)
+        with self._lock:
+            self.api_calls += 1
+            if row <= len(self.rows) and col <= len(self.rows[row - 1]):
+                return self.rows[row - 1][col - 1]
+            return ""
+
+    def update_value(self, address, value):
+        row, col = _parse_cell(address)
+        with self._lock:
+            self.api_calls += 1
+            while len(self.rows) < row:
+                self.rows.append([])
+            cells = self.rows[row - 1]
+            while len(cells) < col:
+                cells.append("")
+            cells[col - 1] = str(value)
+            self._save()
+
+    def get_all_values(self, include_tailing_empty=True):
+        with self._lock:
+            self.api_calls += 1
+            return [self._trim(row, include_tailing_empty) for row in self.rows]
+
+    def append_table(self, values):
+        with self._lock:
+            self.api_calls += 1
+            self.rows.extend([str(v) for v in row] for row in values)
+            self._save()
+
+
+_local_sheets = {}
+_local_sheets_lock = threading.Lock()
+
+
+def get_local_worksheet(path=None):
+    """Process-wide LocalWorksheet per path, so every connect_sheet() sees the same rows."""
+    with _local_sheets_lock:
+        if path not in _local_sheets:
+            _local_sheets[path] = LocalWorksheet(path)
+        return _local_sheets[path]
+
+
+class ClauseIdAllocator:
+    """
+    Clause ID blocks from a SQLite counter per worksheet, shared by every
+    process on this machine. A reservation runs under the database write lock
+    (BEGIN IMMEDIATE) and never starts below the sheet's own next ID, so rows
+    written by other means aren't reused either.
+    """
+
+    def __init__(self, path=SHEET_ID_ALLOCATOR_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        # isolation_level=None so reserve() can take the write lock with BEGIN IMMEDIATE.
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS clause_ids (sheet_key TEXT PRIMARY KEY, next_id INTEGER NOT NULL)")
+
+    def reserve(self, sheet_key, count, sheet_next_id, publish=None):
+        """
+        First of `count` IDs. sheet_next_id() reads the sheet's own next ID;
+        publish(next_id), if given, runs before the lock is released.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT next_id FROM clause_ids WHERE sheet_key = ?", (sheet_key,)).fetchone()
+                start = max(row[0] if row else 0, sheet_next_id())
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO clause_ids (sheet_key, next_id) VALUES (?, ?)", (sheet_key, start + count)
+                )
+                if publish:
+                    publish(start + count)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return start
+
+
+_allocator = None
+_allocator_lock = threading.Lock()
+
+
+def get_id_allocator():
+    """Process-wide ClauseIdAllocator, or None when SHEET_ID_ALLOCATOR_PATH is empty."""
+    global _allocator
+    if not SHEET_ID_ALLOCATOR_PATH:
+        return None
+    with _allocator_lock:
+        if _allocator is None:
+            _allocator = ClauseIdAllocator()
+        return _allocator
+
+
+def _allocator_key(wks):
+    """Identifies the worksheet across processes, or None for an in-memory sheet only this process sees."""
+    if isinstance(wks, LocalWorksheet):
+        return f"local:{os.path.abspath(wks.path)}" if wks.path else None
+    spreadsheet = getattr(wks, "spreadsheet", None)
+    return f"{getattr(spreadsheet, 'id', None)}:{getattr(wks, 'id', None)}"
+
+
+def _sheet_key(wks):
+    spreadsheet = getattr(wks, "spreadsheet", None)
+    return (getattr(spreadsheet, "id", None), getattr(wks, "id", None) or id(wks))
+
+
+class SheetSink:
+    """
+    Incremental writer for one worksheet. The header is checked once per
+    process, clause IDs are reserved in blocks from the shared allocator (or,
+    without one, come from a cached row-count cursor), and rows are appended
+    in micro-batches of flush_rows or every flush_seconds instead of one
+    append at the very end. The cached cursor assumes this process is the
+    only writer; is_shared_safe() tells callers whether that's the case.
+    """
+
+    def __init__(self, wks, header, flush_rows=SHEET_FLUSH_ROWS, flush_seconds=SHEET_FLUSH_SECONDS,
+                 counter_cell=SHEET_ID_COUNTER_CELL, id_block_size=SHEET_ID_BLOCK_SIZE, allocator=None):
+        self.wks = wks
+        self.header = header
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self.counter_cell = counter_cell
+        self.id_block_size = id_block_size
+        self.allocator = allocator
+        self.header_checked = False
+        self.rows_written = 0
+        self._next_id = None
+        self._block_end = None
+        self._buffer = []
+        self._last_flush = time.monotonic()
+        self._lock = threading.RLock()
+
+    def ensure_header(self):
+        with self._lock:
+            if self.header_checked:
+                return
+            current_header = self.wks.get_row(1, include_tailing_empty=False)
+            if current_header[:len(self.header)] != self.header:
+                self.wks.update_row(1, self.header)
+                print("Header updated to match required columns.")
+            self.header_checked = True
+
+    def _load_cursor(self):
+        # One column instead of get_all_values(); the header row makes the
+        # count equal to the next Clause ID, as before.
+        return max(1, len(self.wks.get_col(1, include_tailing_empty=False)))
+
+    def _sheet_next_id(self):
+        if self.counter_cell:
+            raw = self.wks.get_value(self.counter_cell)
+            if str(raw).strip().isdigit():
+                return max(int(raw), self._load_cursor())
+        return self._load_cursor()
+
+    def _publish(self, next_id):
+        if self.counter_cell:
+            self.wks.update_value(self.counter_cell, next_id)
+
+    def _reserve_block(self, size):
+        if self.allocator:
+            return self.allocator.reserve(_allocator_key(self.wks), size, self._sheet_next_id, self._publish)
+        # Counter cell only: the read and the bump aren't atomic across processes.
+        start = self._sheet_next_id()
+        self._publish(start + size)
+        return start
+
+    def is_shared_safe(self):
+        """True when other processes can take Clause IDs for this sheet at the same time."""
+        return self.allocator is not None
+
+    def next_id(self):
+        return self.reserve_ids(1)
+
+    def reserve_ids(self, count):
+        """Returns the first of `count` consecutive Clause IDs."""
+        with self._lock:
+            if not self.allocator and not self.counter_cell:
+                if self._next_id is None:
+                    self._next_id = self._load_cursor()
+            elif self._next_id is None or self._block_end - self._next_id < count:
+                if count > self.id_block_size:
+                    # Too big for a shared block; give this caller a block of its own.
+                    return self._reserve_block(count)
+                self._next_id = self._reserve_block(self.id_block_size)
+                self._block_end = self._next_id + self.id_block_size
+            start = self._next_id
+            self._next_id += count
+            return start
+
+    def iter_ids(self):
+        while True:
+            yield self.next_id()
+
+    def add(self, rows):
+        with self._lock:
+            self._buffer.extend(rows)
+            due = time.monotonic() - self._last_flush >= self.flush_seconds
+            if len(self._buffer) >= self.flush_rows or (due and self._buffer):
+                self.flush()
+
+    def flush(self):
+        with self._lock:
+            if not self._buffer:
+                return
+            rows = sorted(self._buffer, key=lambda row: row[0])
+            # Only drop the buffer once the append went through, so a failed flush is retried.
+            with telemetry.span("sheet_write", attrs={"rows": len(rows)}):
+                self.wks.append_table(rows)
+            self._buffer = []
+            self._last_flush = time.monotonic()
+            self.rows_written += len(rows)
+            print(f"Flushed {len(rows)} rows to the sheet ({self.rows_written} this session).")
+
+    def close(self):
+        self.flush()
+
+
+_sinks = {}
+_sinks_lock = threading.Lock()
+
+
+def get_sheet_sink(wks, header):
+    """Shared SheetSink per worksheet, so the header check and ID cursor survive across analyses."""
+    key = _sheet_key(wks)
+    with _sinks_lock:
+        sink = _sinks.get(key)
+        if sink is None:
+            sink = SheetSink(wks, header, allocator=get_id_allocator() if _allocator_key(wks) else None)
+            _sinks[key] = sink
+        else:
+            # A fresh connection to the same worksheet keeps the cached header check and cursor.
+            sink.wks = wks
+        return sink
@@ -0,0 +1,375 @@
+# telemetry.py
+#
+# Lightweight tracing and metrics for the analysis pipeline.
+#
+# - span(name, **labels) times a stage. Spans nest per thread / asyncio task,
+#   so each stage also gets a "self" time that excludes the stages inside it
+#   (chunking vs. the extraction it pulls pages from, an LLM request vs. its
+#   rate-limiter wait). Labels (model, provider...) are aggregated; attrs
+#   (clause_id...) are only kept on the individual span records.
+# - count(name, amount, **labels) bumps a counter (requests, tokens,
+#   fallbacks, retries).
+# - traced_run wraps one pipeline run. The active run lives in a ContextVar, so
+#   concurrent runs in one process (e.g. iter_contract_results threads) each
+#   get their own trace; work handed to a thread pool joins the caller's run
+#   when submitted through bind(). At the end the run's stage breakdown and
+#   counters are written to METRICS_DIR/runs/<run_id>.json, the process-wide
+#   totals to METRICS_DIR/metrics.prom (Prometheus text format), and the run
+#   is optionally profiled with cProfile or pyinstrument (PROFILER).
+
+import os
+import json
+import time
+import inspect
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+from config import TELEMETRY_ENABLED, METRICS_DIR, METRICS_EXPORT_FORMATS, TRACE_MAX_SPANS, PROFILER
+
+_lock = threading.Lock()
+_stack = contextvars.ContextVar("telemetry_span_stack", default=())
+_current = contextvars.ContextVar("telemetry_trace", default=None)
+_stages = {}
+_counters = {}
+
+
+class Trace:
+    """Stage timings, counters and span records collected during one traced run."""
+
+    def __init__(self, name):
+        self.name = name
+        self.run_id = None
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.wall_seconds = None
+        self.stages = {}
+        self.counters = {}
+        self.spans = []
+        self.dropped_spans = 0
+
+    def finish(self):
+        self.wall_seconds = time.perf_counter() - self._start
+
+    def to_dict(self):
+        return {
+            "run_id": self.run_id,
+            "name": self.name,
+            "started_at": self.started_at,
+            "wall_seconds": self.wall_seconds,
+            "stages": _stage_rows(self.stages),
+            "counters": _counter_rows(self.counters),
+            "spans": self.spans,
+            "dropped_spans": self.dropped_spans
+        }
+
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+
+def _stage_rows(stages):
+    rows = [dict(stage=name, labels=dict(labels), **stats) for (name, labels), stats in stages.items()]
+    return sorted(rows, key=lambda row: row["self_seconds"], reverse=True)
+
+
+def _counter_rows(counters):
+    return [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in sorted(counters.items())]
+
+
+def _add_stage(stages, key, seconds, self_seconds):
+    stats = stages.get(key)
+    if stats is None:
+        stats = stages[key] = {"count": 0, "seconds": 0.0, "self_seconds": 0.0, "max_seconds": 0.0}
+    stats["count"] += 1
+    stats["seconds"] += seconds
+    stats["self_seconds"] += self_seconds
+    stats["max_seconds"] = max(stats["max_seconds"], seconds)
+
+
+def _record(name, labels, seconds, self_seconds, started, attrs, error):
+    key = _key(name, labels)
+    trace = _current.get()
+    with _lock:
+        _add_stage(_stages, key, seconds, self_seconds)
+        if trace is None:
+            return
+        _add_stage(trace.stages, key, seconds, self_seconds)
+        if len(trace.spans) >= TRACE_MAX_SPANS:
+            trace.dropped_spans += 1
+            return
+        record = {"name": name, "start": round(started - trace._start, 6), "seconds": round(seconds, 6)}
+        record.update(key[1])
+        if attrs:
+            record.update(attrs)
+        if error:
+            record["error"] = error
+        trace.spans.append(record)
+
+
+def _charge_parent(seconds):
+    """Adds a finished child's time to the enclosing span's frame, which bind() may share across threads."""
+    parents = _stack.get()
+    if parents:
+        with _lock:
+            parents[-1]["children"] += seconds
+
+
+def _children(frame):
+    with _lock:
+        return frame["children"]
+
+
+@contextmanager
+def span(name, attrs=None, **labels):
+    """Times the block as stage `name`; exceptions are recorded on the span and re-raised."""
+    if not TELEMETRY_ENABLED:
+        yield
+        return
+    frame = {"children": 0.0}
+    token = _stack.set(_stack.get() + (frame,))
+    start = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        _stack.reset(token)
+        _charge_parent(seconds)
+        # Concurrent children (asyncio tasks, bound threads) can add up to more than the parent's wall time.
+        _record(name, labels, seconds, max(0.0, seconds - _children(frame)), start, attrs, error)
+
+
+def timed_iter(name, iterable, **labels):
+    """
+    Yields from iterable, timing only the time spent producing items. All of it
+    is recorded as one span at the end, so per-page/per-chunk work doesn't
+    flood the trace, while nested timed_iters still get their own self time.
+    """
+    if not TELEMETRY_ENABLED:
+        yield from iterable
+        return
+    iterator = iter(iterable)
+    first_start = None
+    seconds = children = 0.0
+    items = 0
+    try:
+        while True:
+            frame = {"children": 0.0}
+            token = _stack.set(_stack.get() + (frame,))
+            start = time.perf_counter()
+            first_start = first_start or start
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                seconds += time.perf_counter() - start
+                children += _children(frame)
+                _stack.reset(token)
+            items += 1
+            yield item
+    finally:
+        if first_start is not None:
+            _charge_parent(seconds)
+            _record(name, labels, seconds, max(0.0, seconds - children), first_start, {"items": items}, None)
+
+
+def count(name, amount=1, **labels):
+    if not TELEMETRY_ENABLED or not amount:
+        return
+    key = _key(name, labels)
+    trace = _current.get()
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+        if trace is not None:
+            trace.counters[key] = trace.counters.get(key, 0) + amount
+
+
+def set_run_id(run_id):
+    """Names the active run (e.g. the job id once the contract has been hashed)."""
+    trace = _current.get()
+    if trace is not None:
+        trace.run_id = run_id
+
+
+def current_trace():
+    return _current.get()
+
+
+def bind(function):
+    """
+    Wraps function to run in a copy of the caller's context, so spans and
+    counts from thread-pool work (and done callbacks) land in the caller's
+    run. Bind once per submission: a context can't be entered by two threads.
+    """
+    context = contextvars.copy_context()
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        return context.run(function, *args, **kwargs)
+    return wrapper
+
+
+@contextmanager
+def profile(name):
+    """cProfile or pyinstrument around the block when PROFILER is set (main thread only)."""
+    if PROFILER not in ("cprofile", "pyinstrument"):
+        yield
+        return
+    directory = os.path.join(METRICS_DIR, "profiles")
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}")
+    if PROFILER == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            print("⚠️ PROFILER=pyinstrument but pyinstrument is not installed; running without a profiler.")
+            yield
+            return
+        profiler = Profiler(async_mode="enabled")
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            with open(path + ".html", "w", encoding="utf-8") as f:
+                f.write(profiler.output_html())
+            print(f"🔬 Profile written to {path}.html")
+        return
+
+    import cProfile
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path + ".prof")
+        print(f"🔬 Profile written to {path}.prof (view with: python -m pstats or snakeviz)")
+
+
+def format_breakdown(trace, limit=8):
+    """One-line summary of where a run's time went, by self time."""
+    rows = {}
+    for row in trace.to_dict()["stages"]:
+        rows[row["stage"]] = rows.get(row["stage"], 0.0) + row["self_seconds"]
+    parts = [f"{stage} {seconds:.1f}s" for stage, seconds in sorted(rows.items(), key=lambda item: -item[1])[:limit]]
+    return f"⏱️ Run took {trace.wall_seconds:.1f}s; time by stage (summed across threads): " + ", ".join(parts)
+
+
+def _prometheus_labels(labels):
+    if not labels:
+        return ""
+    escaped = (f'{k}="{json.dumps(str(v))[1:-1]}"' for k, v in labels)
+    return "{" + ",".join(escaped) + "}"
+
+
+def prometheus_text():
+    """Process-wide stage timings, counters and HTTP latency histograms in Prometheus text format."""
+    from http_session import get_latency_histograms
+
+    with _lock:
+        stages = dict((key, dict(stats)) for key, stats in _stages.items())
+        counters = dict(_counters)
+    lines = [
+        "# TYPE contract_checker_stage_seconds_total counter",
+        "# TYPE contract_checker_stage_self_seconds_total counter",
+        "# TYPE contract_checker_stage_calls_total counter",
+    ]
+    for (name, labels), stats in sorted(stages.items()):
+        label_text = _prometheus_labels((("stage", name),) + labels)
+        lines.append(f"contract_checker_stage_seconds_total{label_text} {stats['seconds']:.6f}")
+        lines.append(f"contract_checker_stage_self_seconds_total{label_text} {stats['self_seconds']:.6f}")
+        lines.append(f"contract_checker_stage_calls_total{label_text} {stats['count']}")
+    for name in sorted({name for name, _ in counters}):
+        lines.append(f"# TYPE contract_checker_{name} counter")
+        for (counter, labels), value in sorted(counters.items()):
+            if counter == name:
+                lines.append(f"contract_checker_{name}{_prometheus_labels(labels)} {value}")
+    lines.append("# TYPE contract_checker_http_request_seconds histogram")
+    for provider, histogram in sorted(get_latency_histograms().items()):
+        cumulative = 0
+        for bound, bucket in histogram["buckets"].items():
+            cumulative += bucket
+            lines.append(f'contract_checker_http_request_seconds_bucket{{provider="{provider}",le="{bound}"}} {cumulative}')
+        lines.append(f'contract_checker_http_request_seconds_count{{provider="{provider}"}} {histogram["count"]}')
+        lines.append(f'contract_checker_http_request_seconds_sum{{provider="{provider}"}} {histogram["mean_seconds"] * histogram["count"]:.6f}')
+    return "\n".join(lines) + "\n"
+
+
+def _write_atomic(path, text):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def run_trace_path(run_id):
+    return os.path.join(METRICS_DIR, "runs", f"{run_id}.json")
+
+
+def export(trace):
+    if "json" in METRICS_EXPORT_FORMATS:
+        _write_atomic(run_trace_path(trace.run_id), json.dumps(trace.to_dict()))
+    if "prometheus" in METRICS_EXPORT_FORMATS:
+        _write_atomic(os.path.join(METRICS_DIR, "metrics.prom"), prometheus_text())
+
+
+def load_run_trace(run_id):
+    """The exported trace of the last run with this id, or None."""
+    try:
+        with open(run_trace_path(run_id), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+@contextmanager
+def run(name):
+    """
+    Collects a Trace for the block. Nested runs (e.g. a contract inside a
+    batch) join the outer one, which is exported once when it ends.
+    """
+    if not TELEMETRY_ENABLED:
+        yield None
+        return
+    outer = _current.get()
+    if outer is not None:
+        with span(name):
+            yield outer
+        return
+    trace = Trace(name)
+    token = _current.set(trace)
+    try:
+        with profile(name), span("run"):
+            yield trace
+    finally:
+        _current.reset(token)
+        trace.finish()
+        trace.run_id = trace.run_id or f"{name}-{time.strftime('%Y%m%d-%H%M%S')}"
+        print(format_breakdown(trace))
+        try:
+            export(trace)
+        except OSError as e:
+            print(f"⚠️ Could not write metrics: {e}")
+
+
+def traced_run(function):
+    """Decorator: each call of the (sync or async) function is one run(function name)."""
+    if inspect.iscoroutinefunction(function):
+        @functools.wraps(function)
+        async def async_wrapper(*args, **kwargs):
+            with run(function.__name__):
+                return await function(*args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with run(function.__name__):
+            return function(*args, **kwargs)
+    return wrapper
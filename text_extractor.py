@@ -0,0 +1,308 @@
+# text_extractor.py
+#
+# Text extraction behind data_handler.iter_text_from_file. Large PDFs are
+# split into page ranges that are parsed in parallel by a process pool, each
+# worker reading the file through mmap rather than loading it into memory. A
+# page that fails to parse is logged and yields "" instead of failing the
+# document. Only a bounded window of shards is in flight, and the cache is
+# written in segments as pages are yielded, so a large document's text is never
+# held in memory all at once. Extracted text is cached by content hash, so
+# re-uploading the same file skips parsing entirely.
+
+import os
+import json
+import collections
+import mmap
+import time
+import zlib
+import sqlite3
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from config import (
+    EXTRACT_CACHE_ENABLED,
+    EXTRACT_CACHE_PATH,
+    PDF_EXTRACT_WORKERS,
+    PDF_PAGES_PER_SHARD,
+    PDF_PARALLEL_MIN_PAGES,
+    PDF_MAX_SHARDS_IN_FLIGHT
+)
+
+# Bump when extraction output changes, so cached text is re-extracted.
+EXTRACTOR_VERSION = "2"
+# Cached parts are written and read back in segments of about this many characters.
+_SEGMENT_CHARS = 256 * 1024
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class _MappedFile:
+    """Read-only mmap of a file, usable as the stream PdfReader parses from."""
+
+    def __init__(self, file_path):
+        self._file = open(file_path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __enter__(self):
+        return self._map
+
+    def __exit__(self, *exc):
+        self._map.close()
+        self._file.close()
+
+
+def _page_text(reader, number):
+    try:
+        return reader.pages[number].extract_text() or ""
+    except Exception as e:
+        print(f"⚠️ Could not extract text from page {number + 1}: {e}")
+        return ""
+
+
+def extract_page_range(file_path, start, stop):
+    """Process-pool task: text of pages [start, stop), with per-page error isolation."""
+    from pypdf import PdfReader
+
+    with _MappedFile(file_path) as data:
+        reader = PdfReader(data)
+        return [_page_text(reader, number) for number in range(start, stop)]
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn keeps torch/tokenizer threads in the parent from being forked into the workers.
+            _pool = ProcessPoolExecutor(max_workers=PDF_EXTRACT_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _discard_pool(pool):
+    """Drops a broken pool so the next document starts a fresh one."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def iter_pdf_pages(file_path, parallel=True):
+    """Yields the text of each page in order; large PDFs are parsed as parallel page-range shards."""
+    from pypdf import PdfReader
+
+    with _MappedFile(file_path) as data:
+        reader = PdfReader(data)
+        num_pages = len(reader.pages)
+        if not parallel or PDF_EXTRACT_WORKERS <= 1 or num_pages < PDF_PARALLEL_MIN_PAGES:
+            for number in range(num_pages):
+                yield _page_text(reader, number)
+            return
+
+    pool = _get_pool()
+    window = PDF_MAX_SHARDS_IN_FLIGHT or 2 * PDF_EXTRACT_WORKERS
+    starts = iter(range(0, num_pages, PDF_PAGES_PER_SHARD))
+    in_flight = collections.deque()
+
+    def submit_next():
+        start = next(starts, None)
+        if start is not None:
+            stop = min(start + PDF_PAGES_PER_SHARD, num_pages)
+            in_flight.append((start, stop, pool.submit(extract_page_range, file_path, start, stop)))
+
+    try:
+        for _ in range(window):
+            submit_next()
+        while in_flight:
+            start, stop, shard = in_flight.popleft()
+            try:
+                pages = shard.result()
+            except Exception as e:
+                if isinstance(e, BrokenProcessPool):
+                    _discard_pool(pool)
+                    pool = _get_pool()
+                print(f"⚠️ Page range {start + 1}-{stop} failed, retrying page by page: {e}")
+                with _MappedFile(file_path) as data:
+                    reader = PdfReader(data)
+                    pages = [_page_text(reader, n) for n in range(start, stop)]
+            submit_next()
+            yield from pages
+    finally:
+        for _, _, shard in in_flight:
+            shard.cancel()
+
+
+def iter_docx_paragraphs(file_path):
+    import docx
+
+    doc = docx.Document(file_path)
+    for para in doc.paragraphs:
+        yield para.text
+
+
+class ExtractedTextCache:
+    """
+    Extracted text parts keyed by file content hash, stored as zlib-compressed
+    segments in SQLite. A document only becomes visible once its last segment
+    is written (see CacheWriter), and is read back one segment at a time.
+    """
+
+    def __init__(self, path=EXTRACT_CACHE_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS extracted_documents ("
+            " key TEXT PRIMARY KEY,"
+            " num_parts INTEGER NOT NULL,"
+            " created_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS extracted_segments ("
+            " key TEXT NOT NULL,"
+            " seq INTEGER NOT NULL,"
+            " parts BLOB NOT NULL,"
+            " PRIMARY KEY (key, seq))"
+        )
+        self._conn.commit()
+
+    def get_num_parts(self, key):
+        """Number of cached parts for key, or None if the document isn't cached."""
+        with self._lock:
+            row = self._conn.execute("SELECT num_parts FROM extracted_documents WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def iter_parts(self, key):
+        seq = -1
+        while True:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT seq, parts FROM extracted_segments WHERE key = ? AND seq > ? ORDER BY seq LIMIT 1",
+                    (key, seq)
+                ).fetchone()
+            if row is None:
+                return
+            seq = row[0]
+            yield from json.loads(zlib.decompress(row[1]))
+
+    def _write_segment(self, key, seq, parts):
+        blob = zlib.compress(json.dumps(parts).encode("utf-8"))
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO extracted_segments (key, seq, parts) VALUES (?, ?, ?)", (key, seq, blob))
+            self._conn.commit()
+
+    def _publish(self, staging_key, key, num_parts):
+        with self._lock:
+            self._conn.execute("DELETE FROM extracted_segments WHERE key = ?", (key,))
+            self._conn.execute("UPDATE extracted_segments SET key = ? WHERE key = ?", (key, staging_key))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO extracted_documents (key, num_parts, created_at) VALUES (?, ?, ?)",
+                (key, num_parts, time.time())
+            )
+            self._conn.commit()
+
+    def _discard(self, staging_key):
+        with self._lock:
+            self._conn.execute("DELETE FROM extracted_segments WHERE key = ?", (staging_key,))
+            self._conn.commit()
+
+    def writer(self, key):
+        return CacheWriter(self, key)
+
+
+class CacheWriter:
+    """
+    Appends parts to the cache as they are extracted, flushing a segment every
+    _SEGMENT_CHARS. Segments go under a staging key until commit(), so a
+    concurrent or abandoned extraction never leaves a partial document behind.
+    """
+
+    def __init__(self, cache, key):
+        self.cache = cache
+        self.key = key
+        self.num_parts = 0
+        self._staging_key = f"{key}#{os.getpid()}-{time.time_ns()}"
+        self._seq = 0
+        self._buffer = []
+        self._buffered = 0
+
+    def add(self, part):
+        self._buffer.append(part)
+        self._buffered += len(part)
+        self.num_parts += 1
+        if self._buffered >= _SEGMENT_CHARS:
+            self._flush()
+
+    def _flush(self):
+        if self._buffer:
+            self.cache._write_segment(self._staging_key, self._seq, self._buffer)
+            self._seq += 1
+            self._buffer = []
+            self._buffered = 0
+
+    def commit(self):
+        self._flush()
+        self.cache._publish(self._staging_key, self.key, self.num_parts)
+
+    def discard(self):
+        self._buffer = []
+        self.cache._discard(self._staging_key)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_extract_cache():
+    """Process-wide ExtractedTextCache, or None when EXTRACT_CACHE_ENABLED is off."""
+    global _cache
+    if not EXTRACT_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ExtractedTextCache()
+        return _cache
+
+
+def iter_document_text(file_path, parallel=True):
+    """
+    Yields the text of each PDF page or DOCX paragraph, from the cache when this
+    exact file was extracted before. parallel=False keeps PDF parsing in this
+    process (for callers that already run inside a worker process).
+    """
+    from data_handler import hash_file
+
+    if file_path.endswith('.pdf'):
+        extract = lambda: iter_pdf_pages(file_path, parallel)
+    elif file_path.endswith('.docx'):
+        extract = lambda: iter_docx_paragraphs(file_path)
+    else:
+        raise ValueError("Unsupported file format. Please use a .pdf or .docx file.")
+
+    cache = get_extract_cache()
+    key = f"{EXTRACTOR_VERSION}:{hash_file(file_path)}" if cache else None
+    num_parts = cache.get_num_parts(key) if cache else None
+    if num_parts is not None:
+        print(f"⚡ Reusing extracted text for {os.path.basename(file_path)} ({num_parts} parts).")
+        yield from cache.iter_parts(key)
+        return
+
+    start = time.perf_counter()
+    writer = cache.writer(key) if cache else None
+    num_parts = 0
+    committed = False
+    try:
+        for part in extract():
+            num_parts += 1
+            if writer:
+                writer.add(part)
+            yield part
+        print(f"📄 Extracted {num_parts} parts from {os.path.basename(file_path)} in {time.perf_counter() - start:.2f}s.")
+        if writer:
+            writer.commit()
+            committed = True
+    finally:
+        if writer and not committed:
+            writer.discard()